@@ -0,0 +1,96 @@
+"""
+Compares two benchmark results written by benchmarks.run, stage by stage.
+
+Usage (from the root of the repository):
+    python -m benchmarks.compare old.json new.json --threshold 1.2
+
+Output:
+    The commits of both results, then a table for each run found in both (matched by size, options and SUT format)
+    with one row per stage: the old and new best time over repeats (s), their ratio, the old and new best peak memory
+    (MiB) and their ratio, followed by ' TIME' and/or ' MEMORY' if the stage is a regression. The last line is the
+    number of regressions.
+
+Exits with status 1 if any stage of any run is slower (or takes more memory) than the threshold ratio.
+"""
+import argparse
+import json
+import sys
+
+
+def get_key(
+        run:dict,
+)->tuple:
+    return (run['size'],json.dumps(run['options'],sort_keys=True),run.get('sut_format','mario'))
+
+
+def get_stages(
+        results:dict,
+)->dict:
+    """
+    Returns the best (lowest) time and memory of each stage of each run, over repeats.
+
+    Args:
+        results (dict): The results written by benchmarks.run.
+
+    Returns:
+        dict: The stages, as {(size,options,sut_format): {stage: {'time','peak_memory'}}}.
+    """
+    stages = {}
+    for run in results['runs']:
+        best = stages.setdefault(get_key(run),{})
+        for stage,record in run['stages'].items():
+            peak_memory = record['peak_memory'] or 0 # None if memory was not traced
+            if stage not in best:
+                best[stage] = {'time':record['time'],'peak_memory':peak_memory}
+            else:
+                best[stage]['time'] = min(best[stage]['time'],record['time'])
+                best[stage]['peak_memory'] = min(best[stage]['peak_memory'],peak_memory)
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('old',help='Results of the reference commit.')
+    parser.add_argument('new',help='Results to be compared.')
+    parser.add_argument('--threshold',type=float,default=1.2,help='Ratio new/old above which a stage is a regression.')
+    parser.add_argument('--min-time',type=float,default=0.05,help='Stages faster than this in both results (in seconds) are not checked for time regressions.')
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"old: {old['meta']['commit']}  new: {new['meta']['commit']}")
+
+    old_stages,new_stages = get_stages(old),get_stages(new)
+    regressions = 0
+    for key in new_stages:
+        if key not in old_stages:
+            continue
+        print(f"\n{key[0]} {key[1]} ({key[2]})")
+        print(f"{'stage':<40}{'old s':>10}{'new s':>10}{'ratio':>8}{'old MiB':>10}{'new MiB':>10}{'ratio':>8}")
+        for stage,record in new_stages[key].items():
+            if stage not in old_stages[key]:
+                continue
+            before = old_stages[key][stage]
+            time_ratio = record['time']/before['time'] if before['time'] > 0 else float('nan')
+            memory_ratio = record['peak_memory']/before['peak_memory'] if before['peak_memory'] > 0 else float('nan')
+
+            flags = ''
+            if max(record['time'],before['time']) >= args.min_time and time_ratio > args.threshold:
+                flags += ' TIME'
+            if memory_ratio > args.threshold:
+                flags += ' MEMORY'
+            regressions += bool(flags)
+
+            print(
+                f"{stage:<40}{before['time']:>10.3f}{record['time']:>10.3f}{time_ratio:>8.2f}"
+                f"{before['peak_memory']/2**20:>10.1f}{record['peak_memory']/2**20:>10.1f}{memory_ratio:>8.2f}{flags}"
+            )
+
+    print(f"\n{regressions} regressions above {args.threshold}x")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Generators of synthetic SUTs and matching master/inventory workbooks, used to benchmark FIONA at scale.
+"""
+import numpy as np
+import pandas as pd
+import mario
+
+from fiona.rules import _MASTER_SHEET_NAME as MS_name
+from fiona.rules import _REGIONS_MAPS_SHEET_NAME as RMS_name
+from fiona.rules import _MASTER_SHEET_COLUMNS as MS_cols
+from fiona.rules import _INVENTORY_SHEET_COLUMNS as InvS_cols
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+_UNITS = ['Mton','TJ','G€']
+_CLUSTER = 'GLOBAL'
+_CONSUMPTION_CATEGORY = 'Final demand'
+
+
+def get_synthetic_sut(
+        regions:int = 2,
+        activities:int = 10,
+        commodities:int = 10,
+        satellites:int = 2,
+        factors:int = 1,
+        density:float = 0.2,
+        seed:int = 0,
+)->mario.Database:
+    """
+    Generates a random multi-regional SUT in flows.
+
+    Every activity supplies at least one commodity and every commodity is supplied by at least one activity
+    in each region. Intermediate uses, factors of production and satellite accounts are random, with the given
+    share of non-zero cells.
+
+    Args:
+        regions (int, optional): Number of regions. Defaults to 2.
+        activities (int, optional): Number of activities per region. Defaults to 10.
+        commodities (int, optional): Number of commodities per region. Defaults to 10.
+        satellites (int, optional): Number of satellite accounts. Defaults to 2.
+        factors (int, optional): Number of factors of production. Defaults to 1.
+        density (float, optional): Share of non-zero cells of the use, factors and satellite matrices. Defaults to 0.2.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        mario.Database: The SUT, in flows.
+    """
+    rng = np.random.default_rng(seed)
+
+    region_labels = [f'R{i}' for i in range(regions)]
+    activity_labels = [f'A{i}' for i in range(activities)]
+    commodity_labels = [f'C{i}' for i in range(commodities)]
+    satellite_labels = [f'K{i}' for i in range(satellites)]
+    factor_labels = [f'F{i}' for i in range(factors)]
+
+    act_index = pd.MultiIndex.from_product([region_labels,[MI['a']],activity_labels],names=['Region','Level','Item'])
+    com_index = pd.MultiIndex.from_product([region_labels,[MI['c']],commodity_labels],names=['Region','Level','Item'])
+    index = act_index.append(com_index)
+    index.names = ['Region','Level','Item']
+    final_demand = pd.MultiIndex.from_product([region_labels,[MI['n']],[_CONSUMPTION_CATEGORY]],names=['Region','Level','Item'])
+
+    def get_random(shape):
+        return rng.random(shape)*(rng.random(shape) < density)
+
+    # supplies: each activity makes one commodity, each commodity is made by at least one activity of its region
+    make = np.zeros((activities,commodities))
+    make[np.arange(activities),np.arange(activities) % commodities] = 1
+    make[np.arange(commodities) % activities,np.arange(commodities)] = 1
+    make = make*(1+rng.random(make.shape))
+    s = np.kron(np.eye(regions),make)
+
+    # uses: commodities of all regions to activities of all regions, at least one input per activity
+    u = get_random((len(com_index),len(act_index)))
+    u[rng.integers(len(com_index),size=len(act_index)),np.arange(len(act_index))] += 1
+
+    z = pd.DataFrame(0.0,index=index,columns=index)
+    z.loc[act_index,com_index] = s
+    z.loc[com_index,act_index] = u
+
+    Y = pd.DataFrame(0.0,index=index,columns=final_demand)
+    Y.loc[com_index,:] = 1+rng.random((len(com_index),regions))
+
+    V = pd.DataFrame(0.0,index=pd.Index(factor_labels,name='Item'),columns=index)
+    V.loc[:,act_index] = get_random((factors,len(act_index)))+1e-3
+    E = pd.DataFrame(0.0,index=pd.Index(satellite_labels,name='Item'),columns=index)
+    E.loc[:,act_index] = get_random((satellites,len(act_index)))
+    EY = pd.DataFrame(get_random((satellites,regions)),index=E.index,columns=final_demand)
+
+    units = {
+        MI['a']: pd.DataFrame({'unit':np.nan},index=activity_labels),
+        MI['c']: pd.DataFrame({'unit':[_UNITS[i % len(_UNITS)] for i in range(commodities)]},index=commodity_labels),
+        MI['f']: pd.DataFrame({'unit':'G€'},index=factor_labels),
+        MI['k']: pd.DataFrame({'unit':'Mton'},index=satellite_labels),
+    }
+
+    return mario.Database(name='synthetic',table='SUT',Z=z,E=E,V=V,Y=Y,EY=EY,units=units)
+
+
+def get_synthetic_master(
+        sut:mario.Database,
+        activities:int = 5,
+        inputs:int = 5,
+        cluster_share:float = 0.5,
+        parented_share:float = 0.5,
+        new_commodity_share:float = 0.5,
+        seed:int = 0,
+)->tuple:
+    """
+    Generates a random master sheet, regions map and inventories of new activities matching a SUT.
+
+    Args:
+        sut (mario.Database): The SUT the new activities are added to.
+        activities (int, optional): Number of new activities. Defaults to 5.
+        inputs (int, optional): Number of commodity inputs of each inventory. Defaults to 5.
+        cluster_share (float, optional): Share of new activities added in the 'GLOBAL' regions cluster (all regions)
+            rather than in one region, and share of commodity inputs supplied by the cluster rather than by one region. Defaults to 0.5.
+        parented_share (float, optional): Share of new activities initialized from a parent activity of the SUT. Defaults to 0.5.
+        new_commodity_share (float, optional): Share of new activities supplying a new commodity rather than one of the SUT. Defaults to 0.5.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        tuple: The master sheet (pd.DataFrame), the regions map (pd.DataFrame) and the inventories, as {sheet name: pd.DataFrame}.
+    """
+    rng = np.random.default_rng(seed)
+
+    regions = list(sut.get_index(MI['r']))
+    sut_activities = list(sut.get_index(MI['a']))
+    commodities = list(sut.get_index(MI['c']))
+    factors = list(sut.get_index(MI['f']))
+    satellites = list(sut.get_index(MI['k']))
+    units = sut.units
+
+    master_rows = []
+    inventories = {}
+    for i in range(activities):
+        activity = f'New activity {i}'
+        region = _CLUSTER if rng.random() < cluster_share else regions[rng.integers(len(regions))]
+        parent = sut_activities[rng.integers(len(sut_activities))] if rng.random() < parented_share else np.nan
+
+        if rng.random() < new_commodity_share:
+            commodity,market_share,total_output,fu_unit = f'New commodity {i}',1,1+rng.random(),'Mton'
+        else:
+            commodity = commodities[rng.integers(len(commodities))]
+            market_share,total_output,fu_unit = 0.1*rng.random(),np.nan,units[MI['c']].loc[commodity,'unit']
+
+        master_rows.append({
+            MI['r']: region,
+            MI['a']: activity,
+            MI['c']: commodity,
+            'Sheet name': activity,
+            'FU quantity': 1,
+            'FU unit': fu_unit,
+            'Market share': market_share,
+            'Total output': total_output,
+            MI['n']: _CONSUMPTION_CATEGORY if pd.notna(total_output) else np.nan,
+            f'Parent {MI["a"]}': parent,
+            'Leave empty': np.nan,
+            'Reference': np.nan,
+        })
+
+        rows = []
+        for commodity in rng.choice(commodities,size=min(inputs,len(commodities)),replace=False):
+            rows.append({
+                'Quantity': rng.random(),
+                'Unit': units[MI['c']].loc[commodity,'unit'],
+                'Input': commodity,
+                'Item': MI['c'],
+                'DB Item': commodity,
+                f"DB {MI['r']}": _CLUSTER if rng.random() < cluster_share else regions[rng.integers(len(regions))],
+                'Type': 'Update',
+            })
+        for factor in factors:
+            rows.append({'Quantity':rng.random(),'Unit':units[MI['f']].loc[factor,'unit'],'Input':factor,'Item':MI['f'],'DB Item':factor,'Type':'Update'})
+        for satellite in satellites:
+            # satellites of parented activities are changed in percentage of the parent's ones
+            change_type = 'Percentage' if isinstance(parent,str) else 'Update'
+            rows.append({'Quantity':rng.random()-0.5 if isinstance(parent,str) else rng.random(),'Unit':units[MI['k']].loc[satellite,'unit'],'Input':satellite,'Item':MI['k'],'DB Item':satellite,'Type':change_type})
+        inventories[activity] = pd.DataFrame(rows).reindex(columns=InvS_cols)
+
+    master_sheet = pd.DataFrame(master_rows,columns=MS_cols)
+    regions_map = pd.DataFrame({_CLUSTER:regions})
+
+    return master_sheet,regions_map,inventories
+
+
+def write_master_workbook(
+        path:str,
+        master_sheet:pd.DataFrame,
+        regions_map:pd.DataFrame,
+        inventories:dict,
+):
+    """
+    Writes a master sheet, regions map and inventories in one workbook, readable with read_master_file=True and read_inventories().
+
+    Args:
+        path (str): The path of the workbook.
+        master_sheet (pd.DataFrame): The master sheet.
+        regions_map (pd.DataFrame): The regions map.
+        inventories (dict): The inventories, as {sheet name: pd.DataFrame}.
+    """
+    with pd.ExcelWriter(path) as writer:
+        master_sheet.to_excel(writer,sheet_name=MS_name,index=False)
+        regions_map.to_excel(writer,sheet_name=RMS_name,index=False)
+        for sheet_name,inventory in inventories.items():
+            inventory.to_excel(writer,sheet_name=sheet_name,index=False)
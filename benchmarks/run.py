@@ -0,0 +1,178 @@
+"""
+Times and memory-profiles each stage of the DB_builder pipeline on synthetic SUTs of increasing size.
+
+Usage (from the root of the repository):
+    python -m benchmarks.run --sizes xs s m --output results.json
+    python -m benchmarks.run --sizes s --options '{"backend":"sparse"}' '{"assembly":"blocks"}'
+    python -m benchmarks.compare old.json new.json
+
+Output:
+    One line per run is printed, as '<size> <options> total <seconds> s  peak <MiB> MiB', then the path of the results.
+    The results are written as JSON:
+
+    {
+        "meta": {"commit", "dirty", "date", "python", "platform", "cpus", "versions": {package: version}, "memory"},
+        "runs": [
+            {
+                "size", "params": {"sut": dict, "master": dict}, "options": dict, "sut_format", "lazy", "repeat",
+                "shapes": {"base": {matrix: [rows, columns]}, "new": {matrix: [rows, columns]}},
+                "stages": {stage: {"calls", "time", "peak_memory"}},
+                "records": [{"stage", "parent", "time", "peak_memory", "shapes", ...}, one per stage entered, in order],
+            },
+        ],
+    }
+
+    Times are in seconds (summed over calls in 'stages') and memory in bytes ('peak_memory' is null if run with --no-memory).
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import warnings
+from datetime import datetime
+
+import mario
+import numpy as np
+import pandas as pd
+
+from fiona.core.db_builder import DB_builder
+from fiona.core.instrumentation import Instrumentation
+from fiona.core.options import BuildOptions
+
+from benchmarks.generate import get_synthetic_sut,get_synthetic_master,write_master_workbook
+
+# parameters of the synthetic SUT ('sut') and master workbook ('master') of each size
+SIZES = {
+    'xs': {'sut':{'regions':2,'activities':10,'commodities':10,'satellites':2},'master':{'activities':5}},
+    's': {'sut':{'regions':5,'activities':20,'commodities':20,'satellites':5},'master':{'activities':20}},
+    'm': {'sut':{'regions':10,'activities':50,'commodities':50,'satellites':10,'density':0.1},'master':{'activities':50}},
+    'l': {'sut':{'regions':20,'activities':100,'commodities':100,'satellites':20,'density':0.05},'master':{'activities':100}},
+    'xl': {'sut':{'regions':49,'activities':160,'commodities':200,'satellites':50,'density':0.02},'master':{'activities':200}},
+}
+
+def run_pipeline(
+        size:str,
+        params:dict,
+        options:dict,
+        directory:str,
+        sut_format:str = 'mario',
+        memory:bool = True,
+        seed:int = 0,
+        lazy:bool = False,
+)->dict:
+    """
+    Generates a synthetic SUT and master workbook and runs the whole DB_builder pipeline on them, recording every stage
+    with an Instrumentation.
+
+    Args:
+        size (str): The name of the size.
+        params (dict): The parameters of the synthetic SUT and master workbook, as {'sut': dict, 'master': dict}.
+        options (dict): The keyword arguments of the BuildOptions given to DB_builder.add_inventories().
+        directory (str): The directory where the workbook (and the SUT, if parsed from txt) are written.
+        sut_format (str, optional): 'mario' to give the generated database to DB_builder, 'txt' to write it and time its parsing. Defaults to 'mario'.
+        memory (bool, optional): Whether to trace memory allocations. Defaults to True.
+        seed (int, optional): Seed of the random generators. Defaults to 0.
+        lazy (bool, optional): Whether inventories are parsed lazily, one activity at a time. Defaults to False.
+
+    Returns:
+        dict: The result of the run.
+    """
+    sut = get_synthetic_sut(**params['sut'],seed=seed)
+    master_sheet,regions_map,inventories = get_synthetic_master(sut,**params['master'],seed=seed)
+    master_path = os.path.join(directory,f'master_{size}.xlsx')
+    write_master_workbook(master_path,master_sheet,regions_map,inventories)
+
+    sut_path = sut
+    if sut_format == 'txt':
+        sut_path = os.path.join(directory,f'sut_{size}')
+        os.makedirs(sut_path,exist_ok=True)
+        sut.to_txt(sut_path,flows=True,coefficients=False)
+        sut_path = os.path.join(sut_path,'flows')
+    base_shapes = {m:sut.matrices['baseline'][m].shape for m in ['Z','V','E','Y']}
+    del sut
+
+    instrumentation = Instrumentation(memory=memory)
+    with instrumentation.stage('total'):
+        db = DB_builder(sut_path=sut_path,sut_mode='flows',master_file_path=master_path,sut_format=sut_format,read_master_file=True,instrumentation=instrumentation)
+        db.read_inventories(master_path,lazy=lazy)
+        db.add_inventories('excel',options=BuildOptions(**options))
+    report = instrumentation.report()
+
+    return {
+        'size': size,
+        'params': params,
+        'options': options,
+        'sut_format': sut_format,
+        'lazy': lazy,
+        'shapes': {
+            'base': base_shapes,
+            'new': {m:db.sut.matrices['baseline'][m].shape for m in ['z','v','e','Y']},
+        },
+        'stages': report['stages'],
+        'records': report['records'],
+    }
+
+
+def get_meta(
+        memory:bool,
+)->dict:
+    def git(*args):
+        try:
+            return subprocess.run(['git',*args],capture_output=True,text=True,check=True,cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError,subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git('rev-parse','HEAD'),
+        'dirty': bool(git('status','--porcelain','--untracked-files=no')),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versions': {'numpy':np.__version__,'pandas':pd.__version__,'mario':getattr(mario,'__version__',None)},
+        'memory': memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes',nargs='+',default=['xs','s'],choices=list(SIZES),help='Sizes of the synthetic SUTs to be benchmarked.')
+    parser.add_argument('--options',nargs='+',default=['{}'],help='JSON keyword arguments of BuildOptions, one run per value (e.g. \'{"backend":"sparse"}\').')
+    parser.add_argument('--sut-format',default='mario',choices=['mario','txt'],help="'txt' to include the parsing of the SUT in the benchmark.")
+    parser.add_argument('--lazy',action='store_true',help='Parse inventories lazily, one activity at a time.')
+    parser.add_argument('--repeat',type=int,default=1,help='Number of runs of each size and options.')
+    parser.add_argument('--no-memory',action='store_true',help='Do not trace memory allocations (faster and more accurate timings).')
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--workdir',default=None,help='Directory of the generated files. Defaults to a temporary directory.')
+    parser.add_argument('--output',default='benchmark.json',help='Path of the JSON results.')
+    parser.add_argument('--verbose',action='store_true',help='Keep the logs and warnings of FIONA and mario.')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+        warnings.simplefilter('ignore')
+
+    memory = not args.no_memory
+    results = {'meta':get_meta(memory),'runs':[]}
+    with tempfile.TemporaryDirectory(prefix='fiona_bench_') as tmp:
+        directory = args.workdir or tmp
+        os.makedirs(directory,exist_ok=True)
+        for size in args.sizes:
+            for options in args.options:
+                for repeat in range(args.repeat):
+                    run = run_pipeline(size,SIZES[size],json.loads(options),directory,args.sut_format,memory,args.seed,args.lazy)
+                    run['repeat'] = repeat
+                    results['runs'].append(run)
+                    stages = run['stages']
+                    print(f"{size:>3} {options:<30} total {stages['total']['time']:8.2f} s  peak {(stages['total']['peak_memory'] or 0)/2**20:9.1f} MiB")
+
+    with open(args.output,'w') as f:
+        json.dump(results,f,indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
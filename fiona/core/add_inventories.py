@@ -1,10 +1,19 @@
+import numpy as np
 import pandas as pd
-import pint 
 
+from fiona.core.cluster_shares import ClusterShares
+from fiona.core.journal import EditJournal
+from fiona.core.mapped import MappedStore
+from fiona.core.memory import MemoryBudget,get_nbytes
+from fiona.core.options import BuildOptions
+from fiona.core.parallel import fill_in_parallel
+from fiona.core.patches import FIONAPatch, get_index_fingerprint, trim_table
+from fiona.core.assembly import merge_labels, place_blocks, get_mario_indices
+from fiona.core.sparse import SparseTable, concat_sum
+from fiona.core.units import get_unit_service, get_database_units
 from fiona.rules import setup_logger
 from fiona.rules import LOG_MESSAGES as logmsg
 
-from copy import deepcopy
 from mario.tools.constants import _MASTER_INDEX as MI
 
 logger = setup_logger('Inventories')
@@ -23,31 +32,69 @@ class Inventories:
     def __init__(
             self,
             builder,
+            *,
             matrices:dict,
+            options:BuildOptions = None,
+            store:MappedStore = None,
+            budget:MemoryBudget = None,
+            activities:list = None,
     ):
         """
         Initialize the AddInventories class.
 
         Args:
             builder (Builder): The DB_builder object.
-            matrices (list): The MARIO matrices to be used.
+            matrices (dict): The MARIO matrices to be used.
+            options (BuildOptions, optional): How the matrices are built (backend, workers and assembly). Defaults to None (the default options).
+            store (MappedStore, optional): The store of memory-mapped matrices, created from the options by the builder. If given, base and new matrices are kept in memory-mapped files and only the filled slices are held in RAM (as SparseTable objects, whatever the backend). Defaults to None.
+            budget (MemoryBudget, optional): The memory budget, created from the options by the builder. If given, matrices are built in low-memory mode: u and s are released as soon as the slices are filled, z is assembled straight from the base z and the slices, and base matrices are taken from the SUT without copies. New matrices exceeding the budget are memory-mapped. Defaults to None.
+            activities (list, optional): The activities of the master sheet to be applied, e.g. only the new or changed ones when adding incrementally. Defaults to None (all the new activities of the builder).
 
         Attributes:
             builder (Builder): The builder object.
             matrices (list): The matrices to be used.
             regions (list): The regions from the builder's system under test.
             units (list): The units from the builder's system under test.
-            new_activities (list): The new activities from the builder.
+            new_activities (list): The new activities to be applied.
             new_commodities (list): The new commodities from the builder.
             parented_activities (list): The parented activities from the builder.
+            instrumentation (Instrumentation): The instrumentation of the builder, recording the stages.
+            options (BuildOptions): How the matrices are built.
+            backend (str): The matrix backend.
+            store (MappedStore): The store of memory-mapped matrices, None if matrices are kept in RAM.
+            workers (int): Number of worker processes filling the slices of new activities.
+            assembly (str): How the dense backend adds slices to the matrices.
+            budget (MemoryBudget): The memory budget of the low-memory mode, None if not used.
+            base_indices (IndexRegistry): The label sets of the SUT the activities are added to.
         """
+        options = options if options is not None else BuildOptions()
+
+        self.options = options
+        self.backend = options.backend
+        self.workers = options.workers
+        self.assembly = options.assembly
+        self.store = store
+        self.budget = budget
+        self._cluster_shares = None
         self.builder = builder
         self.matrices = matrices
-        self.regions = builder.sut.get_index(MI['r'])
+        self.base_indices = builder.indices # label sets of the SUT the activities are added to
+        self.regions = builder.indices.get_labels(MI['r'])
         self.units = builder.sut.units
-        self.new_activities = builder.new_activities
+        self.new_activities = builder.new_activities if activities is None else list(activities)
         self.new_commodities = builder.new_commodities
         self.parented_activities = builder.parented_activities
+        self.instrumentation = builder.instrumentation
+
+    @property
+    def cluster_shares(self)->ClusterShares:
+        """
+        Cache of the shares splitting inputs supplied by regions clusters, computed from the base u the first time it is needed,
+        without the uses of the activities already added by FIONA.
+        """
+        if self._cluster_shares is None:
+            self._cluster_shares = ClusterShares(self.matrices['u'],self.builder.regions_maps,excluded=self.builder.fiona_activities)
+        return self._cluster_shares
 
     def add_from_master(
             self
@@ -57,40 +104,113 @@ class Inventories:
 
         This method retrieves the indices for 'c' and 'a' regions from the master inventory
         and adds the new units to the current inventory using the 'add_new_units' method.
-        It also initializes the 'slices' attribute with empty table slices.
+        Edits of all new activities are recorded in an EditJournal, which is then reduced
+        once into the filled slices.
         """
              
-        self.add_new_units(MI['c'])
-        self.add_new_units(MI['a'])
-        logger.info(f"{logmsg['dm']} | Units of new activities and commodities added to the SUT database")
-
-        self.matrices['u'] = self.matrices['z'].loc[(sn,MI['c'],sn),(sn,MI['a'],sn)]
-        self.matrices['s'] = self.matrices['z'].loc[(sn,MI['a'],sn),(sn,MI['c'],sn)]
-
-        empty_slices = self.get_empty_table_slices()
-        logger.info(f"{logmsg['dm']} | Empty slices created'")
-
-        self.filled_slices = deepcopy(empty_slices)
-        for activity in self.new_activities:
-            self.fill_slices(activity)
+        with self.instrumentation.stage('add_new_units'):
+            self.add_new_units(MI['c'])
+            self.add_new_units(MI['a'])
+        logger.info("%s | Units of new activities and commodities added to the SUT database",logmsg['dm'])
+
+        self.fill_journal()
+
+        with self.instrumentation.stage('reduce_journal') as stage:
+            self.filled_slices = self.get_filled_table_slices()
+            stage.set_shapes(self.filled_slices)
+            stage.set_info(entries=len(self.journal))
+        logger.info("%s | Slices filled from %s journal entries",logmsg['dm'],len(self.journal))
+
+        logger.info("%s | Adding slices to matrices",logmsg['dm'])
+        if self.budget is not None:
+            with self.instrumentation.stage('add_slices',mode='lowmem') as stage:
+                self.add_lowmem_slices()
+                stage.set_shapes(self.matrices)
+                stage.set_info(spilled=list(self.budget.spilled))
+            logger.info("%s | Slices placed in matrices within a memory budget of %.2f GiB",logmsg['dm'],self.budget.budget/2**30)
+            self.get_mario_indices()
+            return
+
+        if self.store is not None or (self.backend == 'dense' and self.assembly == 'blocks'):
+            with self.instrumentation.stage('add_slices',mode='blocks') as stage:
+                self.add_block_slices()
+                stage.set_shapes(self.matrices)
+            if self.store is not None:
+                logger.info("%s | Slices placed in matrices by blocks memory-mapped in %s",logmsg['dm'],self.store.directory)
+            else:
+                logger.info("%s | Slices placed in matrices by blocks",logmsg['dm'])
+            self.get_mario_indices()
+            return
+
+        if self.backend == 'sparse':
+            with self.instrumentation.stage('add_slices',mode='sparse') as stage:
+                self.add_sparse_slices()
+                stage.set_shapes(self.matrices)
+            logger.info("%s | Slices added to matrices and indices sorted",logmsg['dm'])
+            self.get_mario_indices()
+            return
+
+        with self.instrumentation.stage('add_slices',mode='groupby') as stage:
+            self.add_slices()
+            logger.info("%s | Slices for added to matrices",logmsg['dm'])
+
+            new_act_indices = self.matrices['s'].loc[(sn,MI['a'],self.new_activities),:].index
+            new_com_indices = self.matrices['u'].loc[(sn,MI['c'],self.new_commodities),:].index
+            new_act_indices = new_act_indices[~new_act_indices.isin(self.matrices['Y'].index)] # activities replaced in place are already there
+            new_com_indices = new_com_indices[~new_com_indices.isin(self.matrices['v'].columns)]
+            self.matrices['Y'] = pd.concat([self.matrices['Y'],pd.DataFrame(0, index=new_act_indices, columns=self.matrices['Y'].columns)],axis=0)
+            self.matrices['v'] = pd.concat([self.matrices['v'],pd.DataFrame(0, index=self.matrices['v'].index, columns=new_com_indices)],axis=1)
+            self.matrices['e'] = pd.concat([self.matrices['e'],pd.DataFrame(0, index=self.matrices['e'].index, columns=new_com_indices)],axis=1)
+
+            self.matrices['z'] = pd.concat([self.matrices['u'],self.matrices['s']],axis=1).fillna(0)
+            stage.set_shapes(self.matrices)
+
+        logger.info("%s | Sorting indices of all matrices in the SUT database",logmsg['dm'])
+        with self.instrumentation.stage('reindex'):
+            self.reindex_matrices()
+        logger.info("%s | Indices of all matrices sorted",logmsg['dm'])
 
-        logger.info(f"{logmsg['dm']} | Adding slices to matrices")
-        self.add_slices()
-        logger.info(f"{logmsg['dm']} | Slices for added to matrices")
-        
-        new_act_indices = self.matrices['s'].loc[(sn,MI['a'],self.new_activities),:].index
-        new_com_indices = self.matrices['u'].loc[(sn,MI['c'],self.new_commodities),:].index
-        self.matrices['Y'] = pd.concat([self.matrices['Y'],pd.DataFrame(0, index=new_act_indices, columns=self.matrices['Y'].columns)],axis=0)
-        self.matrices['v'] = pd.concat([self.matrices['v'],pd.DataFrame(0, index=self.matrices['v'].index, columns=new_com_indices)],axis=1)
-        self.matrices['e'] = pd.concat([self.matrices['e'],pd.DataFrame(0, index=self.matrices['e'].index, columns=new_com_indices)],axis=1)
+        self.get_mario_indices() # to be deprecated when mario will allow to initialize database in coefficients
 
-        self.matrices['z'] = pd.concat([self.matrices['u'],self.matrices['s']],axis=1).fillna(0)
+    def fill_journal(
+            self
+    ):
+        """
+        Splits u and s from z (unless already given) and records the edits of all the activities to be applied
+        in a new EditJournal, serially or in a pool of worker processes.
+        """
+        if 'u' in self.matrices and 's' in self.matrices:
+            pass
+        elif self.store is not None:
+            z = self.matrices['z']
+            is_com = (z.index.get_level_values(1) == MI['c'],z.columns.get_level_values(1) == MI['c'])
+            is_act = (z.index.get_level_values(1) == MI['a'],z.columns.get_level_values(1) == MI['a'])
+            self.matrices['u'] = self.store.map_frame('u',z,is_com[0],is_act[1])
+            self.matrices['s'] = self.store.map_frame('s',z,is_act[0],is_com[1])
+        elif self.budget is not None:
+            z = self.matrices['z']
+            is_com = (z.index.get_level_values(1) == MI['c'],z.columns.get_level_values(1) == MI['c'])
+            is_act = (z.index.get_level_values(1) == MI['a'],z.columns.get_level_values(1) == MI['a'])
+            self.matrices['u'] = self.take_block('u',z,is_com[0],is_act[1])
+            self.matrices['s'] = self.take_block('s',z,is_act[0],is_com[1])
+        else:
+            self.matrices['u'] = self.matrices['z'].loc[(sn,MI['c'],sn),(sn,MI['a'],sn)]
+            self.matrices['s'] = self.matrices['z'].loc[(sn,MI['a'],sn),(sn,MI['c'],sn)]
 
-        logger.info(f"{logmsg['dm']} | Sorting indices of all matrices in the SUT database")
-        self.reindex_matrices()
-        logger.info(f"{logmsg['dm']} | Indices of all matrices sorted")
+        self.journal = EditJournal({matrix:self.get_slice_indices(matrix) for matrix in _matrix_slices_map})
+        logger.info("%s | Edit journal created",logmsg['dm'])
 
-        self.get_mario_indices() # to be deprecated when mario will allow to initialize database in coefficients
+        if self.workers > 1:
+            logger.info("%s | Filling slices of %s activities with %s workers",logmsg['dm'],len(self.new_activities),self.workers)
+            with self.instrumentation.stage('fill',workers=self.workers,activities=len(self.new_activities)):
+                fill_in_parallel(self,self.workers)
+        else:
+            self.journal_segments = {}
+            for activity in self.new_activities:
+                start = len(self.journal)
+                with self.instrumentation.stage('fill',activity=activity):
+                    self.fill_slices(activity)
+                self.journal_segments[activity] = (start,len(self.journal))
 
     def add_new_units(
             self,
@@ -121,26 +241,27 @@ class Inventories:
                 df.columns = ['unit']
                 df = df.drop_duplicates()
                 
-        self.units[item] = pd.concat([self.units[item],df],axis=0)
+        self.units[item] = pd.concat([self.units[item].drop(df.index,errors='ignore'),df],axis=0) # units of activities replaced in place are updated
     
-    def get_empty_table_slices(self):
+    def get_filled_table_slices(self):
         """
-        Returns a dictionary containing empty table slices for each matrix and axis.
+        Returns a dictionary containing the filled table slices for each matrix, reduced from the journal.
 
         Returns:
-            dict: A dictionary containing empty table slices for each matrix and item.
+            dict: A dictionary containing the filled table slices for each matrix.
                   The keys of the dictionary are the matrix names, and the values are
-                  dictionaries containing empty table slices for each axis. Each axis
-                  dictionary contains empty pd.DataFrames structured as empty slices according
-                  to which axis they will be then concatenated to the original matrices.
+                  pd.DataFrames (or SparseTable objects with the sparse backend) structured
+                  according to which axis they will be then concatenated to the original matrices.
         """
-        empty_slices = {}
+        filled_slices = {}
 
         for matrix in _matrix_slices_map:
-            new_index,new_columns = self.get_slice_indices(matrix)
-            empty_slices[matrix] = pd.DataFrame(0, index=new_index, columns=new_columns) 
+            if self.backend == 'sparse' or self.store is not None or self.assembly == 'blocks' or self.budget is not None:
+                filled_slices[matrix] = self.journal.to_sparse(matrix)
+            else:
+                filled_slices[matrix] = self.journal.to_frame(matrix)
             
-        return empty_slices
+        return filled_slices
 
     def get_slice_indices(
             self,
@@ -162,7 +283,7 @@ class Inventories:
 
         if concat == 0:
             empty_index = [[],[],[]]  # will always be 3 levels
-            items_to_add_on_rows = self.builder.new_commodities if item_row == MI['c'] else self.builder.new_activities
+            items_to_add_on_rows = self.new_commodities if item_row == MI['c'] else self.new_activities
             for region in self.regions:
                 for item in items_to_add_on_rows:
                     empty_index[0] += [region]
@@ -179,7 +300,7 @@ class Inventories:
                 new_index = pd.MultiIndex.from_arrays(empty_index)
 
             empty_extra_columns = [[],[],[]] # will always be 3 levels
-            items_to_add_on_cols = self.builder.new_activities if item_col == MI['a'] else self.builder.new_commodities
+            items_to_add_on_cols = self.new_activities if item_col == MI['a'] else self.new_commodities
             for region in self.regions:
                 for item in items_to_add_on_cols:
                     empty_extra_columns[0] += [region]
@@ -198,7 +319,7 @@ class Inventories:
                 new_index = self.matrices[matrix].index
             else: 
                 empty_extra_index = [[],[],[]]  # will always be 3 levels if not v or e
-                items_to_add_on_rows = self.builder.new_activities if item_row == MI['a'] else self.builder.new_commodities
+                items_to_add_on_rows = self.new_activities if item_row == MI['a'] else self.new_commodities
                 for region in self.regions:
                     for item in items_to_add_on_rows:
                         empty_extra_index[0] += [region]
@@ -211,7 +332,7 @@ class Inventories:
                 ])
 
             empty_columns = [[],[],[]] # will always be 3 levels
-            items_to_add_on_cols = self.builder.new_activities if item_col == MI['a'] else self.builder.new_commodities
+            items_to_add_on_cols = self.new_activities if item_col == MI['a'] else self.new_commodities
             for region in self.regions:
                 for item in items_to_add_on_cols:
                     empty_columns[0] += [region]
@@ -236,7 +357,7 @@ class Inventories:
             ValueError: If the parent region of the activity is not in the SUT.
         """
 
-        slices = self.get_empty_table_slices()
+        journal_size = len(self.journal)
 
         # get the inventory for the activity
         inventories = self.builder.inventories[activity]
@@ -245,42 +366,41 @@ class Inventories:
         for sheet_name,inventory in inventories.items():
 
             if self.leave_empty(sheet_name):
-                logger.info(f"{logmsg['dm']} | 'Inventory {sheet_name}' for activity {activity} not added to matrices because 'Leave empty' is True")
+                logger.info("%s | 'Inventory %s' for activity %s not added to matrices because 'Leave empty' is True",logmsg['dm'],sheet_name,activity)
+                self.journal.truncate(journal_size)
                 return
             
             # get the region where to add the activity
-            region = self.builder.master_sheet.query(f"`Sheet name`==@sheet_name")[MI['r']].values[0]
+            region = self.builder.master_index.get_sheet(sheet_name)[MI['r']]
 
             # check if the region is in the SUT or in the regions maps
-            if region in self.builder.sut.get_index(MI['r']):
+            if region in self.builder.indices.get_set(MI['r']):
                 target_regions = [region]
-            elif region not in self.builder.sut.get_index(MI['r']):
+            elif region not in self.builder.indices.get_set(MI['r']):
                 if region in self.builder.regions_maps:
                     target_regions = self.builder.regions_maps[region] 
                 else:
                     raise ValueError(f"Activity {activity} is added in region {region} which is not in the SUT nor in the regions map")
 
             # in case the activity has a parent to be initialized from
-            parent_activity = self.builder.master_sheet.query(f"`Sheet name`==@sheet_name")[f'Parent {MI["a"]}'].values[0]
-            if pd.isna(parent_activity) == False: 
-                slices = self.copy_from_parent(activity,parent_activity,target_regions,slices,inventory)
-                logger.info(f"{logmsg['dm']} | Activity '{activity}' initialized equal to parent activity '{parent_activity}' in region '{region}'")
-
-            logger.info(f"{logmsg['dm']} | Converting units of inventory of activity '{activity}' consistently with the units of the SUT database")        
-            inventory = self.make_units_consistent_to_database(inventory) 
-            logger.info(f"{logmsg['dm']} | Units converted for activity '{activity}'")
-            
-            logger.info(f"{logmsg['dm']} | Filling slices for '{activity}'")
-            for region_to in target_regions:
-                slices = self.fill_commodities_inputs(inventory,region_to,activity,slices)
-                slices = self.fill_fact_sats_inputs(inventory,region_to,activity,'v',slices)
-                slices = self.fill_fact_sats_inputs(inventory,region_to,activity,'e',slices)
-                slices = self.fill_market_shares(activity,region_to,region,slices)
-                slices = self.fill_final_demand(activity,region_to,region,slices)
-            logger.info(f"{logmsg['dm']} | Slices for '{activity}' filled")
+            parent_activity = self.builder.master_index.get_sheet(sheet_name)[f'Parent {MI["a"]}']
+            if parent_activity is not None: 
+                self.copy_from_parent(activity,parent_activity,target_regions,self.journal,inventory)
+                logger.info("%s | Activity '%s' initialized equal to parent activity '%s' in region '%s'",logmsg['dm'],activity,parent_activity,region)
 
-        for matrix in slices:
-            self.filled_slices[matrix] += slices[matrix]
+            logger.info("%s | Converting units of inventory of activity '%s' consistently with the units of the SUT database",logmsg['dm'],activity)
+            with self.instrumentation.stage('convert_units',activity=activity,sheet=sheet_name):
+                inventory = self.make_units_consistent_to_database(inventory,conversion=self.builder.fiona_conversions.get(sheet_name))
+            logger.info("%s | Units converted for activity '%s'",logmsg['dm'],activity)
+
+            logger.info("%s | Filling slices for '%s'",logmsg['dm'],activity)
+            for region_to in target_regions:
+                self.fill_commodities_inputs(inventory,region_to,activity,self.journal)
+                self.fill_fact_sats_inputs(inventory,region_to,activity,'v',self.journal)
+                self.fill_fact_sats_inputs(inventory,region_to,activity,'e',self.journal)
+                self.fill_market_shares(activity,region_to,region,self.journal)
+                self.fill_final_demand(activity,region_to,region,self.journal)
+            logger.info("%s | Slices for '%s' filled",logmsg['dm'],activity)
 
     def reindex_matrices(
             self,
@@ -301,7 +421,8 @@ class Inventories:
     def make_units_consistent_to_database(
             self, 
             inventory:pd.DataFrame, 
-            cqc:str = 'Converted quantity'
+            cqc:str = 'Converted quantity',
+            conversion:pd.DataFrame = None,
         ):
         """
         Converts the units of the inventory to be consistent with the database unit.
@@ -309,36 +430,44 @@ class Inventories:
         Args:
             inventory (pd.DataFrame): The inventory data as a pandas DataFrame.
             cqc (str, optional): The name of the column to store the converted quantity. Defaults to 'Converted quantity'.
+            conversion (pd.DataFrame, optional): The conversion stored with the inventory in the FIONA database (see FIONAStore.get_inventories()).
+                Its converted quantities are reused, without converting again, for the rows whose quantity, unit and database unit
+                did not change since they were stored. Defaults to None.
 
         Returns:
             pd.DataFrame: The modified inventory DataFrame with consistent units.
 
         Raises:
+            ValueError: If any item is not a commodity, a factor of production or a satellite account.
             NotImplementedError: If the unit of an input is not convertible to the database unit without using LUCA.
         """
         self.converted_quantity_column = cqc
-        inventory[cqc] = ""
-        ureg = pint.UnitRegistry()
 
-        for i in inventory.index:
-            item = inventory.loc[i, 'Item']
-            if item == MI['c']:
-                DB_unit = self.units[MI['c']].loc[inventory.loc[i, 'DB Item'],'unit']
-            elif item == MI['a']:
-                raise ValueError(f"Item {item} is not recognized: activities cannot be supplied to other activities")
-            elif item == MI['k']:
-                DB_unit = self.units[MI['k']].loc[inventory.loc[i, 'DB Item'],'unit']
-            elif item == MI['f']:
-                DB_unit = self.units[MI['f']].loc[inventory.loc[i, 'DB Item'],'unit']
-            else:
-                raise ValueError(f"Item {item} is not recognized")
+        db_units = get_database_units(inventory,self.units)
+        converted = pd.Series(np.nan,index=inventory.index)
 
-            if inventory.loc[i, 'Unit'] == DB_unit:
-                inventory.loc[i, cqc] = inventory.loc[i, 'Quantity']
-            elif ureg(inventory.loc[i, 'Unit']).is_compatible_with(DB_unit):
-                inventory.loc[i, cqc] = inventory.loc[i, 'Quantity']*ureg(inventory.loc[i, 'Unit']).to(DB_unit).magnitude                
-            else:
-                raise NotImplementedError(f"Unit {inventory.loc[i, 'Unit']} is not convertible to {DB_unit} without using LUCA (not implemented yet)")
+        to_convert = pd.Series(True,index=inventory.index)
+        if conversion is not None:
+            stored = conversion.reindex(inventory.index)
+            to_convert = ~(
+                (stored['Quantity'] == inventory['Quantity']) &
+                (stored['Unit'] == inventory['Unit']) &
+                (stored['DB unit'] == db_units) &
+                stored['Converted quantity'].notna()
+            )
+            converted[~to_convert] = stored.loc[~to_convert,'Converted quantity']
+
+        if to_convert.any():
+            factors = get_unit_service().get_factors(inventory.loc[to_convert,'Unit'],db_units[to_convert])
+
+            not_convertible = ~factors['compatible'].astype(bool)
+            if not_convertible.any():
+                i = not_convertible[not_convertible].index[0]
+                raise NotImplementedError(f"Unit {inventory.loc[i, 'Unit']} is not convertible to {db_units[i]} without using LUCA (not implemented yet)")
+
+            converted[to_convert] = inventory.loc[to_convert,'Quantity']*factors['factor']
+
+        inventory[cqc] = converted
 
         return inventory
 
@@ -347,9 +476,9 @@ class Inventories:
         activity:str,
         parent_activity:str,
         target_regions:list,
-        slices:dict,
+        journal:EditJournal,
         inventory:pd.DataFrame
-    )->dict:
+    )->EditJournal:
         """
         Copy the parent activity in the target region into the new activity inventory on u, v and e.
 
@@ -357,18 +486,17 @@ class Inventories:
             activity (str): activity to be filled starting from the parent activity.
             parent_activity (str): parent activity to be copied.
             target_regions (list): list of regions where the activity must be filled.
-            slices (dict): dictionary containing the slices to be filled.
+            journal (EditJournal): The journal where the edits are recorded.
             inventory (pd.DataFrame): inventory of the activity containing the information to be updated later, so those of the parent activity must be nullified.
 
         Returns:
-            dict: dictionary containing the updated slices.
+            EditJournal: The updated journal.
         """
 
         # copy the parent activity in the target region into the new activity inventory on u, v and e
         for region in target_regions: 
-            slices['u'].loc[self.matrices['u'].index,(region,MI['a'],activity)] = self.matrices['u'].loc[:,(region,MI['a'],parent_activity)].values
-            slices['v'].loc[:,(region,MI['a'],activity)] = self.matrices['v'].loc[:,(region,MI['a'],parent_activity)].values
-            slices['e'].loc[:,(region,MI['a'],activity)] = self.matrices['e'].loc[:,(region,MI['a'],parent_activity)].values
+            for matrix in ['u','v','e']:
+                journal.record(matrix,list(self.matrices[matrix].index),[(region,MI['a'],activity)],self.matrices[matrix].loc[:,(region,MI['a'],parent_activity)].values,'set')
 
             # nullify the values that must be updated according to the activity's inventory
             commodities_to_nullify = [(c,r) for c,r in zip(inventory.query(f"Item=='{MI['c']}' & Type=='Update'")['DB Item'].values,inventory.query(f"Item=='{MI['c']}' & Type=='Update'")['DB Region'].values)]
@@ -378,18 +506,18 @@ class Inventories:
             for tup in commodities_to_nullify:
                 c = tup[0]
                 r = tup[1]
-                if r in self.builder.sut.get_index(MI['r']):
-                    slices['u'].loc[(r,MI['c'],c),(region,MI['a'],activity)] = 0
+                if r in self.builder.indices.get_set(MI['r']):
+                    journal.record('u',[(r,MI['c'],c)],[(region,MI['a'],activity)],0,'set')
                 elif r in self.builder.regions_maps:
-                    slices['u'].loc[(self.builder.regions_maps[r],MI['c'],c),(region,MI['a'],activity)] = 0
+                    journal.record('u',[(rr,MI['c'],c) for rr in self.builder.regions_maps[r]],[(region,MI['a'],activity)],0,'set')
                 
             for k in satellites_to_nullify:
-                slices['e'].loc[k,(region,MI['a'],activity)] = 0
+                journal.record('e',[k],[(region,MI['a'],activity)],0,'set')
             
             for f in factors_to_nullify:
-                slices['v'].loc[f,(region,MI['a'],activity)] = 0
+                journal.record('v',[f],[(region,MI['a'],activity)],0,'set')
         
-        return slices
+        return journal
 
 
     def fill_commodities_inputs(
@@ -397,8 +525,8 @@ class Inventories:
         full_inventory:pd.DataFrame,
         region_to:str,
         activity:str,
-        slices:dict,
-    )->dict:
+        journal:EditJournal,
+    )->EditJournal:
         """
         Fills the commodities inputs for a given region and activity.
 
@@ -406,10 +534,10 @@ class Inventories:
             full_inventory (pandas.DataFrame): The full inventory data.
             region_to (str): The target region.
             activity (str): The target activity.
-            slices (dict): The slices to fill.
+            journal (EditJournal): The journal where the edits are recorded.
 
         Returns:
-            dict: The updated slices.
+            EditJournal: The updated journal.
         """
         inventory = full_inventory.query(f"Item=='{MI['c']}'") 
         
@@ -417,7 +545,7 @@ class Inventories:
             
             # get all the necessary information of the input item
             input_item = inventory.loc[i,"DB Item"]
-            if input_item in self.builder.sut.get_index(MI['c']):
+            if input_item in self.builder.indices.get_set(MI['c']):
                 is_new = False
             else:
                 is_new = True
@@ -427,21 +555,17 @@ class Inventories:
             change_type = inventory.loc[i,'Type']
 
             if change_type == 'Update':
-                if region_from in self.builder.sut.get_index(MI['r']):
-                    slices['u'].loc[(region_from,MI['c'],input_item),(region_to,MI['a'],activity)] += quantity
+                if region_from in self.builder.indices.get_set(MI['r']):
+                    journal.record('u',[(region_from,MI['c'],input_item)],[(region_to,MI['a'],activity)],quantity)
             
                 elif region_from in self.builder.regions_maps:
-                    if not is_new:
-                        com_use = self.builder.sut.u.loc[(self.builder.regions_maps[region_from],sn,input_item),(region_to,sn,sn)]                    
-                        u_share = com_use.sum(1)/com_use.sum().sum()*quantity
-                        if isinstance(u_share,pd.Series):
-                            u_share = u_share.to_frame()
-                        u_share.columns = pd.MultiIndex.from_arrays([[region_to],[MI['a']],[activity]])
-                        slices['u'].loc[u_share.index,u_share.columns] += u_share.values
-                    else:
-                        slices['u'].loc[(region_to,MI['c'],input_item),(region_to,MI['a'],activity)] += quantity
-
-        return slices
+                    u_share = None if is_new else self.cluster_shares.get_shares(region_from,input_item,region_to)
+                    if u_share is not None and u_share.sum() > 0:
+                        journal.record('u',list(u_share.index),[(region_to,MI['a'],activity)],u_share.values*quantity)
+                    else: # commodities not supplied in the base u, as those added by FIONA when activities are filled again
+                        journal.record('u',[(region_to,MI['c'],input_item)],[(region_to,MI['a'],activity)],quantity)
+
+        return journal
 
     def fill_fact_sats_inputs(
         self,
@@ -449,8 +573,8 @@ class Inventories:
         region_to: str,
         activity: str,
         matrix: str,
-        slices:str
-    )->dict:
+        journal:EditJournal
+    )->EditJournal:
         """
         Fills the fact sats inputs based on the given parameters.
 
@@ -459,10 +583,10 @@ class Inventories:
             region_to (str): The region to fill the fact sats inputs for.
             activity (str): The activity to fill the fact sats inputs for.
             matrix (str): The matrix type ('v' or 'e').
-            slices (dict): The slices to fill.
+            journal (EditJournal): The journal where the edits are recorded.
 
         Returns:
-            dict: The updated slices.
+            EditJournal: The updated journal.
         """
         if matrix == 'v':
             inventory = full_inventory.query(f"Item=='{MI['f']}'")
@@ -475,24 +599,24 @@ class Inventories:
             change_type = inventory.loc[i, 'Type']
 
             if change_type == 'Update':
-                slices[matrix].loc[input_item, (region_to, MI['a'], activity)] += quantity
+                journal.record(matrix, [input_item], [(region_to, MI['a'], activity)], quantity)
             if change_type == 'Percentage':
                 if activity in self.parented_activities:
-                    parent_activity = self.builder.master_sheet.query(f"{MI['a']}==@activity")[f'Parent {MI["a"]}'].values[0]
+                    parent_activity = self.builder.master_index.get_activity(activity)[f'Parent {MI["a"]}']
                     old_value = self.matrices[matrix].loc[input_item, (region_to, MI['a'], parent_activity)]
-                    slices[matrix].loc[input_item, (region_to, MI['a'], activity)] += old_value*(1+quantity)
+                    journal.record(matrix, [input_item], [(region_to, MI['a'], activity)], old_value*(1+quantity))
                 else:
                     raise ValueError(f"It's not possible to apply a percentage change to activity {activity} because it has no parent activity")
         
-        return slices
+        return journal
 
     def fill_market_shares(
         self,
         activity:str,
         region:str,
         cluster_region:str,
-        slices:dict
-    )->dict:
+        journal:EditJournal
+    )->EditJournal:
         """
         Fills the market shares for a given activity and region.
 
@@ -500,30 +624,25 @@ class Inventories:
         - activity (str): The activity for which market shares need to be filled.
         - region (str): The region for which market shares need to be filled.
         - cluster_region (str): The cluster region for which market shares need to be filled.
-        - slices (dict): The slices to fill.
+        - journal (EditJournal): The journal where the edits are recorded.
 
         Returns:
-        - dict: The updated slices.
+        - EditJournal: The updated journal.
         """
 
-        market_shares = self.builder.master_sheet.query(f"{MI['a']}==@activity & {MI['r']}==@cluster_region")['Market share'].values
-        for i in range(len(market_shares)):
-            if pd.isna(market_shares[i]):
-                market_shares[i] = 0
-        
-        commodities = self.builder.master_sheet.query(f"{MI['a']}==@activity & {MI['r']}==@cluster_region")[MI['c']].values
-        for i in range(len(commodities)):
-            slices['s'].loc[(region,MI['a'],activity),(region,MI['c'],commodities[i])] = market_shares[i]
+        for row in self.builder.master_index.get_rows(activity,cluster_region):
+            market_share = 0 if pd.isna(row['Market share']) else row['Market share']
+            journal.record('s',[(region,MI['a'],activity)],[(region,MI['c'],row[MI['c']])],market_share,'set')
         
-        return slices
+        return journal
 
     def fill_final_demand(
         self,
         activity:str,
         region:str,
         cluster_region:str,
-        slices:dict
-    )->dict:
+        journal:EditJournal
+    )->EditJournal:
         """
         Fills the final demand for a given activity and region.
 
@@ -531,62 +650,37 @@ class Inventories:
             activity (str): The activity for which the final demand needs to be filled.
             region (str): The region for which the final demand needs to be filled.
             cluster_region (str): The cluster region for which the final demand needs to be filled.
-            slices (dict): The slices to fill.
+            journal (EditJournal): The journal where the edits are recorded.
 
         Returns:
-            dict: The updated slices.
+            EditJournal: The updated journal.
         """
-        total_outputs = self.builder.master_sheet.query(f"{MI['a']}==@activity & {MI['r']}==@cluster_region")['Total output'].values
-        for i in range(len(total_outputs)):
-            if pd.isna(total_outputs[i]):
-                total_outputs[i] = 0
-
-        cons_categories = self.builder.master_sheet.query(f"{MI['a']}==@activity & {MI['r']}==@cluster_region")[MI['n']].values
-        new_cons_categories = []
-        
-        for i in range(len(cons_categories)):
-            if pd.isna(cons_categories[i]):
-                new_cons_categories += [self.matrices['Y'].columns.get_level_values(-1)[0]]
-            else:
-                new_cons_categories += [cons_categories[i]]
-
         cons_region = region # could be easily changed by adding a new column in the master file
-        commodities = self.builder.master_sheet.query(f"{MI['a']}==@activity & {MI['r']}==@cluster_region")[MI['c']].values
 
-        for i in range(len(commodities)):
-            slices['Y'].loc[(region,MI['c'],commodities[i]),(cons_region,MI['n'],new_cons_categories[i])] += total_outputs[i]
+        for row in self.builder.master_index.get_rows(activity,cluster_region):
+            total_output = 0 if pd.isna(row['Total output']) else row['Total output']
+            if pd.isna(row[MI['n']]):
+                cons_category = self.matrices['Y'].columns.get_level_values(-1)[0]
+            else:
+                cons_category = row[MI['n']]
+            journal.record('Y',[(region,MI['c'],row[MI['c']])],[(cons_region,MI['n'],cons_category)],total_output)
 
-        return slices   
+        return journal
 
     def leave_empty(
             self, 
             sheet_name:str
     ):
         """
-        Check if the 'Leave empty' column for a given activity in the master file is True or False.
+        Check if the 'Leave empty' column for a given inventory sheet in the master file is True or False.
 
         Parameters:
-        - activity (str): The activity to check.
+        - sheet_name (str): The inventory sheet to check.
 
         Returns:
-        - bool: True if the 'Leave empty' column is True, False otherwise.
-
-        Raises:
-        - ValueError: If the 'Leave empty' column is not a boolean or left empty.
-        """
-        empty = self.builder.master_sheet.query(f"`Sheet name`==@sheet_name")['Leave empty'].values[0]
-        if empty == True or empty == False:
-            return empty
-
-        elif isinstance(empty, float):
-            if empty == 1:
-                return True
-            if empty == 0:
-                return False
-            if pd.isna(empty):
-                return False
-        else:
-            raise ValueError(f"'Leave empty' column for inventory {sheet_name} in the master file must be boolean or left empty, got {empty} instead")
+        - bool: True if the 'Leave empty' column is True, False otherwise (already parsed by MasterIndex).
+        """
+        return self.builder.master_index.get_sheet(sheet_name)['Leave empty']
 
     def add_slices(self):
         """
@@ -604,6 +698,242 @@ class Inventories:
             self.matrices[matrix] = self.matrices[matrix].groupby(level=list(range(self.matrices[matrix].index.nlevels)),axis=0).sum()
             self.matrices[matrix] = self.matrices[matrix].groupby(level=list(range(self.matrices[matrix].columns.nlevels)),axis=1).sum()
 
+    def add_sparse_slices(self):
+        """
+        Add slices to the matrices using the sparse backend.
+
+        The base matrices and the filled slices are summed as SparseTable objects over the sorted
+        union of their labels, the new activities and commodities are added as empty rows and columns
+        to Y, v and e, and z is rebuilt from u and s. Matrices are converted to the dense pd.DataFrames
+        expected by mario only at the end, while the sparse ones are kept in 'sparse_matrices'.
+        """
+        sparse_matrices = {}
+        for matrix in _matrix_slices_map:
+            base = SparseTable.from_frame(self.matrices[matrix])
+            sparse_matrices[matrix] = concat_sum([base,self.filled_slices[matrix]])
+
+        new_act_indices = self.filled_slices['s'].index
+        new_com_indices = self.filled_slices['u'].index[self.filled_slices['u'].index.get_level_values(-1).isin(self.new_commodities)]
+        sparse_matrices['Y'] = concat_sum([sparse_matrices['Y']],index=new_act_indices)
+        sparse_matrices['v'] = concat_sum([sparse_matrices['v']],columns=new_com_indices)
+        sparse_matrices['e'] = concat_sum([sparse_matrices['e']],columns=new_com_indices)
+        sparse_matrices['z'] = concat_sum([sparse_matrices['u'],sparse_matrices['s']])
+
+        self.sparse_matrices = sparse_matrices
+        for matrix in sparse_matrices:
+            self.matrices[matrix] = sparse_matrices[matrix].to_frame()
+
+    def add_block_slices(self):
+        """
+        Add slices to the matrices by placing them by position.
+
+        The labels of each new matrix are merged once from the sorted labels of the base matrix and of its
+        filled slice. The new matrix is allocated (in a memory-mapped file if a store is used), the base matrix
+        is copied into place block by block and the non-zero values of the slice are added on top. The new
+        activities and commodities are added as empty rows and columns to Y, v and e, and z is assembled from
+        the new u and s. If a store is used, the maps of the base matrices and of the new u and s are removed
+        once consumed, so that only those of the new z, e, v and Y are kept.
+        """
+        new_act_indices = self.filled_slices['s'].index
+        new_com_indices = self.filled_slices['u'].index[self.filled_slices['u'].index.get_level_values(-1).isin(self.new_commodities)]
+        extra_labels = {
+            'Y': (new_act_indices,None),
+            'v': (None,new_com_indices),
+            'e': (None,new_com_indices),
+        }
+
+        for matrix in _matrix_slices_map:
+            base = self.matrices[matrix]
+            filled_slice = self.filled_slices[matrix]
+            extra_index,extra_columns = extra_labels.get(matrix,(None,None))
+            index = merge_labels([base.index,filled_slice.index] + ([extra_index] if extra_index is not None else []))
+            columns = merge_labels([base.columns,filled_slice.columns] + ([extra_columns] if extra_columns is not None else []))
+            self.matrices[matrix] = self.assemble(matrix,[base],[filled_slice],index,columns)
+            if self.store is not None:
+                del base
+                self.store.remove(matrix)
+
+        u,s = self.matrices['u'],self.matrices['s']
+        self.matrices['z'] = self.assemble(
+            'z',
+            [u,s],
+            [],
+            merge_labels([u.index,s.index]),
+            merge_labels([u.columns,s.columns]),
+        )
+        if self.store is not None:
+            # u and s are computed by mario from z when needed, as for a parsed SUT
+            del u,s,self.matrices['u'],self.matrices['s']
+            self.store.remove('z','u_new','s_new')
+
+    def take_block(
+            self,
+            name:str,
+            df:pd.DataFrame,
+            rows:np.ndarray,
+            cols:np.ndarray,
+    )->pd.DataFrame:
+        """
+        Copies a block of a matrix within the memory budget, in RAM if it fits and in a memory-mapped file otherwise.
+
+        Args:
+            name (str): The name of the block.
+            df (pd.DataFrame): The matrix.
+            rows (np.ndarray): Boolean mask of the rows of the block.
+            cols (np.ndarray): Boolean mask of the columns of the block.
+
+        Returns:
+            pd.DataFrame: The block.
+        """
+        index,columns = df.index[rows],df.columns[cols]
+        if not self.budget.fits(get_nbytes(index,columns)):
+            self.budget.spilled.append(name)
+            return self.budget.store.map_frame(name,df,rows,cols)
+        self.budget.allocate(name,get_nbytes(index,columns))
+        return pd.DataFrame(np.nan_to_num(df.values[np.ix_(rows,cols)]),index=index,columns=columns,copy=False)
+
+    def add_lowmem_slices(self):
+        """
+        Add slices to the matrices within the memory budget.
+
+        u and s are released first, since they are only needed to fill the slices. Then Y, v, e and at last z are
+        assembled by placing the base matrix and the slices by position, z straight from the base z and the
+        slices of u and s. Base matrices are still held by the SUT until the new database replaces it, so they
+        are not released from the budget.
+        """
+        for matrix in ['u','s']:
+            del self.matrices[matrix]
+        self._cluster_shares = None
+        self.budget.release('u','s')
+
+        new_act_indices = self.filled_slices['s'].index
+        new_com_indices = self.filled_slices['u'].index[self.filled_slices['u'].index.get_level_values(-1).isin(self.new_commodities)]
+        extra_labels = {
+            'Y': (new_act_indices,None),
+            'v': (None,new_com_indices),
+            'e': (None,new_com_indices),
+        }
+        for matrix in ['Y','v','e']:
+            filled_slice = self.filled_slices[matrix]
+            extra_index,extra_columns = extra_labels[matrix]
+            base = self.matrices.pop(matrix)
+            index = merge_labels([base.index,filled_slice.index] + ([extra_index] if extra_index is not None else []))
+            columns = merge_labels([base.columns,filled_slice.columns] + ([extra_columns] if extra_columns is not None else []))
+            self.matrices[matrix] = self.assemble_within_budget(matrix,[base],[filled_slice],index,columns)
+
+        u,s = self.filled_slices['u'],self.filled_slices['s']
+        base = self.matrices.pop('z')
+        index = merge_labels([base.index,u.index,s.index])
+        columns = merge_labels([base.columns,u.columns,s.columns])
+        self.matrices['z'] = self.assemble_within_budget('z',[base],[u,s],index,columns)
+
+    def assemble_within_budget(
+            self,
+            matrix:str,
+            frames:list,
+            tables:list,
+            index:pd.Index,
+            columns:pd.Index,
+    )->pd.DataFrame:
+        """
+        Sums dense and sparse matrices into a new matrix with the given labels, allocated within the memory budget
+        (or in the store, if any) and filled by blocks of rows sized by the budget.
+
+        Args:
+            matrix (str): The name of the new matrix.
+            frames (list): The pd.DataFrames to be summed.
+            tables (list): The SparseTable objects to be summed.
+            index (pd.Index): The row labels of the new matrix.
+            columns (pd.Index): The column labels of the new matrix.
+
+        Returns:
+            pd.DataFrame: The new matrix.
+        """
+        name = f"{matrix}_new"
+        if self.store is not None:
+            return self.store.assemble(name,frames,tables,index,columns)
+
+        summed = self.budget.get_frame(name,index,columns)
+        place_blocks(index,columns,frames,tables,summed.values,self.budget.get_rows_per_block(len(columns)))
+        if name in self.budget.spilled:
+            self.budget.store.maps[name].flush()
+        return summed
+
+    def assemble(
+            self,
+            matrix:str,
+            frames:list,
+            tables:list,
+            index:pd.Index,
+            columns:pd.Index,
+    )->pd.DataFrame:
+        """
+        Sums dense and sparse matrices into a new matrix with the given labels, in the store if any.
+
+        Args:
+            matrix (str): The name of the new matrix.
+            frames (list): The pd.DataFrames to be summed.
+            tables (list): The SparseTable objects to be summed.
+            index (pd.Index): The row labels of the new matrix.
+            columns (pd.Index): The column labels of the new matrix.
+
+        Returns:
+            pd.DataFrame: The new matrix.
+        """
+        if self.store is not None:
+            return self.store.assemble(f"{matrix}_new",frames,tables,index,columns)
+        return pd.DataFrame(place_blocks(index,columns,frames,tables),index=index,columns=columns)
+
+    def get_final_demand_contributions(
+            self,
+            activity:str,
+    )->list:
+        """
+        Returns the values added to the final demand by an activity, to be removed if the activity is replaced later.
+
+        Args:
+            activity (str): The activity.
+
+        Returns:
+            list: The contributions, as (row label, column label, value) tuples.
+        """
+        start,end = self.journal_segments[activity]
+        rows,cols,values = self.journal.reduce('Y',start,end)
+        index,columns = self.journal.index['Y'],self.journal.columns['Y']
+        return [(index[r],columns[c],v) for r,c,v in zip(rows,cols,values) if v != 0]
+
+    def get_patch(self)->FIONAPatch:
+        """
+        Returns what was added to the SUT as a patch: the filled slices without their empty rows and columns,
+        the units of the new activities and commodities, a fingerprint of the label sets of the base SUT and
+        the mode of its matrices (always coefficients, as the builder resets SUTs given in flows).
+
+        Raises:
+            AttributeError: If the slices were not filled yet. Use add_from_master() first.
+            ValueError: If some activities replaced others already in the SUT, as a patch can only add new ones.
+
+        Returns:
+            FIONAPatch: The patch.
+        """
+        if not hasattr(self,'filled_slices'):
+            raise AttributeError("Slices not filled yet. Use add_from_master() first")
+
+        replaced = [act for act in self.new_activities if act in self.base_indices.get_set(MI['a'])]
+        if len(replaced) > 0:
+            raise ValueError(f"Activities {replaced} replaced activities already in the SUT, a patch can only add new ones")
+
+        slices = {}
+        for matrix,filled_slice in self.filled_slices.items():
+            if isinstance(filled_slice,pd.DataFrame):
+                filled_slice = SparseTable.from_frame(filled_slice)
+            slices[matrix] = trim_table(filled_slice)
+
+        units = {
+            MI['a']: self.units[MI['a']].loc[self.new_activities],
+            MI['c']: self.units[MI['c']].loc[self.new_commodities],
+        }
+        return FIONAPatch(slices,self.new_activities,self.new_commodities,units,get_index_fingerprint(self.base_indices),'coefficients')
+
     def get_mario_indices(
             self
     ):
@@ -621,26 +951,5 @@ class Inventories:
             >>> mario.get_mario_indices()
             {'r': {'main': [1, 2, 3]}, 'a': {'main': [4, 5, 6]}, ...}
         """       
-        mario_indices = {}
-
-        for item in MI.vars:
-            if item == 'r':
-                mario_indices[item] = {'main': sorted(list(set(self.matrices['z'].index.get_level_values(0))))}
-            if item == 'a' or item == 's':
-                mario_indices[item] = {'main': sorted(list(set(self.matrices['z'].loc[(sn,MI['a'],sn),:].index.get_level_values(2))))}
-            if item == 'c':
-                mario_indices[item] = {'main': sorted(list(set(self.matrices['z'].loc[(sn,MI['c'],sn),:].index.get_level_values(2))))}
-            if item == 'n':
-                mario_indices[item] = {'main': sorted(list(set(self.matrices['Y'].columns.get_level_values(2))))}
-            if item == 'k':
-                mario_indices[item] = {'main': sorted(list(set(self.matrices['e'].index)))}
-            if item == 'f':
-                mario_indices[item] = {'main': sorted(list(set(self.matrices['v'].index)))}
-    
-        self.mario_indices = mario_indices
-
-                                    
-
-
-
-
+        with self.instrumentation.stage('mario_indices'):
+            self.mario_indices = get_mario_indices(self.matrices)
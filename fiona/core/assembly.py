@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+
+def merge_labels(
+        labels:list,
+)->pd.Index:
+    """
+    Returns the sorted union of a list of pd.Index objects.
+
+    Sorted inputs (as the labels of mario matrices) are merged in one linear pass, unsorted ones are sorted.
+
+    Args:
+        labels (list): The pd.Index objects.
+
+    Returns:
+        pd.Index: The sorted union, with the names of the first pd.Index.
+    """
+    merged = labels[0]
+    for other in labels[1:]:
+        if len(other) > 0:
+            merged = merged.union(other,sort=None)
+    if not merged.is_monotonic_increasing:
+        merged = merged.sort_values()
+    return merged.set_names(labels[0].names)
+
+
+def get_positions(
+        labels:pd.Index,
+        subset:pd.Index,
+)->np.ndarray:
+    """
+    Maps the labels of subset to their integer positions in labels.
+
+    Args:
+        labels (pd.Index): The unique labels of the target axis.
+        subset (pd.Index): The labels to be mapped.
+
+    Raises:
+        KeyError: If any label of subset is not in labels.
+
+    Returns:
+        np.ndarray: The positions.
+    """
+    positions = labels.get_indexer(subset)
+    if (positions == -1).any():
+        raise KeyError(f"{subset[positions == -1][0]} not in the labels of the target matrix")
+    return positions
+
+
+def place_blocks(
+        index:pd.Index,
+        columns:pd.Index,
+        frames:list = None,
+        tables:list = None,
+        out:np.ndarray = None,
+        rows_per_block:int = 1024,
+)->np.ndarray:
+    """
+    Sums dense and sparse matrices into one array by placing their values at the positions of their labels.
+
+    Dense matrices are copied block by block of rows, and the non-zero values of the sparse ones are added on top,
+    so that the cost is close to one copy of the inputs, without any groupby or sort of the whole table.
+
+    Args:
+        index (pd.Index): The row labels of the output, including all those of frames and tables.
+        columns (pd.Index): The column labels of the output, including all those of frames and tables.
+        frames (list, optional): The pd.DataFrames to be placed. Defaults to None.
+        tables (list, optional): The SparseTable objects to be placed. Defaults to None.
+        out (np.ndarray, optional): The zero-filled array to be filled (e.g. a np.memmap). Defaults to a new array.
+        rows_per_block (int, optional): Number of rows of the dense matrices copied at once. Defaults to 1024.
+
+    Returns:
+        np.ndarray: The output array.
+    """
+    if out is None:
+        out = np.zeros((len(index),len(columns)))
+
+    for frame in frames or []:
+        row_pos = get_positions(index,frame.index)
+        col_pos = get_positions(columns,frame.columns)
+        values = frame.values
+        for start in range(0,len(row_pos),rows_per_block):
+            block = np.nan_to_num(values[start:start+rows_per_block])
+            out[np.ix_(row_pos[start:start+rows_per_block],col_pos)] += block
+
+    for table in tables or []:
+        coo = table.data.tocoo()
+        np.add.at(out,(get_positions(index,table.index)[coo.row],get_positions(columns,table.columns)[coo.col]),coo.data)
+
+    return out
+
+
+def get_mario_indices(
+        matrices:dict,
+)->dict:
+    """
+    Returns the indices of a mario SUT from the labels of its matrices z, Y, e and v.
+
+    Args:
+        matrices (dict): The matrices.
+
+    Returns:
+        dict: The indices, as {item: {'main': sorted list of labels}}.
+    """
+    mario_indices = {}
+    z_index = matrices['z'].index # labels only, so that values of z are not copied
+
+    for item in MI.vars:
+        if item == 'r':
+            mario_indices[item] = {'main': sorted(list(set(z_index.get_level_values(0))))}
+        if item == 'a' or item == 's':
+            mario_indices[item] = {'main': sorted(list(set(z_index[z_index.get_level_values(1) == MI['a']].get_level_values(2))))}
+        if item == 'c':
+            mario_indices[item] = {'main': sorted(list(set(z_index[z_index.get_level_values(1) == MI['c']].get_level_values(2))))}
+        if item == 'n':
+            mario_indices[item] = {'main': sorted(list(set(matrices['Y'].columns.get_level_values(2))))}
+        if item == 'k':
+            mario_indices[item] = {'main': sorted(list(set(matrices['e'].index)))}
+        if item == 'f':
+            mario_indices[item] = {'main': sorted(list(set(matrices['v'].index)))}
+
+    return mario_indices
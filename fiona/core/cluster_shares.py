@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+
+class ClusterShares:
+
+    def __init__(
+            self,
+            u:pd.DataFrame,
+            regions_maps:dict,
+            excluded:list = None,
+            rows_per_block:int = 1024,
+    ):
+        """
+        Cache of the shares used to split an input supplied by a regions cluster among the regions of the cluster.
+
+        The share of each region of the cluster is its supply of the commodity to all the activities of the
+        target region, over the total supply of the cluster. Supplies of every commodity to every target region
+        are computed once from the base u, in blocks of rows, and shares are cached by (cluster,commodity,region_to).
+        Uses of the excluded activities (e.g. those already added by FIONA, when filled again incrementally or in
+        variants) are left out, so that shares are the same as in the SUT the activities were first added to.
+
+        Args:
+            u (pd.DataFrame): The base u matrix.
+            regions_maps (dict): The regions clusters, as {cluster: list of regions}.
+            excluded (list, optional): The activities whose uses are left out of the supplies. Defaults to None.
+            rows_per_block (int, optional): Number of rows of u summed at once. Defaults to 1024.
+
+        Attributes:
+            u (pd.DataFrame): The base u matrix.
+            regions_maps (dict): The regions clusters.
+            excluded (list): The activities whose uses are left out of the supplies.
+            rows_per_block (int): Number of rows of u summed at once.
+        """
+        self.u = u
+        self.regions_maps = regions_maps
+        self.excluded = list(excluded) if excluded is not None else []
+        self.rows_per_block = rows_per_block
+        self._supplies = None
+        self._shares = {}
+
+    @property
+    def supplies(self)->pd.DataFrame:
+        """
+        Supplies of each row of u to all the activities of each region, as a (rows of u, regions) table.
+        """
+        if self._supplies is None:
+            regions = pd.Index(sorted(set(self.u.columns.get_level_values(0))))
+            one_hot = np.zeros((self.u.shape[1],len(regions)))
+            one_hot[np.arange(self.u.shape[1]),regions.get_indexer(self.u.columns.get_level_values(0))] = 1
+            one_hot[self.u.columns.get_level_values(2).isin(self.excluded)] = 0
+
+            values = self.u.values
+            supplies = np.zeros((self.u.shape[0],len(regions)))
+            for start in range(0,self.u.shape[0],self.rows_per_block):
+                supplies[start:start+self.rows_per_block] = np.nan_to_num(values[start:start+self.rows_per_block]) @ one_hot
+            self._supplies = pd.DataFrame(supplies,index=self.u.index,columns=regions)
+        return self._supplies
+
+    def get_shares(
+            self,
+            cluster:str,
+            commodity:str,
+            region_to:str,
+    )->pd.Series:
+        """
+        Returns the shares of the regions of a cluster in the supply of a commodity to a region.
+
+        Args:
+            cluster (str): The regions cluster.
+            commodity (str): The commodity.
+            region_to (str): The region of the activity using the commodity.
+
+        Returns:
+            pd.Series: The shares, indexed by the rows of u of the commodity in the regions of the cluster.
+        """
+        key = (cluster,commodity,region_to)
+        if key not in self._shares:
+            index = self.supplies.index
+            mask = index.get_level_values(0).isin(self.regions_maps[cluster]) & (index.get_level_values(1) == MI['c']) & (index.get_level_values(2) == commodity)
+            supply = self.supplies.loc[mask,region_to]
+            self._shares[key] = supply/supply.sum()
+        return self._shares[key]
@@ -3,7 +3,21 @@ import mario
 
 from fiona.interactions.excel.exporters import get_fiona_master_template,get_fiona_inventory_templates
 from fiona.interactions.excel.readers import read_fiona_master_template,read_fiona_inventory_templates
+from fiona.interactions.files.readers import is_workbook,read_fiona_master_files,read_fiona_inventory_files
 from fiona.core.add_inventories import Inventories
+from fiona.core.fiona_store import FIONAStore
+from fiona.core.footprints import FootprintSolver
+from fiona.core.units import get_database_units
+from fiona.core.master_index import MasterIndex
+from fiona.core.indices import IndexRegistry
+from fiona.core.instrumentation import Instrumentation,DISABLED
+from fiona.core.mapped import MappedStore
+from fiona.core.memory import MemoryBudget,get_nbytes
+from fiona.core.options import BuildOptions
+from fiona.core.uncertainty import MonteCarlo
+from fiona.core.sut_cache import get_sut_fingerprint,load_sut_from_cache,load_sut_index_from_cache,save_sut_to_cache
+from fiona.core.sut_index import SUTIndex,read_sut_index
+from fiona.core.variants import Variant,get_activity_signature
 from mario.tools.constants import _MASTER_INDEX as MI
 
 from fiona.rules import setup_logger
@@ -14,6 +28,7 @@ from fiona.rules import _MASTER_SHEET_COLUMNS as MS_cols
 from fiona.rules import _REGIONS_MAPS_SHEET_COLUMNS as RMS_cols
 from fiona.rules import _INVENTORY_SHEET_COLUMNS as InvS_cols
 from fiona.rules import _ACCEPTABLES
+from fiona.rules import _FIONA_DATABASE_PATH
 
 logger = setup_logger('DB_builder')
 
@@ -27,6 +42,9 @@ class DB_builder():
         master_file_path:str,
         sut_format:str = 'txt',
         read_master_file:bool = False,
+        cache_dir:str = None,
+        instrumentation:Instrumentation = None,
+        index_only:bool = False,
     ):
         """
         Initialize the DB builder object.
@@ -34,9 +52,12 @@ class DB_builder():
         Args:
             sut_path (str or mario.Database): The path to the SUT file or a mario.Database object.
             sut_mode (str): The mode of the SUT.
-            master_file_path (str): The path to the master file.
+            master_file_path (str): The path to the master file: an Excel workbook, or a directory of Parquet or CSV files (only if read_master_file is True).
             sut_format (str, optional): The format of the SUT file. Defaults to 'txt'.
             read_master_file (bool, optional): Whether to read the master file. Defaults to False.
+            cache_dir (str, optional): Directory where the parsed SUT is cached, keyed by a fingerprint of the source files and sut_mode. Only used for 'txt' and 'xlsx' formats. Defaults to None (no cache).
+            instrumentation (Instrumentation, optional): Records the wall time, peak memory and matrix shapes of each stage of the builder. Defaults to None (disabled).
+            index_only (bool, optional): Whether to read only the indices and units of the SUT ('txt' and 'xlsx' formats), which is enough to generate templates and validate the master sheet and the inventories. Matrices are loaded when add_inventories() is called. Defaults to False.
 
         Raises:
             ValueError: If the sut_mode or sut_format is not acceptable.
@@ -47,24 +68,105 @@ class DB_builder():
         if sut_format not in _ACCEPTABLES['sut_formats']:
             raise ValueError(f"Wrong value for sut_format. Acceptable formats: {_ACCEPTABLES['sut_formats']}")
 
-        logger.info(f"{logmsg['r']} | Parsing SUT from {sut_path}")
-        if sut_format == 'txt':
-            self.sut = mario.parse_from_txt(path=sut_path,table='SUT',mode=sut_mode,)
-        if sut_format == 'xlsx':
-            self.sut = mario.parse_from_excel(path=sut_path,table='SUT',mode=sut_mode,)
-        if sut_format == 'mario':
-            self.sut = sut_path
-        logger.info(f"{logmsg['r']} | SUT parsed successfully")
+        self.fiona_activities = {} # activities added by FIONA, with the signature of their inputs and their final demand contributions
+        self.fiona_conversions = {} # unit conversions of the inventories retrieved from the FIONA database, by sheet
+        self.instrumentation = instrumentation if instrumentation is not None else DISABLED
+
+        self.sut_source = {'path':sut_path,'format':sut_format,'mode':sut_mode,'cache_dir':cache_dir}
+        if index_only and sut_format != 'mario':
+            self.sut = self.read_sut_index()
+        else:
+            self.load_sut()
 
         if not read_master_file:
             self.get_master_template(path=master_file_path)
         else:
             self.read_master_template(path=master_file_path)
 
-        if sut_mode=='flows':
-            logger.info(f"{logmsg['dm']} | It is required to reset the SUT to coefficients")
-            self.sut.reset_to_coefficients(self.sut.scenarios[0])
-            logger.info(f"{logmsg['dm']} | SUT reset to coefficients")
+    @property
+    def is_index_only(self)->bool:
+        """
+        Whether only the indices and units of the SUT are loaded, and not its matrices.
+        """
+        return isinstance(self.sut,SUTIndex)
+
+    def load_sut(self):
+        """
+        Loads the SUT with its matrices from the cache or from its source, storing it in the cache if not there yet,
+        and resets it to coefficients if given in flows.
+        """
+        source = self.sut_source
+        sut = None
+        if source['cache_dir'] is not None and source['format'] != 'mario':
+            with self.instrumentation.stage('load_cache'):
+                fingerprint = get_sut_fingerprint(source['path'],source['format'],source['mode'])
+                sut = load_sut_from_cache(source['cache_dir'],fingerprint)
+            if sut is not None:
+                logger.info("%s | SUT loaded from cache %s",logmsg['r'],source['cache_dir'])
+
+        if sut is None:
+            logger.info("%s | Parsing SUT from %s",logmsg['r'],source['path'])
+            with self.instrumentation.stage('parse_sut',format=source['format']) as stage:
+                if source['format'] == 'txt':
+                    sut = mario.parse_from_txt(path=source['path'],table='SUT',mode=source['mode'],)
+                if source['format'] == 'xlsx':
+                    sut = mario.parse_from_excel(path=source['path'],table='SUT',mode=source['mode'],)
+                if source['format'] == 'mario':
+                    sut = source['path']
+                stage.set_shapes(sut.matrices[sut.scenarios[0]])
+            logger.info("%s | SUT parsed successfully",logmsg['r'])
+
+            if source['cache_dir'] is not None and source['format'] != 'mario':
+                with self.instrumentation.stage('save_cache'):
+                    save_sut_to_cache(sut,source['cache_dir'],fingerprint)
+                logger.info("%s | SUT stored in cache %s",logmsg['w'],source['cache_dir'])
+
+        self.sut = sut
+
+        if source['mode']=='flows':
+            logger.info("%s | It is required to reset the SUT to coefficients",logmsg['dm'])
+            with self.instrumentation.stage('reset_to_coefficients'):
+                self.sut.reset_to_coefficients(self.sut.scenarios[0])
+            logger.info("%s | SUT reset to coefficients",logmsg['dm'])
+
+    def read_sut_index(self)->SUTIndex:
+        """
+        Reads only the indices and units of the SUT, from the cache or from its source files. The matrices are
+        loaded only when needed (see load_sut()).
+
+        Returns:
+            SUTIndex: The indices and units.
+        """
+        source = self.sut_source
+        with self.instrumentation.stage('read_sut_index',format=source['format']):
+            sut = None
+            if source['cache_dir'] is not None:
+                sut = load_sut_index_from_cache(source['cache_dir'],get_sut_fingerprint(source['path'],source['format'],source['mode']))
+            read_from = source['cache_dir'] if sut is not None else source['path']
+            if sut is None:
+                sut = read_sut_index(source['path'],source['format'],source['mode'])
+        logger.info("%s | Indices and units of the SUT read from %s, matrices will be loaded when needed",logmsg['r'],read_from)
+        return sut
+
+    @property
+    def sut(self):
+        return self._sut
+
+    @sut.setter
+    def sut(self, sut):
+        self._sut = sut
+        self._indices = None # label sets are rebuilt only when the SUT is replaced
+        self._footprint_solver = None
+
+    @property
+    def indices(self)->IndexRegistry:
+        """
+        Registry of the label sets of the SUT (frozensets and label-to-position maps), built lazily
+        and invalidated every time the SUT is replaced.
+        """
+        if self._indices is None:
+            self._indices = IndexRegistry(self.sut)
+        return self._indices
 
     def get_master_template(
         self,
@@ -79,9 +181,10 @@ class DB_builder():
         Returns:
             None
         """
-        logger.info(f"{logmsg['w']} | Generating master template in {path}")
-        get_fiona_master_template(self,MS_name,MS_cols,RMS_name,RMS_cols,path)
-        logger.info(f"{logmsg['w']} | Master template generated")
+        logger.info("%s | Generating master template in %s",logmsg['w'],path)
+        with self.instrumentation.stage('get_master_template'):
+            get_fiona_master_template(self,MS_name,MS_cols,RMS_name,RMS_cols,path)
+        logger.info("%s | Master template generated",logmsg['w'])
 
     def read_master_template(
         self,
@@ -92,24 +195,34 @@ class DB_builder():
         Reads the master template from the specified path and performs necessary operations.
 
         Args:
-            path (str): The path to the master template file.
+            path (str): The path to the master template file, or to a directory with the master sheet and the regions map
+                as Parquet or CSV files named after their sheets (e.g. 'Master.parquet' and 'Regions Map.parquet').
             get_inventories (bool, optional): Flag indicating whether to get inventory templates. Defaults to False.
 
         Raises:
             ValueError: If the master sheet is empty.
+            ValueError: If inventory templates are requested for a master not in an Excel workbook.
 
         Returns:
             None
         """
-        logger.info(f"{logmsg['r']} | Reading master template from {path}")
-        master_sheet, self.regions_maps = read_fiona_master_template(self,path,MS_name,RMS_name)
-        logger.info(f"{logmsg['r']} | Master template read successfully")
-
-        self.master_sheet = master_sheet
-        self.get_new_sets()
-        logger.info(f"{logmsg['r']} | New activities and commodities retrieved")
+        logger.info("%s | Reading master template from %s",logmsg['r'],path)
+        with self.instrumentation.stage('read_master') as stage:
+            if is_workbook(path):
+                master_sheet, self.regions_maps = read_fiona_master_template(self,path,MS_name,RMS_name)
+            else:
+                master_sheet, self.regions_maps = read_fiona_master_files(self,path,MS_name,RMS_name)
+            logger.info("%s | Master template read successfully",logmsg['r'])
+
+            self.master_sheet = master_sheet
+            self.master_index = MasterIndex(master_sheet)
+            self.get_new_sets()
+            stage.set_shapes({'master_sheet':master_sheet})
+        logger.info("%s | New activities and commodities retrieved",logmsg['r'])
 
         if get_inventories:
+            if not is_workbook(path):
+                raise ValueError("Inventory templates can only be generated in Excel workbooks")
             self.get_inventory_templates(path=path)
        
        
@@ -118,73 +231,476 @@ class DB_builder():
         source:str,
         scenario:str = 'baseline',
         add_to_FIONA:bool = False,
+        *,
+        incremental:bool = False,
+        fiona_path:str = None,
+        options:BuildOptions = None,
     ):        
         """
         Adds inventories to the database.
 
         Args:
-            source (str): The source of the inventories. Currently supports 'excel' and 'FIONA'.
+            source (str): The source of the inventories. Currently supports 'excel', 'files' (inventories read with read_inventories() from Parquet or CSV files) and 'FIONA' (inventories of the master sheet retrieved from the FIONA database for their activities and regions, without parsing workbooks nor converting again the units of unchanged rows).
             scenario (str, optional): The scenario to add the inventories to. Defaults to 'baseline'.
+            add_to_FIONA (bool, optional): Whether to store the added inventories, with quantities converted to the units of the SUT, in the FIONA database. Defaults to False.
+            incremental (bool, optional): Whether to apply only the activities that are new or whose master rows or inventories changed since they were added, replacing the latter in place, and to update the current mario.Database instead of building a new one. Defaults to False.
+            fiona_path (str, optional): The path to the FIONA database file. Defaults to None (_FIONA_DATABASE_PATH, in the '.fiona' folder of the user home).
+            options (BuildOptions, optional): How the matrices are built: backend, storage, storage_dir, workers, assembly and memory budget (see BuildOptions). With a memory budget, the peak reached is stored in the 'memory_report' attribute, and a warning is logged if it exceeds the budget. Defaults to None (the default options).
 
         Raises:
             ValueError: If the source is not one of the acceptable inventory sources.
             AttributeError: If the inventories have not been parsed yet. Use read_inventories() first.
-            NotImplementedError: If the source is 'FIONA' (not implemented yet).
+            AttributeError: If the source is 'FIONA' and the master sheet has not been parsed yet. Use read_master_template() first.
+            KeyError: If the source is 'FIONA' and any inventory sheet of the master sheet is not in the FIONA database for its activity and region.
 
         Returns:
             None
         """
         if source not in _ACCEPTABLES['inventory_sources']:
             raise ValueError(f"Source {source} not in {_ACCEPTABLES}")
+        options = options if options is not None else BuildOptions()
+        fiona_path = fiona_path or _FIONA_DATABASE_PATH
+
+        if self.is_index_only:
+            self.load_sut()
+
+        if source == 'FIONA':
+            if not hasattr(self, 'master_index'):
+                raise AttributeError("Master sheet not parsed yet. Use read_master_template() first")
+            with self.instrumentation.stage('read_FIONA'):
+                self.inventories,self.fiona_conversions = FIONAStore(fiona_path).get_inventories(self.master_index)
+            logger.info("%s | Inventories retrieved from FIONA database %s",logmsg['dm'],fiona_path)
         
-        logger.info(f"{logmsg['a']} | Erasing all scenarios but {scenario}")
+        logger.info("%s | Erasing all scenarios but %s",logmsg['a'],scenario)
 
         err_msg = []
         for inventory in self.inventories:
-            if inventory in self.sut.get_index(MI['a']):
+            if inventory in self.indices.get_set(MI['a']) and not (incremental and inventory in self.fiona_activities):
                 err_msg.append(inventory)
         if len(err_msg) > 0:
             raise ValueError(f"Activities already exist in the SUT: {sorted(list(set(err_msg)))} ")
 
-        matrices = {
-            'z': self.sut.get_data(matrices=['z'],scenarios=[scenario])[scenario][0],
-            'e': self.sut.get_data(matrices=['e'],scenarios=[scenario])[scenario][0],
-            'v': self.sut.get_data(matrices=['v'],scenarios=[scenario])[scenario][0],
-            'Y': self.sut.get_data(matrices=['Y'],scenarios=[scenario])[scenario][0],
-        }
+        activities = None
+        if incremental:
+            signatures = {activity:self.get_activity_signature(activity) for activity in self.new_activities}
+            activities = [act for act in self.new_activities if self.fiona_activities.get(act,{}).get('signature') != signatures[act]]
+            self.new_commodities = [com for com in self.new_commodities if com not in self.indices.get_set(MI['c'])]
+            if len(activities) == 0:
+                logger.info("%s | No new or changed activities to be added",logmsg['dm'])
+                return
+            logger.info("%s | Adding incrementally activities %s",logmsg['dm'],activities)
+
+        store = None
+        budget = MemoryBudget(options.memory_budget,spill_dir=options.storage_dir) if options.memory_budget is not None else None
+        with self.instrumentation.stage('get_base_matrices',storage=options.storage) as stage:
+            if options.storage == 'mmap':
+                # base matrices are written straight from the SUT to the maps, without intermediate copies
+                store = MappedStore(options.storage_dir)
+                matrices = {m: store.map_frame(m,self.sut.matrices[scenario][m]) for m in ['z','e','v','Y']}
+                logger.info("%s | Base matrices memory-mapped in %s",logmsg['dm'],store.directory)
+            elif budget is not None:
+                matrices = {m: self.sut.matrices[scenario][m] for m in ['z','e','v','Y']}
+                for m,matrix in matrices.items():
+                    budget.allocate(f"{m}_base",get_nbytes(matrix.index,matrix.columns))
+            else:
+                matrices = {
+                    'z': self.sut.get_data(matrices=['z'],scenarios=[scenario])[scenario][0],
+                    'e': self.sut.get_data(matrices=['e'],scenarios=[scenario])[scenario][0],
+                    'v': self.sut.get_data(matrices=['v'],scenarios=[scenario])[scenario][0],
+                    'Y': self.sut.get_data(matrices=['Y'],scenarios=[scenario])[scenario][0],
+                }
+            stage.set_shapes(matrices)
+        self.store = store
+
+        if budget is not None:
+            logger.info("%s | Base matrices referenced from the SUT, with a memory budget of %.2f GiB",logmsg['dm'],options.memory_budget/2**30)
+
+        replaced = [act for act in (activities or []) if act in self.fiona_activities]
+        reset = None
+        if len(replaced) > 0:
+            reset = self.reset_fiona_activities(matrices,replaced)
+            logger.info("%s | Activities %s reset to be replaced in place",logmsg['dm'],replaced)
+
+        try:
+            if source in ['excel','files','FIONA']:
+                if not hasattr(self, 'inventories'):
+                    raise AttributeError("Inventories not parsed yet. Use read_inventories() first")
+
+                self.Inv_builder = Inventories(self,matrices=matrices,options=options,store=store,budget=budget,activities=activities)
+                del matrices # the copies of the base matrices are released by Inventories once assembled
+                with self.instrumentation.stage('add_from_master',backend=options.backend,assembly=options.assembly,workers=options.workers) as stage:
+                    self.Inv_builder.add_from_master()
+                    stage.set_shapes(self.Inv_builder.matrices)
+                    if budget is not None:
+                        self.memory_report = budget.report()
+                        stage.set_info(memory=self.memory_report)
+                if budget is not None and self.memory_report['within_budget']:
+                    logger.info("%s | Peak of matrices held in memory %.2f GiB, within a budget of %.2f GiB (spilled to disk: %s)",logmsg['dm'],self.memory_report['peak']/2**30,options.memory_budget/2**30,self.memory_report['spilled'])
+                elif budget is not None:
+                    logger.warning("%s | Peak of matrices held in memory %.2f GiB, over the budget of %.2f GiB: the base matrices alone do not fit in it (spilled to disk: %s)",logmsg['a'],self.memory_report['peak']/2**30,options.memory_budget/2**30,self.memory_report['spilled'])
+
+                logger.info("%s | Inventories added to '%s' scenario",logmsg['dm'],scenario)
+                new_matrices = {'baseline': self.Inv_builder.matrices}
+                new_units = self.Inv_builder.units
+                indices = self.Inv_builder.mario_indices
+
+                for activity in self.Inv_builder.new_activities:
+                    self.fiona_activities[activity] = {
+                        'signature': self.get_activity_signature(activity), # computed after filling, when lazy inventories were already parsed
+                        'Y': self.Inv_builder.get_final_demand_contributions(activity),
+                    }
         
-        if source == 'excel':
-            if not hasattr(self, 'inventories'):
-                raise AttributeError("Inventories not parsed yet. Use read_inventories() first")
+                # add to FIONA
+                if add_to_FIONA:
+                    with self.instrumentation.stage('add_to_FIONA'):
+                        n_rows = self.store_in_FIONA(fiona_path,self.Inv_builder.new_activities)
+                    logger.info("%s | %s inventory rows added to FIONA database %s",logmsg['dm'],n_rows,fiona_path)
+
+            new_matrices['baseline']['EY'] = self.sut.matrices[scenario]['EY'] if budget is not None else self.sut.get_data(matrices=['EY'],scenarios=[scenario])[scenario][0]
+
+            if incremental:
+                # update the current mario instance, as mario does when initialized by parsers
+                self.sut.matrices = new_matrices
+                self.sut._indeces = indices
+                self.sut.units = new_units
+                self._indices = None
+                logger.info("%s | mario.Database instance updated in place",logmsg['dm'])
+                return
+
+            # initialize new mario instance
+            logger.info("%s | Initializing new mario.Database instance",logmsg['dm'])
+            with self.instrumentation.stage('mario_init') as stage:
+                self.sut = mario.Database(
+                    name=None,
+                    table='SUT',
+                    source=None,
+                    year=None,
+                    init_by_parsers={"matrices": new_matrices, "_indeces": indices, "units": new_units},
+                    calc_all=False,
+                    )
+                stage.set_shapes(new_matrices['baseline'])
+            logger.info("%s | New mario.Database instance initialized",logmsg['dm'])
+        except BaseException:
+            if budget is not None and reset is not None:
+                # base matrices are the ones of the SUT, which is left as it was
+                self.restore_fiona_activities(self.sut.matrices[scenario],reset)
+            if store is not None:
+                store.close()
+            if budget is not None:
+                budget.close()
+            raise
+
+    def get_activity_signature(
+        self,
+        activity:str,
+    )->str:
+        """
+        Returns a fingerprint of everything an activity is built from: its master rows, its inventories and the regions maps.
 
-            self.Inv_builder = Inventories(self,matrices)
-            self.Inv_builder.add_from_master()
+        Args:
+            activity (str): The activity.
 
-            logger.info(f"{logmsg['dm']} | Inventories added to '{scenario}' scenario")
-            new_matrices = {'baseline': self.Inv_builder.matrices}
-            new_units = self.Inv_builder.units
-            indices = self.Inv_builder.mario_indices
-        
-            # add to FIONA
-            if add_to_FIONA:
-                logger.info(f"{logmsg['w']} | Adding inventories to FIONA SQL database")
+        Returns:
+            str: The fingerprint.
+        """
+        return get_activity_signature(self.master_index,self.inventories,self.regions_maps,activity)
 
-        if source == 'FIONA':
-            raise NotImplementedError("FIONA inventories not implemented yet")
-
-        new_matrices['baseline']['EY'] = self.sut.get_data(matrices=['EY'],scenarios=[scenario])[scenario][0]
-
-        # initialize new mario instance
-        logger.info(f"{logmsg['dm']} | Initializing new mario.Database instance")
-        self.sut = mario.Database(
-            name=None,
-            table='SUT',
-            source=None,
-            year=None,
-            init_by_parsers={"matrices": new_matrices, "_indeces": indices, "units": new_units},
-            calc_all=False,
-            )
-        logger.info(f"{logmsg['dm']} | New mario.Database instance initialized")
+    def save_patch(
+        self,
+        path:str,
+    ):
+        """
+        Stores what the last call of add_inventories() added to the SUT as a compact patch file, which extends
+        any SUT with the same label sets through fiona.core.patches.apply_patch(), without the master sheet
+        and the inventories.
+
+        Args:
+            path (str): The path to the patch file.
+
+        Raises:
+            AttributeError: If no inventories were added yet. Use add_inventories() first.
+            ValueError: If the last call replaced activities already in the SUT (e.g. incremental=True).
+        """
+        if not hasattr(self,'Inv_builder'):
+            raise AttributeError("No inventories added yet. Use add_inventories() first")
+
+        with self.instrumentation.stage('save_patch') as stage:
+            patch = self.Inv_builder.get_patch()
+            patch.save(path)
+            stage.set_info(nnz=patch.nnz)
+        logger.info("%s | Patch of %s activities and %s commodities (%s values) stored in %s",logmsg['w'],len(patch.activities),len(patch.commodities),patch.nnz,path)
+
+    def get_footprints(
+        self,
+        activities:list = None,
+        by_region:bool = False,
+        scenario:str = 'baseline',
+    ):
+        """
+        Returns the footprints of one unit of output of the activities added by FIONA, without computing the full Leontief inverse.
+
+        Only the columns of the Leontief inverse of the activities are solved, with a sparse factorization of (I-z)
+        that is cached and reused until the matrices of the SUT are replaced (e.g. by add_inventories()).
+
+        Args:
+            activities (list, optional): The activities. Defaults to None (all the activities added by FIONA, as in Inventories.new_activities).
+            by_region (bool, optional): Whether to break down the footprints by the region where they occur. Defaults to False.
+            scenario (str, optional): The scenario of the SUT. Defaults to 'baseline'.
+
+        Raises:
+            ValueError: If no activities are given and none has been added by FIONA yet.
+            KeyError: If any activity is not in the SUT.
+
+        Returns:
+            pd.DataFrame: The footprints, with the activities (in each of their regions) on columns and the satellite
+                accounts (and the regions where they occur, if by_region) on rows.
+        """
+        if activities is None:
+            activities = list(self.fiona_activities)
+            if len(activities) == 0:
+                raise ValueError("No activities added by FIONA yet. Use add_inventories() first or give the activities")
+
+        solver = self.get_footprint_solver(scenario)
+        with self.instrumentation.stage('footprints',activities=len(activities),by_region=by_region):
+            return solver.get_footprints(activities,by_region)
+
+    def get_footprint_solver(
+        self,
+        scenario:str = 'baseline',
+    )->FootprintSolver:
+        """
+        Returns the footprint solver of a scenario of the SUT, factorizing (I-z) only if its matrices were replaced
+        since the last call.
+
+        Args:
+            scenario (str, optional): The scenario of the SUT. Defaults to 'baseline'.
+
+        Returns:
+            FootprintSolver: The solver.
+        """
+        if self.is_index_only:
+            self.load_sut()
+
+        z = self.sut.matrices[scenario]['z']
+        e = self.sut.matrices[scenario]['e']
+        if self._footprint_solver is None or not self._footprint_solver.matches(z,e):
+            with self.instrumentation.stage('factorize',scenario=scenario) as stage:
+                self._footprint_solver = FootprintSolver(z,e)
+                stage.set_shapes({'z':z})
+            logger.info("%s | (I-z) factorized for footprints of '%s' scenario",logmsg['dm'],scenario)
+        return self._footprint_solver
+
+    def run_monte_carlo(
+        self,
+        distributions:list,
+        samples:int = 1000,
+        seed:int = None,
+        satellites:list = None,
+        scenario:str = 'baseline',
+        chunk:int = 256,
+    )->dict:
+        """
+        Propagates the uncertainty of inventory quantities, market shares and total outputs to the footprints of the
+        activities added by FIONA, without rebuilding the database for each sample.
+
+        Each uncertain value is applied once to compute how it changes z, e and the final demand; samples are then
+        evaluated in batches from the factorization of (I-z) shared with get_footprints(). The MonteCarlo object,
+        keeping the drawn values and the footprints of all the samples, is stored in 'monte_carlo'.
+
+        Args:
+            distributions (list): The uncertain values and their distributions. See MonteCarlo for the format.
+            samples (int, optional): The number of samples. Defaults to 1000.
+            seed (int, optional): The seed of the random generator. Defaults to None.
+            satellites (list, optional): The satellite accounts whose footprints are computed. Defaults to None (all).
+            scenario (str, optional): The scenario of the SUT. Defaults to 'baseline'.
+            chunk (int, optional): The number of samples evaluated at once. Defaults to 256.
+
+        Raises:
+            AttributeError: If no activity was added to the SUT yet. Use add_inventories() first.
+            ValueError: If a distribution is not acceptable or an uncertain value is not identified.
+
+        Returns:
+            dict: The summary statistics of the footprints per unit of output ('footprints') and of the final demand
+                added by each activity ('final_demand'), as pd.DataFrames.
+        """
+        with self.instrumentation.stage('monte_carlo_setup',parameters=len(distributions)):
+            self.monte_carlo = MonteCarlo(self,distributions,scenario,satellites)
+        with self.instrumentation.stage('monte_carlo',samples=samples):
+            statistics = self.monte_carlo.run(samples,seed,chunk)
+        logger.info("%s | Footprints of %s samples of %s uncertain values computed",logmsg['dm'],samples,len(distributions))
+        return statistics
+
+    def store_in_FIONA(
+        self,
+        path:str,
+        activities:list,
+    )->int:
+        """
+        Stores the inventories of added activities in the FIONA database, with quantities converted to the units of the SUT.
+
+        Args:
+            path (str): The path to the FIONA database file.
+            activities (list): The activities whose inventories are stored.
+
+        Returns:
+            int: The number of stored rows.
+        """
+        inventories = {activity:self.inventories[activity] for activity in activities if activity in self.inventories}
+        converted = {}
+        for sheets in inventories.values():
+            for sheet_name,inventory in sheets.items():
+                inventory = self.Inv_builder.make_units_consistent_to_database(inventory.copy())
+                converted[sheet_name] = (inventory[self.Inv_builder.converted_quantity_column],get_database_units(inventory,self.Inv_builder.units))
+        return FIONAStore(path).add_inventories(inventories,self.master_index,converted)
+
+    def add_inventory_variants(
+        self,
+        variants:dict,
+        output:str = 'scenarios',
+        workers:int = 1,
+    )->dict:
+        """
+        Builds many variants of the master sheet and inventories over the SUT the activities were added to.
+
+        The base matrices are shared read-only by all the variants. For each variant, only the activities whose
+        master rows or inventories differ from the added ones are filled again, and only their blocks are stored.
+        Matrices are copied only for the variants and matrices actually changed.
+
+        Args:
+            variants (dict): The variants, as {name: spec}. See Variant for the format of spec.
+            output (str, optional): 'scenarios' to add the variants as scenarios of the SUT, 'databases' to return them
+                as separate mario.Database objects, None to keep only their blocks in 'variants'. Defaults to 'scenarios'.
+            workers (int, optional): Number of worker processes filling the slices of each variant. Defaults to 1 (serial).
+
+        Raises:
+            AttributeError: If no activity was added to the SUT yet. Use add_inventories() first.
+            ValueError: If the output is not acceptable or a variant name is already a scenario of the SUT.
+
+        Returns:
+            dict: The variants as {name: mario.Database} if output is 'databases', None otherwise.
+        """
+        if len(self.fiona_activities) == 0:
+            raise AttributeError("No activity added to the SUT yet. Use add_inventories() first")
+        if output not in _ACCEPTABLES['variant_outputs']:
+            raise ValueError(f"Output {output} not in {_ACCEPTABLES['variant_outputs']}")
+        if output == 'scenarios' and any(name in self.sut.scenarios for name in variants):
+            raise ValueError(f"Variant names cannot be existing scenarios: {self.sut.scenarios}")
+
+        base = self.sut.matrices['baseline']
+        read_matrices = self.get_fill_matrices(base)
+        cluster_shares = None
+
+        self.variants = {}
+        databases = {}
+        for name,spec in variants.items():
+            with self.instrumentation.stage('fill_variant',variant=name):
+                variant = Variant(self,name,spec)
+                logger.info("%s | Variant '%s': activities %s changed",logmsg['dm'],name,variant.activities)
+
+                inventories = Inventories(variant,matrices=dict(read_matrices),options=BuildOptions(backend='sparse',workers=workers),activities=variant.activities)
+                if cluster_shares is not None:
+                    inventories._cluster_shares = cluster_shares # shares depend on base u only
+                inventories.fill_journal()
+                cluster_shares = inventories._cluster_shares
+
+                variant.blocks = {matrix:inventories.journal.to_sparse(matrix) for matrix in inventories.journal.matrices}
+                variant.final_demand = [c for act in variant.activities for c in inventories.get_final_demand_contributions(act)]
+            self.variants[name] = variant
+
+            if output == 'scenarios':
+                self.sut.matrices[name] = variant.get_matrices(base)
+                logger.info("%s | Variant '%s' added as scenario",logmsg['dm'],name)
+            if output == 'databases':
+                databases[name] = mario.Database(
+                    name=None,
+                    table='SUT',
+                    source=None,
+                    year=None,
+                    init_by_parsers={"matrices": {'baseline': variant.get_matrices(base)}, "_indeces": self.sut._indeces, "units": self.sut.units},
+                    calc_all=False,
+                    )
+                logger.info("%s | Variant '%s' initialized as new mario.Database instance",logmsg['dm'],name)
+
+        if output == 'databases':
+            return databases
+
+    def get_fill_matrices(
+        self,
+        base:dict,
+    )->dict:
+        """
+        Returns the matrices read to fill activities again over the SUT they were added to: u and s without the
+        activities added by FIONA, the other matrices shared with base.
+
+        Args:
+            base (dict): The matrices z, e, v and Y of the SUT.
+
+        Returns:
+            dict: The matrices z, u, s, e, v and Y.
+        """
+        z = base['z']
+        keep_rows = ~((z.index.get_level_values(1) == MI['a']) & z.index.get_level_values(2).isin(self.new_activities))
+        keep_cols = ~((z.columns.get_level_values(1) == MI['a']) & z.columns.get_level_values(2).isin(self.new_activities))
+        return {
+            'z': z,
+            'u': z.loc[keep_rows & (z.index.get_level_values(1) == MI['c']),keep_cols & (z.columns.get_level_values(1) == MI['a'])],
+            's': z.loc[keep_rows & (z.index.get_level_values(1) == MI['a']),keep_cols & (z.columns.get_level_values(1) == MI['c'])],
+            'e': base['e'],
+            'v': base['v'],
+            'Y': base['Y'],
+        }
+
+    def reset_fiona_activities(
+        self,
+        matrices:dict,
+        activities:list,
+    ):
+        """
+        Resets activities previously added by FIONA, so that they can be filled again in place.
+
+        Their rows and columns of z and their columns of v and e are set to zero, and the values
+        they added to the final demand are removed from Y.
+
+        Args:
+            matrices (dict): The matrices z, e, v and Y, edited in place.
+            activities (list): The activities to be reset.
+
+        Returns:
+            dict: The values that were reset, as {matrix: [(rows, columns, values)]}, to be put back by restore_fiona_activities().
+        """
+        z = matrices['z']
+        rows = (z.index.get_level_values(1) == MI['a']) & z.index.get_level_values(2).isin(activities)
+        cols = (z.columns.get_level_values(1) == MI['a']) & z.columns.get_level_values(2).isin(activities)
+        reset = {'z': [(rows,slice(None),z.loc[rows,:].copy()),(slice(None),cols,z.loc[:,cols].copy())],'Y': []}
+        z.loc[rows,:] = 0
+        z.loc[:,cols] = 0
+        for matrix in ['v','e']:
+            cols = (matrices[matrix].columns.get_level_values(1) == MI['a']) & matrices[matrix].columns.get_level_values(2).isin(activities)
+            reset[matrix] = [(slice(None),cols,matrices[matrix].loc[:,cols].copy())]
+            matrices[matrix].loc[:,cols] = 0
+
+        for activity in activities:
+            for row,col,value in self.fiona_activities[activity]['Y']:
+                reset['Y'].append((row,col,matrices['Y'].loc[row,col]))
+                matrices['Y'].loc[row,col] -= value
+
+        return reset
+
+    def restore_fiona_activities(
+        self,
+        matrices:dict,
+        reset:dict,
+    ):
+        """
+        Puts back the values of activities reset by reset_fiona_activities(), e.g. when adding them again fails.
+
+        Args:
+            matrices (dict): The matrices z, e, v and Y, edited in place.
+            reset (dict): The values that were reset, as returned by reset_fiona_activities().
+        """
+        for matrix,values in reset.items():
+            for rows,cols,value in reversed(values): # the first values stored are the original ones
+                matrices[matrix].loc[rows,cols] = value
 
     def get_new_sets(self):
         """
@@ -193,17 +709,17 @@ class DB_builder():
         Returns:
             None
         """
-        self.new_activities = self.master_sheet[MI['a']].unique()
+        self.new_activities = self.master_index.activities
         new_commodities = self.master_sheet[MI['c']].unique()
 
         # excluding already existing commodities
-        self.new_commodities = [com for com in new_commodities if com not in self.sut.get_index(MI['c'])]
+        self.new_commodities = [com for com in new_commodities if com not in self.indices.get_set(MI['c'])]
 
         # listing activities that have a parent
         parented_activities = []
         for act in self.new_activities:
-            parent = self.master_sheet.query(f'{MI["a"]} == "{act}"')[f'Parent {MI["a"]}'].values[0]
-            if isinstance(parent, str):
+            parent = self.master_index.get_activity(act)[f'Parent {MI["a"]}']
+            if parent is not None:
                 parented_activities.append(act)
         
         # listing activities that don't have a parent
@@ -226,29 +742,41 @@ class DB_builder():
 
         Args:
             path (str): The path where the inventory templates will be saved.
-            overwrite (bool, optional): Specifies whether to overwrite existing templates. Defaults to True.
+            overwrite (bool, optional): Specifies whether to overwrite existing templates. If False, only the missing templates are added. Defaults to True.
         """
-        new_sheets = self.master_sheet['Sheet name'].unique()
-        logger.info(f"{logmsg['w']} | Getting inventory templates from the master sheet")
-        get_fiona_inventory_templates(new_sheets, self.sut.units, InvS_cols, overwrite, path)
-        logger.info(f"{logmsg['w']} | Inventory templates saved to {path}")
+        new_sheets = self.master_index.sheet_names
+        logger.info("%s | Getting inventory templates from the master sheet",logmsg['w'])
+        with self.instrumentation.stage('get_inventory_templates',sheets=len(new_sheets)):
+            get_fiona_inventory_templates(self, new_sheets, InvS_cols, overwrite, path)
+        logger.info("%s | Inventory templates saved to %s",logmsg['w'],path)
 
-    def read_inventories(self, path: str,check_errors:bool=False):
+    def read_inventories(self, path: str,check_errors:bool=False,lazy:bool=False):
         """
         Reads inventory templates from the specified path and stores them in the 'inventories' attribute.
 
         Args:
-            path (str): The path to the inventory templates.
+            path (str): The path to the inventory templates: an Excel workbook, a directory of Parquet or CSV files
+                named after the inventory sheets, or a long-format Parquet or CSV file with a 'Sheet name' column.
+            check_errors (bool, optional): Whether to check the inventories for errors. Defaults to False.
+            lazy (bool, optional): Whether to parse the inventory sheets of each activity only when its slices are filled,
+                releasing them once the activity is processed, instead of parsing all of them now. Defaults to False.
 
         Returns:
             None
         """
-        self.inventories = read_fiona_inventory_templates(self, path, check_errors)
+        with self.instrumentation.stage('read_inventories') as stage:
+            if is_workbook(path):
+                self.inventories = read_fiona_inventory_templates(self, path, check_errors, lazy)
+            else:
+                self.inventories = read_fiona_inventory_files(self, path, check_errors, lazy)
+            self.fiona_conversions = {}
+            sheets_by_activity = getattr(self.inventories,'sheets_by_activity',self.inventories) # lazy inventories are not parsed to be counted
+            stage.set_info(sheets=sum(len(sheets) for sheets in sheets_by_activity.values()))
         if check_errors:
             additional_log = "| No errors found"
         else:
             additional_log = ""
-        logger.info(f"{logmsg['r']} | Inventories read from {path} {additional_log}")
+        logger.info("%s | Inventories read from %s %s",logmsg['r'],path,additional_log)
 
 
 
@@ -0,0 +1,233 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from fiona.core.master_index import MasterIndex
+from fiona.rules import _INVENTORY_SHEET_COLUMNS as InvS_cols
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+_SCHEMA_VERSION = 2
+
+# columns of the inventory sheets in the database, in the order of _INVENTORY_SHEET_COLUMNS
+_COLUMNS = ['quantity','unit','input','item','db_item','db_region','type','reference']
+
+# columns of the quantities converted to the units of the SUT in the database, and their names in retrieved conversions
+_CONVERSION_COLUMNS = ['converted_quantity','db_unit']
+_CONVERSION_NAMES = ['Converted quantity','DB unit']
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS inventories (
+        activity TEXT NOT NULL,
+        region TEXT NOT NULL,
+        sheet TEXT NOT NULL,
+        row INTEGER NOT NULL,
+        quantity REAL,
+        unit TEXT,
+        input TEXT,
+        item TEXT,
+        db_item TEXT,
+        db_region TEXT,
+        type TEXT,
+        reference TEXT,
+        converted_quantity REAL,
+        db_unit TEXT,
+        PRIMARY KEY (activity,region,sheet,row)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS inventories_region ON inventories (region)",
+    "CREATE INDEX IF NOT EXISTS inventories_db_item ON inventories (db_item)",
+]
+
+
+class FIONAStore:
+
+    def __init__(
+            self,
+            path:str,
+    ):
+        """
+        Local SQLite database of inventory sheets, so that inventories parsed once can be added again without parsing workbooks.
+
+        Each inventory row is stored with the activity and region of its sheet in the master, the sheet it belongs to,
+        and the quantity converted to the units of the SUT it was added to. Sheets are identified by activity, region
+        and sheet name together, so that masters of different projects reusing sheet names do not overwrite each other.
+        Rows are indexed by activity, region and DB item.
+
+        Args:
+            path (str): The path to the database file, created if missing.
+
+        Raises:
+            ValueError: If the database was created by a different version of the store.
+
+        Attributes:
+            path (str): The path to the database file.
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory,exist_ok=True)
+
+        with self.connect() as connection:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version not in [0,_SCHEMA_VERSION]:
+                raise ValueError(f"FIONA database {path} has schema version {version}, expected {_SCHEMA_VERSION}")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    @contextmanager
+    def connect(self):
+        """
+        Opens a connection to the database as a context manager: the transaction is committed (or rolled back on errors)
+        and the connection is closed at exit.
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add_inventories(
+            self,
+            inventories:dict,
+            master_index:MasterIndex,
+            converted:dict = None,
+    )->int:
+        """
+        Stores inventory sheets in one transaction, replacing any sheet already stored with the same activity, region and name.
+
+        Args:
+            inventories (dict): The inventories, as {activity: {sheet name: pd.DataFrame}}.
+            master_index (MasterIndex): The parsed master sheet the inventories refer to.
+            converted (dict, optional): The quantities converted to the units of the SUT and the units of the SUT,
+                as {sheet name: (pd.Series, pd.Series)} aligned to the rows of the sheet. Defaults to None.
+
+        Returns:
+            int: The number of stored rows.
+        """
+        converted = converted or {}
+        sheets = []
+        rows = []
+        for activity,sheets_of_activity in inventories.items():
+            for sheet_name,inventory in sheets_of_activity.items():
+                region = master_index.get_sheet(sheet_name)[MI['r']]
+                sheets.append((activity,region,sheet_name))
+                values = inventory.reindex(columns=InvS_cols).astype(object)
+                values = values.where(values.notna(),None).values.tolist()
+                quantities,db_units = converted.get(sheet_name,(None,None))
+                for i,row in enumerate(values):
+                    rows.append((
+                        activity,region,sheet_name,i,*row,
+                        get_value(quantities,i),
+                        get_value(db_units,i),
+                    ))
+
+        with self.connect() as connection:
+            connection.executemany("DELETE FROM inventories WHERE activity = ? AND region = ? AND sheet = ?",sheets)
+            connection.executemany(f"INSERT INTO inventories VALUES ({','.join(['?']*(4+len(_COLUMNS)+len(_CONVERSION_COLUMNS)))})",rows)
+        return len(rows)
+
+    def get_inventories(
+            self,
+            master_index:MasterIndex,
+    )->tuple:
+        """
+        Retrieves all the inventory sheets of a master in one query, skipping those to be left empty.
+
+        Sheets are retrieved by their name together with the activity and region of their master row, so that only
+        sheets stored for the same activity and region are returned.
+
+        Args:
+            master_index (MasterIndex): The parsed master sheet.
+
+        Raises:
+            KeyError: If any inventory sheet of the master is not in the database for its activity and region.
+
+        Returns:
+            tuple: The inventories, as {activity: {sheet name: pd.DataFrame}} with _INVENTORY_SHEET_COLUMNS columns,
+                and the stored conversions to the units of the SUT, as {sheet name: pd.DataFrame} with _CONVERSION_COLUMNS
+                columns aligned to the rows of the sheet (see Inventories.make_units_consistent_to_database()).
+        """
+        wanted = {}
+        for sheet_name in master_index.sheet_names:
+            sheet = master_index.get_sheet(sheet_name)
+            if not sheet['Leave empty']:
+                wanted[sheet_name] = (sheet[MI['a']],sheet[MI['r']])
+
+        with self.connect() as connection:
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (activity TEXT,region TEXT,sheet TEXT,PRIMARY KEY (activity,region,sheet))")
+            connection.execute("DELETE FROM wanted")
+            connection.executemany("INSERT OR IGNORE INTO wanted VALUES (?,?,?)",[(*key,sheet_name) for sheet_name,key in wanted.items()])
+            table = pd.read_sql_query(
+                f"""SELECT i.sheet,{','.join('i.'+c for c in _COLUMNS+_CONVERSION_COLUMNS)} FROM inventories i
+                JOIN wanted w ON i.activity = w.activity AND i.region = w.region AND i.sheet = w.sheet
+                ORDER BY i.sheet,i.row""",
+                connection,
+            )
+
+        missing = sorted(set(wanted) - set(table['sheet']))
+        if len(missing) > 0:
+            missing = [f"{sheet_name} ({wanted[sheet_name][0]}, {wanted[sheet_name][1]})" for sheet_name in missing]
+            raise KeyError(f"Inventory sheets {missing} not in the FIONA database {self.path} for their activity and region")
+
+        table.columns = ['sheet'] + InvS_cols + _CONVERSION_NAMES
+        for column in table.columns[table.dtypes == object]:
+            table[column] = table[column].where(table[column].notna(),np.nan) # NULL values as in parsed sheets
+
+        sheets = {sheet_name:rows.drop(columns='sheet').reset_index(drop=True) for sheet_name,rows in table.groupby('sheet',sort=False)}
+        inventories = {}
+        for sheet_name,(activity,_) in wanted.items():
+            inventories.setdefault(activity,{})[sheet_name] = sheets[sheet_name][InvS_cols]
+        conversions = {sheet_name:rows[['Quantity','Unit']+_CONVERSION_NAMES] for sheet_name,rows in sheets.items()}
+        return inventories,conversions
+
+    def find(
+            self,
+            activity:str = None,
+            region:str = None,
+            db_item:str = None,
+    )->pd.DataFrame:
+        """
+        Retrieves the stored inventory rows of an activity, a region and/or a DB item.
+
+        Args:
+            activity (str, optional): The activity. Defaults to None (any).
+            region (str, optional): The region of the activity in the master. Defaults to None (any).
+            db_item (str, optional): The DB item of the rows. Defaults to None (any).
+
+        Returns:
+            pd.DataFrame: The rows, with the activity, region and sheet they belong to and the converted quantities.
+        """
+        conditions = {'activity':activity,'region':region,'db_item':db_item}
+        conditions = {k:v for k,v in conditions.items() if v is not None}
+        where = f"WHERE {' AND '.join(f'{k} = ?' for k in conditions)}" if conditions else ""
+
+        with self.connect() as connection:
+            return pd.read_sql_query(f"SELECT * FROM inventories {where} ORDER BY activity,region,sheet,row",connection,params=list(conditions.values()))
+
+    def get_sheet_names(self)->list:
+        """
+        Returns the names of the stored inventory sheets.
+
+        Returns:
+            list: The sheet names, sorted.
+        """
+        with self.connect() as connection:
+            return [row[0] for row in connection.execute("SELECT DISTINCT sheet FROM inventories ORDER BY sheet")]
+
+
+def get_value(
+        values:pd.Series,
+        i:int,
+):
+    if values is None:
+        return None
+    value = values.iloc[i]
+    return None if pd.isna(value) else value
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+from scipy.sparse import linalg
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+
+class FootprintSolver:
+
+    def __init__(
+            self,
+            z:pd.DataFrame,
+            e:pd.DataFrame,
+    ):
+        """
+        Computes the footprints of some activities by solving (I-z)x = column for their columns only.
+
+        (I-z) is factorized once with a sparse LU decomposition, which is reused by all the requested columns,
+        and solved columns are kept, so that the full Leontief inverse is never computed. The solver refers to
+        the matrices it was built from: it must be rebuilt when they are replaced (see matches()).
+
+        Args:
+            z (pd.DataFrame): The matrix of technical coefficients of the SUT.
+            e (pd.DataFrame): The matrix of satellite coefficients, with the same columns as z.
+
+        Raises:
+            ValueError: If z is not square or e has not the same columns as z.
+
+        Attributes:
+            z (pd.DataFrame): The matrix of technical coefficients the solver was built from.
+            e (pd.DataFrame): The matrix of satellite coefficients the solver was built from.
+            solutions (dict): The solved columns of the Leontief inverse, by column label of z.
+        """
+        if not z.index.equals(z.columns):
+            raise ValueError("z must have the same labels on rows and columns")
+        if not e.columns.equals(z.columns):
+            raise ValueError("e must have the same columns as z")
+
+        self.z = z
+        self.e = e
+        self.solutions = {}
+
+        coefficients = sparse.csc_matrix(np.nan_to_num(z.values))
+        self.lu = linalg.splu((sparse.identity(z.shape[0],format='csc') - coefficients).tocsc())
+
+    def matches(
+            self,
+            z:pd.DataFrame,
+            e:pd.DataFrame,
+    )->bool:
+        """
+        Returns whether the solver was built from the given matrices, i.e. whether it can be reused for them.
+
+        Matrices are compared by identity, so matrices edited in place are not detected.
+
+        Args:
+            z (pd.DataFrame): The matrix of technical coefficients.
+            e (pd.DataFrame): The matrix of satellite coefficients.
+
+        Returns:
+            bool: True if the solver was built from z and e.
+        """
+        return self.z is z and self.e is e
+
+    def get_activity_labels(
+            self,
+            activities:list,
+    )->pd.Index:
+        """
+        Returns the column labels of z of some activities, in all the regions where they are.
+
+        Args:
+            activities (list): The activities.
+
+        Raises:
+            KeyError: If any activity is not in z.
+
+        Returns:
+            pd.Index: The labels.
+        """
+        columns = self.z.columns
+        is_activity = columns.get_level_values(1) == MI['a']
+        missing = sorted(set(activities) - set(columns[is_activity].get_level_values(2)))
+        if len(missing) > 0:
+            raise KeyError(f"Activities {missing} not in the SUT")
+        return columns[is_activity & columns.get_level_values(2).isin(activities)]
+
+    def solve(
+            self,
+            labels:pd.Index,
+    )->np.ndarray:
+        """
+        Returns the columns of the Leontief inverse (I-z)^-1 of some column labels of z.
+
+        Columns not solved yet are solved at once with the factorization, the others are taken from the solved ones.
+
+        Args:
+            labels (pd.Index): The column labels of z.
+
+        Returns:
+            np.ndarray: The columns, one for each label, with the rows of z.
+        """
+        missing = [label for label in labels if label not in self.solutions]
+        if len(missing) > 0:
+            rhs = np.zeros((self.z.shape[0],len(missing)))
+            rhs[self.z.columns.get_indexer(missing),np.arange(len(missing))] = 1
+            solved = self.lu.solve(rhs)
+            for i,label in enumerate(missing):
+                self.solutions[label] = solved[:,i]
+
+        if len(labels) == 0:
+            return np.zeros((self.z.shape[0],0))
+        return np.column_stack([self.solutions[label] for label in labels])
+
+    def get_footprints(
+            self,
+            activities:list,
+            by_region:bool = False,
+    )->pd.DataFrame:
+        """
+        Returns the footprints of one unit of output of some activities, based on the satellite coefficients e.
+
+        Args:
+            activities (list): The activities.
+            by_region (bool, optional): Whether to break down the footprints by the region where they occur. Defaults to False.
+
+        Returns:
+            pd.DataFrame: The footprints, with the activities (in each of their regions) on columns, and the satellite
+                accounts on rows (the satellite accounts and the regions where they occur, if by_region).
+        """
+        labels = self.get_activity_labels(activities)
+        solutions = self.solve(labels)
+        e = np.nan_to_num(self.e.values)
+
+        if not by_region:
+            return pd.DataFrame(e @ solutions,index=self.e.index,columns=labels)
+
+        regions = self.z.index.get_level_values(0)
+        region_labels = regions.unique().sort_values()
+        membership = sparse.csr_matrix(
+            (np.ones(len(regions)),(region_labels.get_indexer(regions),np.arange(len(regions)))),
+            shape=(len(region_labels),len(regions)),
+        )
+        breakdown = np.stack([(membership @ (e*solutions[:,i]).T).T for i in range(len(labels))],axis=-1) # satellites x regions x activities
+        index = pd.MultiIndex.from_product([self.e.index,region_labels],names=[self.e.index.name or 'Item',MI['r']])
+        return pd.DataFrame(breakdown.reshape(len(self.e.index)*len(region_labels),len(labels)),index=index,columns=labels)
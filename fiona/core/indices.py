@@ -0,0 +1,107 @@
+from mario.tools.constants import _MASTER_INDEX as MI
+
+_SETS = ['r','a','c','k','f','n']
+
+
+class IndexRegistry:
+
+    def __init__(
+            self,
+            sut,
+    ):
+        """
+        Initialize the registry of the label sets of a SUT.
+
+        Labels are fetched from mario only once per set, the first time they are needed, and
+        kept as a tuple, a frozenset for membership tests and a label-to-position map.
+
+        Args:
+            sut (mario.Database): The SUT whose sets are registered.
+        """
+        self.sut = sut
+        self._labels = {}
+        self._sets = {}
+        self._positions = {}
+
+    @classmethod
+    def from_labels(
+            cls,
+            labels:dict,
+    ):
+        """
+        Builds a registry from already known labels, without a SUT (e.g. in worker processes).
+
+        Args:
+            labels (dict): The labels of each set, as {item: list}.
+
+        Returns:
+            IndexRegistry: The registry. Sets not in labels cannot be requested.
+        """
+        registry = cls(None)
+        for item,item_labels in labels.items():
+            registry._labels[item] = tuple(item_labels)
+            registry._sets[item] = frozenset(item_labels)
+            registry._positions[item] = {label:i for i,label in enumerate(item_labels)}
+        return registry
+
+    def _build(
+            self,
+            item:str,
+    ):
+        if item not in [MI[s] for s in _SETS]:
+            raise ValueError(f"Set {item} not in {[MI[s] for s in _SETS]}")
+        labels = tuple(self.sut.get_index(item))
+        self._labels[item] = labels
+        self._sets[item] = frozenset(labels)
+        self._positions[item] = {label:i for i,label in enumerate(labels)}
+
+    def get_labels(
+            self,
+            item:str,
+    )->list:
+        """
+        Returns the labels of a set, in the order of the SUT.
+
+        Args:
+            item (str): The set, e.g. MI['r'].
+
+        Returns:
+            list: A new list with the labels.
+        """
+        if item not in self._labels:
+            self._build(item)
+        return list(self._labels[item])
+
+    def get_set(
+            self,
+            item:str,
+    )->frozenset:
+        """
+        Returns the labels of a set as a frozenset, for membership tests.
+
+        Args:
+            item (str): The set, e.g. MI['r'].
+
+        Returns:
+            frozenset: The labels.
+        """
+        if item not in self._sets:
+            self._build(item)
+        return self._sets[item]
+
+    def get_positions(
+            self,
+            item:str,
+    )->dict:
+        """
+        Returns the map from the labels of a set to their integer positions.
+
+        Args:
+            item (str): The set, e.g. MI['r'].
+
+        Returns:
+            dict: The label-to-position map.
+        """
+        if item not in self._positions:
+            self._build(item)
+        return self._positions[item]
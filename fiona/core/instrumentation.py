@@ -0,0 +1,208 @@
+import json
+import time
+import tracemalloc
+
+
+class Instrumentation:
+
+    def __init__(
+            self,
+            enabled:bool = True,
+            memory:bool = False,
+            hooks:list = None,
+    ):
+        """
+        Records the wall time, peak memory and matrix shapes of the stages of DB_builder and Inventories.
+
+        Stages are opened with stage() as context managers and can be nested: each record keeps the name of the
+        stage it is nested in. When disabled, stage() returns a shared no-op context manager, so that instrumented
+        code pays one method call per stage.
+
+        Args:
+            enabled (bool, optional): Whether stages are recorded. Defaults to True.
+            memory (bool, optional): Whether to trace the peak memory of each stage with tracemalloc, which slows down
+                the code being run. Tracing is started by the first stage and stopped when it ends. Defaults to False.
+            hooks (list, optional): Callables called with the record of each stage when it ends. Defaults to None.
+
+        Attributes:
+            enabled (bool): Whether stages are recorded.
+            memory (bool): Whether the peak memory of each stage is traced.
+            hooks (list): Callables called with the record of each stage when it ends.
+            records (list): The records of the ended stages, in the order they ended.
+        """
+        self.enabled = enabled
+        self.memory = memory
+        self.hooks = list(hooks or [])
+        self.records = []
+        self._stack = []
+        self._tracing = False
+
+    def stage(
+            self,
+            name:str,
+            **info,
+    ):
+        """
+        Opens a stage, to be used as a context manager.
+
+        Args:
+            name (str): The name of the stage.
+            **info: Additional information stored in the record (e.g. activity='Green steelmaking').
+
+        Returns:
+            Stage: The stage, whose set_shapes() and set_info() methods add information to its record.
+        """
+        if not self.enabled:
+            return _DISABLED_STAGE
+        return Stage(self,name,info)
+
+    def add_hook(
+            self,
+            hook,
+    ):
+        """
+        Adds a callable to be called with the record of each stage when it ends.
+
+        Args:
+            hook (callable): The hook.
+        """
+        self.hooks.append(hook)
+
+    def reset(self):
+        """
+        Discards all the records.
+        """
+        self.records = []
+
+    def report(self)->dict:
+        """
+        Returns the records and a summary of each stage.
+
+        Returns:
+            dict: {'stages': {name: {'calls','time','peak_memory'}}, 'records': list of dicts}. Time is in seconds
+                and summed over calls, peak memory is in bytes (None if not traced) and the highest over calls.
+        """
+        stages = {}
+        for record in self.records:
+            summary = stages.setdefault(record['stage'],{'calls':0,'time':0.0,'peak_memory':None})
+            summary['calls'] += 1
+            summary['time'] += record['time']
+            if record['peak_memory'] is not None:
+                summary['peak_memory'] = max(summary['peak_memory'] or 0,record['peak_memory'])
+        return {'stages':stages,'records':list(self.records)}
+
+    def to_json(
+            self,
+            path:str = None,
+    )->str:
+        """
+        Returns the report as a JSON string, optionally written to a file.
+
+        Args:
+            path (str, optional): The path of the JSON file. Defaults to None (not written).
+
+        Returns:
+            str: The report as JSON.
+        """
+        report = json.dumps(self.report(),indent=2,default=str)
+        if path is not None:
+            with open(path,'w') as f:
+                f.write(report)
+        return report
+
+
+class Stage:
+
+    def __init__(
+            self,
+            instrumentation:Instrumentation,
+            name:str,
+            info:dict,
+    ):
+        self.instrumentation = instrumentation
+        self.record = {'stage':name,'parent':None,'time':None,'peak_memory':None,'shapes':{},**info}
+
+    def set_shapes(
+            self,
+            matrices:dict,
+    ):
+        """
+        Stores the shapes of the given matrices in the record of the stage.
+
+        Args:
+            matrices (dict): The matrices, as {name: object with a shape}.
+        """
+        self.record['shapes'].update({name:tuple(matrix.shape) for name,matrix in matrices.items() if hasattr(matrix,'shape')})
+
+    def set_info(
+            self,
+            **info,
+    ):
+        """
+        Stores additional information in the record of the stage.
+        """
+        self.record.update(info)
+
+    def __enter__(self):
+        instrumentation = self.instrumentation
+        stack = instrumentation._stack
+        if stack:
+            self.record['parent'] = stack[-1].record['stage']
+
+        self._current = 0
+        if instrumentation.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                instrumentation._tracing = True
+            self._current,peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak,peak) # the peak of the enclosing stage is reset below
+            tracemalloc.reset_peak()
+        self._peak = self._current
+
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        self.record['time'] = time.perf_counter() - self._start
+        instrumentation = self.instrumentation
+        stack = instrumentation._stack
+        stack.pop()
+
+        if instrumentation.memory and tracemalloc.is_tracing():
+            self._peak = max(self._peak,tracemalloc.get_traced_memory()[1])
+            self.record['peak_memory'] = self._peak - self._current
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak,self._peak)
+            elif instrumentation._tracing:
+                tracemalloc.stop()
+                instrumentation._tracing = False
+
+        instrumentation.records.append(self.record)
+        for hook in instrumentation.hooks:
+            hook(self.record)
+        return False
+
+
+class DisabledStage:
+    """
+    No-op stage returned by disabled instrumentations.
+    """
+
+    def set_shapes(self,matrices:dict):
+        pass
+
+    def set_info(self,**info):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        return False
+
+
+_DISABLED_STAGE = DisabledStage()
+
+DISABLED = Instrumentation(enabled=False)
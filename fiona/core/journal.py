@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+from fiona.core.sparse import SparseTable
+
+_OPS = {'add':0,'set':1}
+
+
+class EditJournal:
+
+    def __init__(
+            self,
+            labels:dict,
+            capacity:int = 1024,
+    ):
+        """
+        Initialize the edit journal.
+
+        The journal records every edit of the slices as a (matrix,row,col,value,op) entry in
+        preallocated numpy arrays, so that the slices can be built once at the end with reduce().
+
+        Args:
+            labels (dict): The index and columns of each slice, as {matrix: (index,columns)}.
+            capacity (int, optional): Number of entries initially allocated. Defaults to 1024.
+
+        Attributes:
+            matrices (list): The matrices that can be edited.
+            index (dict): The row labels of each slice.
+            columns (dict): The column labels of each slice.
+            size (int): The number of recorded entries.
+        """
+        self.matrices = list(labels)
+        self.index = {m:labels[m][0] for m in labels}
+        self.columns = {m:labels[m][1] for m in labels}
+        self._row_pos = {m:{label:i for i,label in enumerate(self.index[m])} for m in labels}
+        self._col_pos = {m:{label:i for i,label in enumerate(self.columns[m])} for m in labels}
+
+        self.size = 0
+        self._matrix = np.empty(capacity,dtype=np.int8)
+        self._row = np.empty(capacity,dtype=np.int64)
+        self._col = np.empty(capacity,dtype=np.int64)
+        self._value = np.empty(capacity,dtype=np.float64)
+        self._op = np.empty(capacity,dtype=np.int8)
+
+    def __len__(self):
+        return self.size
+
+    def record(
+            self,
+            matrix:str,
+            rows:list,
+            cols:list,
+            values,
+            op:str = 'add',
+    ):
+        """
+        Records an edit on the cells at the intersection of the given labels.
+
+        Args:
+            matrix (str): The matrix of the slice to be edited.
+            rows (list): The row labels of the cells.
+            cols (list): The column labels of the cells.
+            values (float or np.ndarray): The values, broadcastable to (len(rows),len(cols)). 1-D values are taken as a column.
+            op (str, optional): 'add' to sum values to the cells, 'set' to overwrite them. Defaults to 'add'.
+
+        Raises:
+            KeyError: If any label is not in the slice.
+        """
+        rows = self._get_positions(matrix,rows,0)
+        cols = self._get_positions(matrix,cols,1)
+        values = np.asarray(values,dtype=np.float64)
+        if values.ndim == 1:
+            values = values.reshape(-1,1)
+        values = np.broadcast_to(values,(len(rows),len(cols)))
+
+        n = values.size
+        self._reserve(n)
+        end = self.size + n
+        self._matrix[self.size:end] = self.matrices.index(matrix)
+        self._row[self.size:end] = np.repeat(rows,len(cols))
+        self._col[self.size:end] = np.tile(cols,len(rows))
+        self._value[self.size:end] = values.ravel()
+        self._op[self.size:end] = _OPS[op]
+        self.size = end
+
+    def get_entries(self)->dict:
+        """
+        Returns the recorded entries, e.g. to be merged into another journal with the same labels.
+
+        Returns:
+            dict: The arrays of the entries, as {field: np.ndarray}.
+        """
+        return {attr:getattr(self,attr)[:self.size].copy() for attr in ['_matrix','_row','_col','_value','_op']}
+
+    def extend(
+            self,
+            entries:dict,
+    ):
+        """
+        Appends the entries of another journal with the same labels, as if they were recorded here.
+
+        Args:
+            entries (dict): The arrays of the entries, as returned by get_entries().
+        """
+        n = len(entries['_value'])
+        self._reserve(n)
+        for attr,values in entries.items():
+            getattr(self,attr)[self.size:self.size+n] = values
+        self.size += n
+
+    def truncate(
+            self,
+            size:int,
+    ):
+        """
+        Discards all the entries recorded after the given size.
+
+        Args:
+            size (int): The number of entries to keep.
+        """
+        self.size = min(size,self.size)
+
+    def reduce(
+            self,
+            matrix:str,
+            start:int = 0,
+            end:int = None,
+    )->tuple:
+        """
+        Reduces the entries of a matrix to one value per edited cell.
+
+        Entries are applied in the order they were recorded: the last 'set' on a cell overwrites
+        everything before it, while all 'add' entries after it are summed.
+
+        Args:
+            matrix (str): The matrix to be reduced.
+            start (int, optional): The first entry to be reduced. Defaults to 0.
+            end (int, optional): The entry after the last one to be reduced. Defaults to None (all recorded entries).
+
+        Returns:
+            tuple: Row positions, column positions and values of the edited cells.
+        """
+        entries = slice(start,self.size if end is None else min(end,self.size))
+        mask = self._matrix[entries] == self.matrices.index(matrix)
+        rows = self._row[entries][mask]
+        cols = self._col[entries][mask]
+        values = self._value[entries][mask]
+        is_set = self._op[entries][mask] == _OPS['set']
+
+        cells,inverse = np.unique(rows*len(self.columns[matrix])+cols,return_inverse=True)
+        seq = np.arange(len(values))
+        last_set = np.full(len(cells),-1,dtype=np.int64)
+        np.maximum.at(last_set,inverse[is_set],seq[is_set])
+
+        keep = seq >= last_set[inverse]
+        reduced = np.zeros(len(cells))
+        np.add.at(reduced,inverse[keep],values[keep])
+
+        return cells//len(self.columns[matrix]), cells%len(self.columns[matrix]), reduced
+
+    def to_frame(
+            self,
+            matrix:str,
+    )->pd.DataFrame:
+        """
+        Builds the filled slice of a matrix as a dense pd.DataFrame.
+
+        Args:
+            matrix (str): The matrix of the slice.
+
+        Returns:
+            pd.DataFrame: The filled slice.
+        """
+        rows,cols,values = self.reduce(matrix)
+        data = np.zeros((len(self.index[matrix]),len(self.columns[matrix])))
+        data[rows,cols] = values
+        return pd.DataFrame(data,index=self.index[matrix],columns=self.columns[matrix])
+
+    def to_sparse(
+            self,
+            matrix:str,
+    )->SparseTable:
+        """
+        Builds the filled slice of a matrix as a SparseTable.
+
+        Args:
+            matrix (str): The matrix of the slice.
+
+        Returns:
+            SparseTable: The filled slice.
+        """
+        rows,cols,values = self.reduce(matrix)
+        shape = (len(self.index[matrix]),len(self.columns[matrix]))
+        return SparseTable(self.index[matrix],self.columns[matrix],sparse.csr_matrix((values,(rows,cols)),shape=shape))
+
+    def _get_positions(
+            self,
+            matrix:str,
+            labels:list,
+            axis:int,
+    )->np.ndarray:
+        pos = self._row_pos[matrix] if axis == 0 else self._col_pos[matrix]
+        try:
+            return np.array([pos[label] for label in labels],dtype=np.int64)
+        except KeyError as e:
+            raise KeyError(f"{e.args[0]} not in the {'index' if axis == 0 else 'columns'} of the '{matrix}' slice")
+
+    def _reserve(
+            self,
+            n:int,
+    ):
+        capacity = max(len(self._value),1)
+        if self.size + n <= capacity:
+            return
+        while self.size + n > capacity:
+            capacity *= 2
+        for attr in ['_matrix','_row','_col','_value','_op']:
+            old = getattr(self,attr)
+            new = np.empty(capacity,dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self,attr,new)
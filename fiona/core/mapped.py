@@ -0,0 +1,184 @@
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from fiona.core.assembly import place_blocks
+
+
+
+def remove_files(
+        paths:set,
+        directory:str = None,
+):
+    """
+    Deletes the files of a store and, if given, its directory. Files that cannot be removed (e.g. still mapped on Windows) are left in place.
+
+    Args:
+        paths (set): The paths of the files, emptied.
+        directory (str, optional): The directory created by the store, removed if empty. Defaults to None.
+    """
+    while paths:
+        try:
+            os.remove(paths.pop())
+        except OSError:
+            pass
+    if directory is not None:
+        shutil.rmtree(directory,ignore_errors=True)
+
+
+class MappedStore:
+
+    def __init__(
+            self,
+            directory:str = None,
+            rows_per_block:int = 1024,
+    ):
+        """
+        Initialize a store of matrices kept in memory-mapped files.
+
+        Matrices are returned as pd.DataFrames wrapping np.memmap arrays, so their values are paged
+        in from disk only when read. Intermediate matrices are removed with remove() once consumed.
+        All the files of the store are deleted when it is closed or released, together with the temporary
+        directory it created, if any (directories given by the caller are kept): the maps still referenced
+        (e.g. by the mario.Database built from the matrices) stay readable until released, since their files
+        are only unlinked (on platforms where mapped files cannot be removed, such as Windows, they are left in place).
+
+        Args:
+            directory (str, optional): The directory where the files are written. Defaults to a new temporary directory.
+            rows_per_block (int, optional): Number of rows copied at once when writing a matrix. Defaults to 1024.
+
+        Attributes:
+            directory (str): The directory where the files are written.
+            rows_per_block (int): Number of rows copied at once when writing a matrix.
+            maps (dict): The np.memmap arrays of the store, by matrix name.
+        """
+        created = None
+        if directory is None:
+            directory = created = tempfile.mkdtemp(prefix='fiona_')
+        os.makedirs(directory,exist_ok=True)
+
+        self.directory = directory
+        self.rows_per_block = rows_per_block
+        self.maps = {}
+        self._paths = set()
+        self._finalizer = weakref.finalize(self,remove_files,self._paths,created)
+
+    def get_path(
+            self,
+            name:str,
+    )->str:
+        return os.path.join(self.directory,f"{name}.dat")
+
+    def close(self):
+        """
+        Deletes all the files of the store (and the temporary directory it created, if any), e.g. when building fails.
+        """
+        self.maps.clear()
+        self._finalizer()
+
+    def remove(
+            self,
+            *names:str,
+    ):
+        """
+        Removes matrices no longer needed from the store and deletes their files. The disk space is freed
+        once the frames still wrapping their maps, if any, are released.
+
+        Args:
+            *names (str): The names of the matrices.
+        """
+        for name in names:
+            if self.maps.pop(name,None) is None:
+                continue
+            try:
+                os.remove(self.get_path(name))
+                self._paths.discard(self.get_path(name))
+            except OSError: # mapped files cannot be removed on some platforms, they are removed when the store is released
+                pass
+
+    def allocate(
+            self,
+            name:str,
+            index:pd.Index,
+            columns:pd.Index,
+    )->pd.DataFrame:
+        """
+        Creates a new zero-filled memory-mapped matrix.
+
+        Args:
+            name (str): The name of the matrix, used as file name.
+            index (pd.Index): The row labels.
+            columns (pd.Index): The column labels.
+
+        Returns:
+            pd.DataFrame: The matrix, backed by the memory-mapped file.
+        """
+        values = np.memmap(self.get_path(name),dtype=float,mode='w+',shape=(max(len(index),1),max(len(columns),1))) # empty files cannot be mapped
+        self.maps[name] = values
+        self._paths.add(self.get_path(name))
+        return pd.DataFrame(values[:len(index),:len(columns)],index=index,columns=columns,copy=False)
+
+    def map_frame(
+            self,
+            name:str,
+            df:pd.DataFrame,
+            rows:np.ndarray = None,
+            cols:np.ndarray = None,
+    )->pd.DataFrame:
+        """
+        Writes a matrix, or a block of it, to a memory-mapped file, copying it in blocks of rows.
+
+        Args:
+            name (str): The name of the matrix, used as file name.
+            df (pd.DataFrame): The matrix to be written.
+            rows (np.ndarray, optional): Boolean mask of the rows to be written. Defaults to None (all rows).
+            cols (np.ndarray, optional): Boolean mask of the columns to be written. Defaults to None (all columns).
+
+        Returns:
+            pd.DataFrame: The (block of the) matrix, backed by the memory-mapped file.
+        """
+        rows = np.arange(df.shape[0]) if rows is None else np.flatnonzero(rows)
+        cols = np.arange(df.shape[1]) if cols is None else np.flatnonzero(cols)
+
+        mapped = self.allocate(name,df.index[rows],df.columns[cols])
+        values = mapped.values
+        source = df.values
+        for start in range(0,len(rows),self.rows_per_block):
+            block = rows[start:start+self.rows_per_block]
+            values[start:start+len(block)] = np.nan_to_num(source[np.ix_(block,cols)])
+        self.maps[name].flush()
+        return mapped
+
+    def assemble(
+            self,
+            name:str,
+            frames:list,
+            tables:list,
+            index:pd.Index,
+            columns:pd.Index,
+    )->pd.DataFrame:
+        """
+        Sums dense and sparse matrices into a new memory-mapped matrix with the given labels.
+
+        Dense matrices are placed block by block at the positions of their labels, and the
+        non-zero values of the sparse ones are added on top, so only one block of rows is held in RAM.
+
+        Args:
+            name (str): The name of the new matrix, used as file name.
+            frames (list): The pd.DataFrames to be summed (e.g. memory-mapped base matrices).
+            tables (list): The SparseTable objects to be summed (e.g. filled slices).
+            index (pd.Index): The row labels of the new matrix, including all those of frames and tables.
+            columns (pd.Index): The column labels of the new matrix, including all those of frames and tables.
+
+        Returns:
+            pd.DataFrame: The summed matrix, backed by the memory-mapped file.
+        """
+        summed = self.allocate(name,index,columns)
+        place_blocks(index,columns,frames,tables,summed.values,self.rows_per_block)
+        self.maps[name].flush()
+        return summed
+
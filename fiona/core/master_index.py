@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+_NUMERICAL_COLUMNS = ['FU quantity','Market share','Total output']
+
+
+class MasterIndex:
+
+    def __init__(
+            self,
+            master_sheet:pd.DataFrame,
+    ):
+        """
+        Parses the master sheet once into rows indexed by sheet name, by activity and by (activity,region).
+
+        Rows are dictionaries keyed by the master sheet columns, with typed values: numerical columns are floats
+        (nan if empty), the parent activity is a string or None and 'Leave empty' is a boolean.
+
+        Args:
+            master_sheet (pd.DataFrame): The master sheet, already checked for errors.
+
+        Raises:
+            ValueError: If any 'Leave empty' value is not boolean nor empty.
+
+        Attributes:
+            rows (list): All the rows of the master sheet, in order.
+            by_sheet (dict): The rows of each sheet name.
+            by_activity (dict): The rows of each activity.
+            by_activity_region (dict): The rows of each (activity,region) pair.
+        """
+        master_sheet = master_sheet.copy()
+        for column in _NUMERICAL_COLUMNS:
+            master_sheet[column] = pd.to_numeric(master_sheet[column],errors='coerce').astype(float)
+
+        self.rows = master_sheet.to_dict('records')
+        self.by_sheet = {}
+        self.by_activity = {}
+        self.by_activity_region = {}
+
+        for row in self.rows:
+            parent = row[f'Parent {MI["a"]}']
+            row[f'Parent {MI["a"]}'] = parent if isinstance(parent,str) else None
+            row['Leave empty'] = parse_leave_empty(row['Leave empty'],row['Sheet name'])
+
+            self.by_sheet.setdefault(row['Sheet name'],[]).append(row)
+            self.by_activity.setdefault(row[MI['a']],[]).append(row)
+            self.by_activity_region.setdefault((row[MI['a']],row[MI['r']]),[]).append(row)
+
+    @property
+    def sheet_names(self)->list:
+        return list(self.by_sheet)
+
+    @property
+    def activities(self)->list:
+        return list(self.by_activity)
+
+    def get_sheet(
+            self,
+            sheet_name:str,
+    )->dict:
+        """
+        Returns the first row of the master sheet referring to the given inventory sheet.
+
+        Args:
+            sheet_name (str): The inventory sheet name.
+
+        Raises:
+            KeyError: If the sheet name is not in the master sheet.
+
+        Returns:
+            dict: The row.
+        """
+        if sheet_name not in self.by_sheet:
+            raise KeyError(f"Sheet {sheet_name} not in the master sheet")
+        return self.by_sheet[sheet_name][0]
+
+    def get_activity(
+            self,
+            activity:str,
+    )->dict:
+        """
+        Returns the first row of the master sheet referring to the given activity.
+
+        Args:
+            activity (str): The activity.
+
+        Raises:
+            KeyError: If the activity is not in the master sheet.
+
+        Returns:
+            dict: The row.
+        """
+        if activity not in self.by_activity:
+            raise KeyError(f"Activity {activity} not in the master sheet")
+        return self.by_activity[activity][0]
+
+    def get_rows(
+            self,
+            activity:str,
+            region:str,
+    )->list:
+        """
+        Returns all the rows of the master sheet referring to the given activity in the given region (or regions cluster).
+
+        Args:
+            activity (str): The activity.
+            region (str): The region or regions cluster.
+
+        Returns:
+            list: The rows, empty if none.
+        """
+        return self.by_activity_region.get((activity,region),[])
+
+
+def parse_leave_empty(
+        value,
+        sheet_name:str,
+)->bool:
+    """
+    Parses a value of the 'Leave empty' column of the master sheet.
+
+    Args:
+        value: The value to be parsed.
+        sheet_name (str): The sheet name the value refers to.
+
+    Raises:
+        ValueError: If the value is not boolean nor empty.
+
+    Returns:
+        bool: True if the inventory must be left empty, False otherwise.
+    """
+    if value is None:
+        return False
+    if isinstance(value,(bool,np.bool_)):
+        return bool(value)
+    if isinstance(value,(int,float,np.number)):
+        if pd.isna(value):
+            return False
+        if value == 1:
+            return True
+        if value == 0:
+            return False
+    raise ValueError(f"'Leave empty' column for inventory {sheet_name} in the master file must be boolean or left empty, got {value} instead")
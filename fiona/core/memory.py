@@ -0,0 +1,208 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from fiona.core.mapped import MappedStore
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+_ITEMSIZE = np.dtype(float).itemsize
+
+
+def get_nbytes(
+        index:pd.Index,
+        columns:pd.Index,
+)->int:
+    """
+    Returns the bytes taken by the values of a float matrix with the given labels.
+
+    Args:
+        index (pd.Index): The row labels.
+        columns (pd.Index): The column labels.
+
+    Returns:
+        int: The bytes.
+    """
+    return len(index)*len(columns)*_ITEMSIZE
+
+
+def get_process_peak()->int:
+    """
+    Returns the peak resident memory of the process so far, in bytes.
+
+    Returns:
+        int: The peak resident memory, None if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak*1024 # bytes on macOS, kilobytes on Linux
+
+
+class MemoryBudget:
+
+    def __init__(
+            self,
+            budget:int,
+            block_share:float = 0.02,
+            spill_dir:str = None,
+    ):
+        """
+        Accounts for the matrices held in RAM while building a database, within a memory budget.
+
+        Every matrix allocated or released by the low-memory build is recorded, so that the peak of the matrices
+        held at the same time is known. Matrices that would exceed the budget are allocated in memory-mapped
+        files instead (spilled), and blocks of rows copied at once are sized as a share of the budget.
+
+        Args:
+            budget (int): The memory budget, in bytes.
+            block_share (float, optional): The share of the budget used by the blocks of rows copied at once. Defaults to 0.02.
+            spill_dir (str, optional): The directory of the memory-mapped files of spilled matrices. Defaults to None (a new temporary directory).
+
+        Raises:
+            ValueError: If the budget is not positive.
+
+        Attributes:
+            budget (int): The memory budget, in bytes.
+            block_share (float): The share of the budget used by the blocks of rows copied at once.
+            live (dict): The bytes of the matrices held in RAM, by name.
+            peak (int): The highest sum of the bytes of the matrices held in RAM at the same time.
+            spilled (list): The names of the matrices allocated in memory-mapped files.
+        """
+        if budget <= 0:
+            raise ValueError(f"Memory budget must be positive, got {budget} instead")
+
+        self.budget = budget
+        self.block_share = block_share
+        self.spill_dir = spill_dir
+        self.live = {}
+        self.peak = 0
+        self.spilled = []
+        self._store = None
+
+    @property
+    def current(self)->int:
+        return sum(self.live.values())
+
+    @property
+    def store(self)->MappedStore:
+        """
+        Store of the spilled matrices, created the first time a matrix does not fit in the budget.
+        """
+        if self._store is None:
+            self._store = MappedStore(self.spill_dir)
+        return self._store
+
+    def close(self):
+        """
+        Deletes the memory-mapped files of the spilled matrices, if any.
+        """
+        if self._store is not None:
+            self._store.close()
+
+    def fits(
+            self,
+            nbytes:int,
+    )->bool:
+        """
+        Returns whether a new matrix fits in the budget, together with the matrices already held in RAM.
+
+        Args:
+            nbytes (int): The bytes of the new matrix.
+
+        Returns:
+            bool: True if it fits.
+        """
+        return self.current + nbytes <= self.budget
+
+    def allocate(
+            self,
+            name:str,
+            nbytes:int,
+    ):
+        """
+        Records a matrix held in RAM.
+
+        Args:
+            name (str): The name of the matrix.
+            nbytes (int): The bytes of the matrix.
+        """
+        self.live[name] = nbytes
+        self.peak = max(self.peak,self.current)
+
+    def release(
+            self,
+            *names:str,
+    ):
+        """
+        Records that matrices are no longer held in RAM, and deletes the files of those that were spilled.
+
+        Args:
+            *names (str): The names of the matrices.
+        """
+        for name in names:
+            self.live.pop(name,None)
+        if self._store is not None:
+            self._store.remove(*names)
+
+    def get_rows_per_block(
+            self,
+            n_columns:int,
+    )->int:
+        """
+        Returns the number of rows of a matrix to be copied at once within the share of the budget for blocks.
+
+        Args:
+            n_columns (int): The number of columns of the matrix.
+
+        Returns:
+            int: The number of rows, at least 1.
+        """
+        return max(1,int(self.budget*self.block_share // (2*_ITEMSIZE*max(n_columns,1)))) # each block is copied once before being placed
+
+    def get_frame(
+            self,
+            name:str,
+            index:pd.Index,
+            columns:pd.Index,
+    )->pd.DataFrame:
+        """
+        Allocates a zero-filled matrix in RAM if it fits in the budget, in a memory-mapped file otherwise.
+
+        Args:
+            name (str): The name of the matrix.
+            index (pd.Index): The row labels.
+            columns (pd.Index): The column labels.
+
+        Returns:
+            pd.DataFrame: The matrix.
+        """
+        nbytes = get_nbytes(index,columns)
+        if self.fits(nbytes):
+            self.allocate(name,nbytes)
+            return pd.DataFrame(np.zeros((len(index),len(columns))),index=index,columns=columns,copy=False)
+        self.spilled.append(name)
+        return self.store.allocate(name,index,columns)
+
+    def report(self)->dict:
+        """
+        Returns the budget, the peak reached by the matrices held in RAM and the peak resident memory of the process.
+
+        The peak can exceed the budget, since the base matrices are held in RAM whatever their size: 'within_budget'
+        tells whether the build fit in the budget.
+
+        Returns:
+            dict: {'budget','peak','within_budget','spilled','spill_dir','process_peak'}, memory in bytes.
+        """
+        return {
+            'budget': self.budget,
+            'peak': self.peak,
+            'within_budget': self.peak <= self.budget,
+            'spilled': list(self.spilled),
+            'spill_dir': self._store.directory if self._store is not None else None,
+            'process_peak': get_process_peak(),
+        }
@@ -0,0 +1,66 @@
+from fiona.rules import _ACCEPTABLES
+
+
+class BuildOptions:
+
+    def __init__(
+            self,
+            backend:str = 'dense',
+            storage:str = 'memory',
+            storage_dir:str = None,
+            workers:int = 1,
+            assembly:str = 'groupby',
+            memory_budget:int = None,
+    ):
+        """
+        How the matrices of a database are built by DB_builder.add_inventories() and Inventories: backend, storage,
+        parallelism, assembly and memory budget. The options change only the time and memory taken, not the matrices.
+
+        Args:
+            backend (str, optional): 'dense' to build slices as pd.DataFrames, 'sparse' to build slices and assembled matrices as SparseTable objects. Defaults to 'dense'.
+            storage (str, optional): 'memory' to keep matrices in RAM, 'mmap' to keep base and new matrices in memory-mapped files, with only the filled slices held in RAM (as SparseTable objects, whatever the backend). Defaults to 'memory'.
+            storage_dir (str, optional): The directory of the memory-mapped files, also used by matrices exceeding the memory budget. Its files are deleted if adding fails, or else once the builder and the new database are released. Defaults to None (a new temporary directory).
+            workers (int, optional): Number of worker processes filling the slices of new activities. Defaults to 1 (serial).
+            assembly (str, optional): How the dense backend adds slices to the matrices: 'groupby' concatenates, groups and sorts the whole matrices, 'blocks' places base matrices and slices by position over the merged sorted labels. Memory-mapped matrices are always assembled by blocks. Defaults to 'groupby'.
+            memory_budget (int, optional): If given, the database is built in low-memory mode within this budget, in bytes: base matrices are referenced from the current mario.Database instead of being copied (and left as they were if adding fails), intermediate matrices are released as soon as they are used and new matrices exceeding the budget are memory-mapped in storage_dir. Matrices are assembled by blocks whatever the backend and assembly. Defaults to None.
+
+        Raises:
+            ValueError: If the backend is not acceptable.
+            ValueError: If the storage is not acceptable.
+            ValueError: If the number of workers is lower than 1.
+            ValueError: If the assembly mode is not acceptable.
+            ValueError: If the memory budget is not positive.
+
+        Attributes:
+            backend (str): The matrix backend.
+            storage (str): Where base and new matrices are kept.
+            storage_dir (str): The directory of the memory-mapped files, None for a new temporary directory.
+            workers (int): Number of worker processes filling the slices of new activities.
+            assembly (str): How the dense backend adds slices to the matrices.
+            memory_budget (int): The memory budget of the low-memory mode, in bytes, None if not used.
+        """
+        if backend not in _ACCEPTABLES['matrix_backends']:
+            raise ValueError(f"Backend {backend} not in {_ACCEPTABLES['matrix_backends']}")
+
+        if storage not in _ACCEPTABLES['matrix_storages']:
+            raise ValueError(f"Storage {storage} not in {_ACCEPTABLES['matrix_storages']}")
+
+        if workers < 1:
+            raise ValueError(f"Number of workers must be at least 1, got {workers} instead")
+
+        if assembly not in _ACCEPTABLES['assembly_modes']:
+            raise ValueError(f"Assembly mode {assembly} not in {_ACCEPTABLES['assembly_modes']}")
+
+        if memory_budget is not None and memory_budget <= 0:
+            raise ValueError(f"Memory budget must be positive, got {memory_budget} instead")
+
+        self.backend = backend
+        self.storage = storage
+        self.storage_dir = storage_dir
+        self.workers = workers
+        self.assembly = assembly
+        self.memory_budget = memory_budget
+
+    def __repr__(self)->str:
+        options = ','.join(f"{k}={v!r}" for k,v in vars(self).items())
+        return f"BuildOptions({options})"
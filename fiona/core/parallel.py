@@ -0,0 +1,182 @@
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from fiona.core.indices import IndexRegistry
+from fiona.core.instrumentation import DISABLED
+from fiona.core.journal import EditJournal
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+_WORKER = {}
+
+
+class FillContext:
+
+    def __init__(
+            self,
+            inventories,
+    ):
+        """
+        Read-only view of a DB_builder holding only what is needed to fill the slices of new activities,
+        so that it can be sent to worker processes without the SUT.
+
+        Args:
+            inventories (Inventories): The Inventories object, whose builder and units (including those of new activities and commodities) are used.
+
+        Attributes:
+            inventories (dict): The inventories of the new activities.
+            fiona_conversions (dict): The unit conversions of the inventories retrieved from the FIONA database.
+            fiona_activities (list): The activities already added by FIONA.
+            master_index (MasterIndex): The parsed master sheet.
+            regions_maps (dict): The regions clusters.
+            new_activities (list): The new activities to be applied.
+            new_commodities (list): The new commodities.
+            parented_activities (list): The new activities with a parent activity.
+            labels (dict): The labels of the sets of the SUT used to fill the slices.
+            sut: Namespace with the units only, in place of the SUT.
+            instrumentation (Instrumentation): Disabled, stages of the workers are not recorded.
+        """
+        builder = inventories.builder
+        self.inventories = builder.inventories
+        self.fiona_conversions = builder.fiona_conversions
+        self.fiona_activities = list(builder.fiona_activities)
+        self.master_index = builder.master_index
+        self.regions_maps = builder.regions_maps
+        self.new_activities = inventories.new_activities
+        self.new_commodities = inventories.new_commodities
+        self.parented_activities = builder.parented_activities
+        self.labels = {item:builder.indices.get_labels(item) for item in [MI['r'],MI['c']]}
+        self.sut = SimpleNamespace(units=inventories.units)
+        self.instrumentation = DISABLED
+        self._indices = None
+
+    @property
+    def indices(self)->IndexRegistry:
+        if self._indices is None:
+            self._indices = IndexRegistry.from_labels(self.labels)
+        return self._indices
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_indices'] = None # rebuilt lazily in each worker
+        return state
+
+
+def share_frames(
+        frames:dict,
+        store = None,
+)->tuple:
+    """
+    Shares the values of read-only matrices with worker processes, without pickling them.
+
+    Matrices of a MappedStore are shared by the path of their memory-mapped file, the others
+    are copied once into shared memory blocks.
+
+    Args:
+        frames (dict): The matrices, as {name: pd.DataFrame}.
+        store (MappedStore, optional): The store the matrices are mapped in, if any. Defaults to None.
+
+    Returns:
+        tuple: The specs to attach the matrices in the workers, as {name: dict}, and the list of
+            shared memory blocks to be released by the caller once the workers are done.
+    """
+    specs = {}
+    blocks = []
+    for name,frame in frames.items():
+        spec = {'index':frame.index,'columns':frame.columns,'shape':frame.shape}
+        if store is not None and name in store.maps and np.shares_memory(frame.values,store.maps[name]):
+            spec['path'] = store.get_path(name)
+            spec['file_shape'] = store.maps[name].shape
+        else:
+            block = shared_memory.SharedMemory(create=True,size=max(frame.size*8,1))
+            np.ndarray(frame.shape,dtype=float,buffer=block.buf)[:] = frame.fillna(0).values
+            spec['name'] = block.name
+            blocks.append(block)
+        specs[name] = spec
+    return specs,blocks
+
+
+def attach_frame(
+        spec:dict,
+)->tuple:
+    """
+    Attaches, in a worker process, a matrix shared with share_frames().
+
+    Args:
+        spec (dict): The spec of the matrix.
+
+    Returns:
+        tuple: The read-only matrix as pd.DataFrame and the shared memory block to be kept alive (None for memory-mapped files).
+    """
+    if 'path' in spec:
+        values = np.memmap(spec['path'],dtype=float,mode='r',shape=spec['file_shape'])[:spec['shape'][0],:spec['shape'][1]]
+        block = None
+    else:
+        block = shared_memory.SharedMemory(name=spec['name'])
+        values = np.ndarray(spec['shape'],dtype=float,buffer=block.buf)
+        values.flags.writeable = False
+    return pd.DataFrame(values,index=spec['index'],columns=spec['columns'],copy=False),block
+
+
+def init_worker(
+        context:FillContext,
+        specs:dict,
+        labels:dict,
+        backend:str,
+):
+    from fiona.core.add_inventories import Inventories
+    from fiona.core.options import BuildOptions
+
+    matrices = {}
+    for name,spec in specs.items():
+        matrices[name],block = attach_frame(spec)
+        _WORKER.setdefault('blocks',[]).append(block)
+
+    _WORKER['inventories'] = Inventories(context,matrices=matrices,options=BuildOptions(backend=backend)) # slices are filled serially in each worker
+    _WORKER['labels'] = labels
+
+
+def fill_activity(
+        activity:str,
+)->dict:
+    inventories = _WORKER['inventories']
+    inventories.journal = EditJournal(_WORKER['labels'])
+    inventories.fill_slices(activity)
+    return inventories.journal.get_entries()
+
+
+def fill_in_parallel(
+        inventories,
+        workers:int,
+):
+    """
+    Fills the slices of all new activities in a pool of worker processes.
+
+    Each worker fills one activity at a time in its own EditJournal, reading the base matrices
+    from shared memory (or from their memory-mapped files). Journals are merged into the journal
+    of inventories in the order of the new activities, so that the result matches the serial run.
+
+    Args:
+        inventories (Inventories): The Inventories object, with its journal already created.
+        workers (int): The number of worker processes.
+    """
+    context = FillContext(inventories)
+    frames = {m:inventories.matrices[m] for m in ['u','v','e','Y']}
+    labels = {m:(inventories.journal.index[m],inventories.journal.columns[m]) for m in inventories.journal.matrices}
+
+    specs,blocks = share_frames(frames,inventories.store)
+    try:
+        with ProcessPoolExecutor(max_workers=workers,initializer=init_worker,initargs=(context,specs,labels,inventories.backend)) as pool:
+            inventories.journal_segments = {}
+            for activity,entries in zip(inventories.new_activities,pool.map(fill_activity,inventories.new_activities)):
+                start = len(inventories.journal)
+                inventories.journal.extend(entries)
+                inventories.journal_segments[activity] = (start,len(inventories.journal))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
@@ -0,0 +1,287 @@
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+import mario
+from scipy import sparse
+
+from fiona.core.assembly import merge_labels, place_blocks, get_mario_indices
+from fiona.core.indices import IndexRegistry, _SETS
+from fiona.core.sparse import SparseTable
+from fiona.core.sut_cache import encode_labels, decode_labels
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+_PATCH_VERSION = 2
+_PATCH_SLICES = ['u','s','e','v','Y']
+_PATCHED_MATRICES = {'z':['u','s'],'e':['e'],'v':['v'],'Y':['Y']} # slices added to each matrix
+
+
+def get_index_fingerprint(
+        indices:IndexRegistry,
+)->str:
+    """
+    Returns a fingerprint of the label sets of a SUT, independent of the order of the labels.
+
+    Args:
+        indices (IndexRegistry): The registry of the label sets of the SUT.
+
+    Returns:
+        str: The fingerprint.
+    """
+    fingerprint = hashlib.sha256(f"{_PATCH_VERSION}".encode())
+    for item in [MI[s] for s in _SETS]:
+        fingerprint.update(f"|{item}|".encode())
+        fingerprint.update("\n".join(sorted(str(label) for label in indices.get_set(item))).encode())
+    return fingerprint.hexdigest()
+
+
+def get_sut_mode(
+        sut:mario.Database,
+        scenario:str = 'baseline',
+)->str:
+    """
+    Returns whether the matrices of a scenario of a SUT are given in coefficients or in flows.
+
+    Args:
+        sut (mario.Database): The SUT.
+        scenario (str, optional): The scenario. Defaults to 'baseline'.
+
+    Raises:
+        ValueError: If the scenario has neither z, e and v nor Z, E and V.
+
+    Returns:
+        str: 'coefficients' or 'flows'.
+    """
+    matrices = sut.matrices[scenario]
+    if all(matrix in matrices for matrix in ['z','e','v']):
+        return 'coefficients'
+    if all(matrix in matrices for matrix in ['Z','E','V']):
+        return 'flows'
+    raise ValueError(f"Scenario '{scenario}' of the SUT has neither coefficients nor flows matrices")
+
+
+def trim_table(
+        table:SparseTable,
+)->SparseTable:
+    """
+    Returns a table with only the rows and columns holding non-zero values.
+
+    Args:
+        table (SparseTable): The table.
+
+    Returns:
+        SparseTable: The trimmed table.
+    """
+    data = sparse.csr_matrix(table.data)
+    data.eliminate_zeros()
+    rows = np.flatnonzero(np.diff(data.indptr))
+    cols = np.unique(data.indices)
+    return SparseTable(table.index[rows],table.columns[cols],data[rows][:,cols])
+
+
+def get_item_labels(
+        regions:list,
+        level:str,
+        items:list,
+)->pd.MultiIndex:
+    return pd.MultiIndex.from_product([regions,[level],items])
+
+
+class FIONAPatch:
+
+    def __init__(
+            self,
+            slices:dict,
+            activities:list,
+            commodities:list,
+            units:dict,
+            fingerprint:str,
+            mode:str = 'coefficients',
+    ):
+        """
+        What a FIONA build added to a SUT: the values of the new rows and columns of z, e, v and Y, the units
+        of the new activities and commodities, a fingerprint of the label sets of the SUT they were added to and
+        the mode of its matrices.
+
+        A patch is much smaller than the database it was built into, and extends any SUT with the same label
+        sets without the master sheet and the inventories (see apply()).
+
+        Args:
+            slices (dict): The filled slices u, s, e, v and Y, as SparseTable objects with only their non-zero rows and columns.
+            activities (list): The activities added.
+            commodities (list): The commodities added.
+            units (dict): The units of the activities and commodities added, as {item: pd.DataFrame}.
+            fingerprint (str): The fingerprint of the label sets of the base SUT (see get_index_fingerprint()).
+            mode (str, optional): The mode of the matrices of the base SUT, 'coefficients' or 'flows' (see get_sut_mode()). Defaults to 'coefficients'.
+
+        Attributes:
+            slices (dict): The filled slices.
+            activities (list): The activities added.
+            commodities (list): The commodities added.
+            units (dict): The units of the activities and commodities added.
+            fingerprint (str): The fingerprint of the label sets of the base SUT.
+            mode (str): The mode of the matrices of the base SUT.
+        """
+        self.slices = slices
+        self.activities = list(activities)
+        self.commodities = list(commodities)
+        self.units = units
+        self.fingerprint = fingerprint
+        self.mode = mode
+
+    @property
+    def nnz(self)->int:
+        return sum(table.data.nnz for table in self.slices.values())
+
+    def save(
+            self,
+            path:str,
+    ):
+        """
+        Writes the patch in a compressed npz file: the non-zero values of the slices with their positions,
+        and their labels, the units, the fingerprint and the mode as json.
+
+        Args:
+            path (str): The path to the file.
+        """
+        arrays = {}
+        labels = {}
+        for name,table in self.slices.items():
+            coo = table.data.tocoo()
+            arrays[f'{name}_rows'] = coo.row.astype(np.int64)
+            arrays[f'{name}_cols'] = coo.col.astype(np.int64)
+            arrays[f'{name}_values'] = coo.data.astype(float)
+            labels[name] = {'index':encode_labels(table.index),'columns':encode_labels(table.columns)}
+
+        meta = {
+            'version': _PATCH_VERSION,
+            'fingerprint': self.fingerprint,
+            'mode': self.mode,
+            'activities': self.activities,
+            'commodities': self.commodities,
+            'labels': labels,
+            'units': {k:v.to_dict(orient='split') for k,v in self.units.items()},
+        }
+        with open(path,'wb') as f: # a file object, so that numpy does not append .npz to the path
+            np.savez_compressed(f,meta=np.array(json.dumps(meta)),**arrays)
+
+    @classmethod
+    def load(
+            cls,
+            path:str,
+    ):
+        """
+        Reads a patch written by save().
+
+        Args:
+            path (str): The path to the file.
+
+        Raises:
+            ValueError: If the patch was written by another version of FIONA.
+
+        Returns:
+            FIONAPatch: The patch.
+        """
+        with np.load(path) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            if meta['version'] != _PATCH_VERSION:
+                raise ValueError(f"Patch version {meta['version']} not supported, expected {_PATCH_VERSION}")
+
+            slices = {}
+            for name,labels in meta['labels'].items():
+                index = decode_labels(labels['index'])
+                columns = decode_labels(labels['columns'])
+                data = sparse.csr_matrix(
+                    (arrays[f'{name}_values'],(arrays[f'{name}_rows'],arrays[f'{name}_cols'])),
+                    shape=(len(index),len(columns)),
+                )
+                slices[name] = SparseTable(index,columns,data)
+
+        units = {k:pd.DataFrame(**v) for k,v in meta['units'].items()}
+        return cls(slices,meta['activities'],meta['commodities'],units,meta['fingerprint'],meta['mode'])
+
+    def apply(
+            self,
+            sut:mario.Database,
+            scenario:str = 'baseline',
+    )->mario.Database:
+        """
+        Extends a SUT with the activities and commodities of the patch.
+
+        The labels of each matrix are merged once with the new ones, the base matrix is copied into place
+        and the non-zero values of the patch are added on top: no groupby or sort of the whole matrices is
+        needed, and the work beyond one copy of the base matrices is proportional to the size of the patch.
+
+        Args:
+            sut (mario.Database): The base SUT, with the same label sets and mode as the SUT the patch was built over.
+            scenario (str, optional): The scenario of the base SUT. Defaults to 'baseline'.
+
+        Raises:
+            ValueError: If the label sets of the SUT differ from those the patch was built over.
+            ValueError: If the matrices of the SUT are not in the mode of those the patch was built over.
+
+        Returns:
+            mario.Database: A new SUT, with the base matrices of the scenario extended by the patch.
+        """
+        indices = IndexRegistry(sut)
+        if get_index_fingerprint(indices) != self.fingerprint:
+            raise ValueError("The SUT has not the same regions, activities, commodities, factors of production, satellite accounts or consumption categories as the one the patch was built over")
+        mode = get_sut_mode(sut,scenario)
+        if mode != self.mode:
+            raise ValueError(f"The SUT is given in {mode}, while the patch was built over a SUT in {self.mode}. Use reset_to_{self.mode}() first")
+
+        regions = indices.get_labels(MI['r'])
+        new_labels = get_item_labels(regions,MI['a'],self.activities).append(get_item_labels(regions,MI['c'],self.commodities))
+        extra_labels = {
+            'z': (new_labels,new_labels),
+            'e': (None,new_labels),
+            'v': (None,new_labels),
+            'Y': (new_labels,None),
+        }
+
+        base = sut.matrices[scenario]
+        matrices = {'EY': base['EY']}
+        for matrix,slice_names in _PATCHED_MATRICES.items():
+            frame = base[matrix]
+            extra_index,extra_columns = extra_labels[matrix]
+            index = merge_labels([frame.index] + ([extra_index] if extra_index is not None else []))
+            columns = merge_labels([frame.columns] + ([extra_columns] if extra_columns is not None else []))
+            values = place_blocks(index,columns,frames=[frame],tables=[self.slices[name] for name in slice_names])
+            matrices[matrix] = pd.DataFrame(values,index=index,columns=columns)
+
+        units = dict(sut.units)
+        for item,new_units in self.units.items():
+            units[item] = pd.concat([units[item].drop(new_units.index,errors='ignore'),new_units],axis=0)
+
+        return mario.Database(
+            name=None,
+            table='SUT',
+            source=None,
+            year=None,
+            init_by_parsers={"matrices": {'baseline': matrices}, "_indeces": get_mario_indices(matrices), "units": units},
+            calc_all=False,
+            )
+
+
+def apply_patch(
+        sut:mario.Database,
+        path:str,
+        scenario:str = 'baseline',
+)->mario.Database:
+    """
+    Extends a SUT with the activities and commodities of a patch file, without the master sheet and the inventories.
+
+    Args:
+        sut (mario.Database): The base SUT, in the mode of the SUT the patch was built over.
+        path (str): The path to the patch file, written by DB_builder.save_patch().
+        scenario (str, optional): The scenario of the base SUT. Defaults to 'baseline'.
+
+    Raises:
+        ValueError: If the patch does not fit the label sets of the SUT.
+
+    Returns:
+        mario.Database: A new SUT extended by the patch.
+    """
+    return FIONAPatch.load(path).apply(sut,scenario)
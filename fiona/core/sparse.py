@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+
+
+class SparseTable:
+
+    def __init__(
+            self,
+            index:pd.Index,
+            columns:pd.Index,
+            data:sparse.spmatrix = None,
+    ):
+        """
+        Initialize a labelled sparse table.
+
+        Args:
+            index (pd.Index): The row labels of the table.
+            columns (pd.Index): The column labels of the table.
+            data (sparse.spmatrix, optional): The values of the table. Defaults to an empty matrix.
+
+        Attributes:
+            index (pd.Index): The row labels of the table.
+            columns (pd.Index): The column labels of the table.
+            row_pos (dict): Map from row label to integer position.
+            col_pos (dict): Map from column label to integer position.
+            data (sparse.spmatrix): The values of the table (lil while being edited, csr otherwise).
+        """
+        self.index = index
+        self.columns = columns
+        self.row_pos = {label:i for i,label in enumerate(index)}
+        self.col_pos = {label:i for i,label in enumerate(columns)}
+
+        if data is None:
+            data = sparse.lil_matrix((len(index),len(columns)),dtype=float)
+        self.data = data
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @classmethod
+    def from_frame(
+            cls,
+            df:pd.DataFrame,
+    ):
+        """
+        Builds a sparse table from a dense pd.DataFrame.
+
+        Args:
+            df (pd.DataFrame): The dense table.
+
+        Returns:
+            SparseTable: The sparse table with the same labels and values.
+        """
+        return cls(df.index,df.columns,sparse.csr_matrix(df.fillna(0).values.astype(float)))
+
+    def get_positions(
+            self,
+            labels:list,
+            axis:int,
+    )->np.ndarray:
+        """
+        Maps a list of labels to their integer positions on the given axis.
+
+        Args:
+            labels (list): The labels to map.
+            axis (int): 0 for rows, 1 for columns.
+
+        Raises:
+            KeyError: If any label is not in the table.
+
+        Returns:
+            np.ndarray: The positions of the labels.
+        """
+        pos = self.row_pos if axis == 0 else self.col_pos
+        try:
+            return np.array([pos[label] for label in labels],dtype=np.int64)
+        except KeyError as e:
+            raise KeyError(f"{e.args[0]} not in the {'index' if axis == 0 else 'columns'} of the sparse table")
+
+    def edit(
+            self,
+            rows:list,
+            cols:list,
+            values,
+            op:str = 'add',
+    ):
+        """
+        Sets or adds values on the cells at the intersection of the given labels.
+
+        Args:
+            rows (list): The row labels.
+            cols (list): The column labels.
+            values (float or np.ndarray): The values, broadcastable to (len(rows),len(cols)).
+            op (str, optional): 'add' or 'set'. Defaults to 'add'.
+        """
+        if not sparse.isspmatrix_lil(self.data):
+            self.data = self.data.tolil()
+
+        ix = np.ix_(self.get_positions(rows,0),self.get_positions(cols,1))
+        values = np.broadcast_to(np.asarray(values,dtype=float).reshape(-1,1) if np.ndim(values) == 1 else values,(len(rows),len(cols)))
+        if op == 'add':
+            values = self.data[ix].toarray() + values
+        self.data[ix] = values
+
+    def take(
+            self,
+            rows:np.ndarray,
+            cols:np.ndarray,
+    ):
+        """
+        Returns the sub-table of the given rows and columns.
+
+        Args:
+            rows (np.ndarray): Boolean mask or positions of the rows to keep.
+            cols (np.ndarray): Boolean mask or positions of the columns to keep.
+
+        Returns:
+            SparseTable: The sub-table.
+        """
+        rows = np.flatnonzero(rows) if np.asarray(rows).dtype == bool else np.asarray(rows)
+        cols = np.flatnonzero(cols) if np.asarray(cols).dtype == bool else np.asarray(cols)
+        return SparseTable(self.index[rows],self.columns[cols],self.data.tocsr()[rows][:,cols])
+
+    def __iadd__(self,other):
+        if not (self.index.equals(other.index) and self.columns.equals(other.columns)):
+            raise ValueError("Sparse tables can be summed only if they share the same labels")
+        self.data = self.data.tocsr() + other.data.tocsr()
+        return self
+
+    def to_frame(self)->pd.DataFrame:
+        """
+        Converts the table to the dense pd.DataFrame expected by mario.
+
+        Returns:
+            pd.DataFrame: The dense table.
+        """
+        values = np.zeros(self.shape)
+        for start,block in self.iter_blocks(as_frame=False):
+            values[start:start+block.shape[0]] = block
+        return pd.DataFrame(values,index=self.index,columns=self.columns)
+
+    def iter_blocks(
+            self,
+            rows_per_block:int = 1024,
+            as_frame:bool = True,
+    ):
+        """
+        Streams the table out as dense blocks of rows.
+
+        Args:
+            rows_per_block (int, optional): Number of rows in each block. Defaults to 1024.
+            as_frame (bool, optional): Whether to yield pd.DataFrames instead of (start,np.ndarray) tuples. Defaults to True.
+
+        Yields:
+            pd.DataFrame or tuple: The dense blocks, in row order.
+        """
+        data = self.data.tocsr()
+        for start in range(0,self.shape[0],rows_per_block):
+            block = data[start:start+rows_per_block].toarray()
+            if as_frame:
+                yield pd.DataFrame(block,index=self.index[start:start+rows_per_block],columns=self.columns)
+            else:
+                yield start,block
+
+
+def concat_sum(
+        tables:list,
+        index:pd.Index = None,
+        columns:pd.Index = None,
+)->SparseTable:
+    """
+    Sums sparse tables over the sorted union of their labels (the sparse equivalent of pd.concat followed by groupby().sum()).
+
+    Args:
+        tables (list): The SparseTable objects to be summed.
+        index (pd.Index, optional): Extra row labels to be included even if empty. Defaults to None.
+        columns (pd.Index, optional): Extra column labels to be included even if empty. Defaults to None.
+
+    Returns:
+        SparseTable: The summed table, with sorted labels on both axes.
+    """
+    new_index = union_labels([t.index for t in tables] + ([index] if index is not None else []))
+    new_columns = union_labels([t.columns for t in tables] + ([columns] if columns is not None else []))
+    summed = SparseTable(new_index,new_columns,sparse.csr_matrix((len(new_index),len(new_columns))))
+
+    rows,cols,values = [],[],[]
+    for table in tables:
+        coo = table.data.tocoo()
+        rows += [summed.get_positions(table.index,0)[coo.row]]
+        cols += [summed.get_positions(table.columns,1)[coo.col]]
+        values += [coo.data]
+
+    if len(rows) > 0:
+        summed.data = sparse.coo_matrix(
+            (np.concatenate(values),(np.concatenate(rows),np.concatenate(cols))),
+            shape=summed.shape,
+        ).tocsr() # duplicates are summed when converting from coo
+    return summed
+
+
+def union_labels(
+        labels:list,
+)->pd.Index:
+    """
+    Returns the sorted union of a list of pd.Index objects, keeping MultiIndex names.
+
+    Args:
+        labels (list): The pd.Index objects.
+
+    Returns:
+        pd.Index: The sorted union.
+    """
+    unique = sorted(set().union(*[set(l) for l in labels]))
+    if len(unique) == 0:
+        return labels[0][:0]
+    if isinstance(labels[0],pd.MultiIndex):
+        return pd.MultiIndex.from_tuples(unique,names=labels[0].names)
+    return pd.Index(unique,name=labels[0].name)
@@ -0,0 +1,165 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+import mario
+
+from fiona.core.sut_index import SUTIndex
+
+_CACHE_VERSION = 1
+_MATRICES_FILE = 'matrices.npz'
+_LABELS_FILE = 'labels.json'
+
+
+def get_sut_fingerprint(
+        sut_path:str,
+        sut_format:str,
+        sut_mode:str,
+)->str:
+    """
+    Returns a fingerprint of the SUT source files, to be used as cache key.
+
+    The fingerprint hashes the relative name, size and modification time of every source file,
+    together with the format and the mode of the SUT.
+
+    Args:
+        sut_path (str): The path to the SUT file or folder.
+        sut_format (str): The format of the SUT file.
+        sut_mode (str): The mode of the SUT.
+
+    Returns:
+        str: The fingerprint.
+    """
+    if os.path.isdir(sut_path):
+        files = sorted(
+            os.path.join(root,file)
+            for root,_,names in os.walk(sut_path)
+            for file in names
+        )
+    else:
+        files = [sut_path]
+
+    fingerprint = hashlib.sha256(f"{_CACHE_VERSION}|{sut_format}|{sut_mode}".encode())
+    for file in files:
+        stat = os.stat(file)
+        fingerprint.update(f"|{os.path.relpath(file,sut_path) if file != sut_path else os.path.basename(file)}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    return fingerprint.hexdigest()
+
+
+def save_sut_to_cache(
+        sut:mario.Database,
+        cache_dir:str,
+        fingerprint:str,
+):
+    """
+    Stores the matrices, indices and units of a parsed SUT in the cache.
+
+    Values are stored as float arrays in an uncompressed npz file, labels and units in a json file.
+
+    Args:
+        sut (mario.Database): The parsed SUT.
+        cache_dir (str): The cache directory.
+        fingerprint (str): The fingerprint of the SUT source files.
+    """
+    scenario = sut.scenarios[0]
+    matrices = sut.matrices[scenario]
+
+    labels = {
+        'matrices': {k:{'index':encode_labels(v.index),'columns':encode_labels(v.columns)} for k,v in matrices.items()},
+        'indices': sut._indeces,
+        'units': {k:v.to_dict(orient='split') for k,v in sut.units.items()},
+    }
+
+    os.makedirs(cache_dir,exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+    np.savez(os.path.join(tmp_dir,_MATRICES_FILE),**{k:v.values.astype(float) for k,v in matrices.items()})
+    with open(os.path.join(tmp_dir,_LABELS_FILE),'w') as f:
+        json.dump(labels,f)
+
+    target = os.path.join(cache_dir,fingerprint)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(tmp_dir,target) # the cache entry appears only once completely written
+
+
+def load_sut_from_cache(
+        cache_dir:str,
+        fingerprint:str,
+)->mario.Database:
+    """
+    Loads a SUT from the cache.
+
+    Args:
+        cache_dir (str): The cache directory.
+        fingerprint (str): The fingerprint of the SUT source files.
+
+    Returns:
+        mario.Database: The SUT, or None if it is not in the cache.
+    """
+    target = os.path.join(cache_dir,fingerprint)
+    if not os.path.isfile(os.path.join(target,_LABELS_FILE)):
+        return None
+
+    with open(os.path.join(target,_LABELS_FILE)) as f:
+        labels = json.load(f)
+
+    matrices = {}
+    with np.load(os.path.join(target,_MATRICES_FILE)) as values:
+        for k,v in labels['matrices'].items():
+            matrices[k] = pd.DataFrame(
+                values[k],
+                index=decode_labels(v['index']),
+                columns=decode_labels(v['columns']),
+            )
+
+    units = {k:pd.DataFrame(**v) for k,v in labels['units'].items()}
+
+    return mario.Database(
+        name=None,
+        table='SUT',
+        source=None,
+        year=None,
+        init_by_parsers={"matrices": {'baseline': matrices}, "_indeces": labels['indices'], "units": units},
+        calc_all=False,
+        )
+
+
+def load_sut_index_from_cache(
+        cache_dir:str,
+        fingerprint:str,
+)->SUTIndex:
+    """
+    Loads only the indices and units of a SUT from the cache, without the matrices.
+
+    Args:
+        cache_dir (str): The cache directory.
+        fingerprint (str): The fingerprint of the SUT source files.
+
+    Returns:
+        SUTIndex: The indices and units, or None if the SUT is not in the cache.
+    """
+    target = os.path.join(cache_dir,fingerprint)
+    if not os.path.isfile(os.path.join(target,_LABELS_FILE)):
+        return None
+
+    with open(os.path.join(target,_LABELS_FILE)) as f:
+        labels = json.load(f)
+
+    return SUTIndex(labels['indices'],{k:pd.DataFrame(**v) for k,v in labels['units'].items()})
+
+
+def encode_labels(labels:pd.Index)->dict:
+    return {
+        'levels': [labels.get_level_values(i).tolist() for i in range(labels.nlevels)],
+        'names': list(labels.names),
+    }
+
+
+def decode_labels(labels:dict)->pd.Index:
+    if len(labels['levels']) == 1:
+        return pd.Index(labels['levels'][0],name=labels['names'][0])
+    return pd.MultiIndex.from_arrays(labels['levels'],names=labels['names'])
@@ -0,0 +1,180 @@
+import os
+from functools import partial
+
+import pandas as pd
+
+from mario.tools.constants import _MASTER_INDEX as MI
+from mario.tools.tableparser import get_units
+from mario.tools.utilities import delete_duplicates
+
+_KEYS = {MI[key]:key for key in ['r','a','c','k','f','n','s']}
+_HEADER_ROWS = 3
+
+
+class SUTIndex:
+
+    def __init__(
+            self,
+            indices:dict,
+            units:dict,
+    ):
+        """
+        The label sets and units of a SUT, without its matrices, in place of a mario.Database where only
+        these are needed (e.g. to generate templates and to validate the master sheet and the inventories).
+
+        Args:
+            indices (dict): The indices, as in mario.Database._indeces ({key: {'main': list of labels}}).
+            units (dict): The units, as in mario.Database.units ({item: pd.DataFrame}).
+
+        Attributes:
+            units (dict): The units.
+        """
+        self._indeces = indices
+        self.units = units
+
+    def get_index(
+            self,
+            index:str,
+    )->list:
+        """
+        Returns the labels of a set, as mario.Database.get_index does.
+
+        Args:
+            index (str): The set, e.g. MI['r'].
+
+        Raises:
+            ValueError: If the set is not a set of a SUT.
+
+        Returns:
+            list: A new list with the labels.
+        """
+        if index not in _KEYS:
+            raise ValueError(f"Set {index} not in {list(_KEYS)}")
+        return list(self._indeces[_KEYS[index]]['main'])
+
+
+def read_labels(
+        reader,
+        index_levels:int,
+        fill:bool = False,
+)->tuple:
+    """
+    Reads the row and column labels of a matrix written by mario (3 header rows, optionally followed by a row
+    with the names of the index), without reading its values.
+
+    Args:
+        reader (callable): Reads the file as pd.read_csv or pd.read_excel do, given their keyword arguments.
+        index_levels (int): The number of columns of row labels.
+        fill (bool, optional): Whether to fill empty row labels with the ones above, as for merged cells in Excel. Defaults to False.
+
+    Returns:
+        tuple: The row labels (pd.Index) and the column labels (pd.MultiIndex).
+    """
+    index_col = list(range(index_levels))
+    header = reader(header=list(range(_HEADER_ROWS)),index_col=index_col,nrows=0)
+    has_names = any(name is not None for name in header.index.names)
+
+    rows = reader(header=None,skiprows=_HEADER_ROWS+int(has_names),usecols=index_col)
+    if fill:
+        rows = rows.ffill()
+    if index_levels == 1:
+        return pd.Index(rows.iloc[:,0]),header.columns
+    return pd.MultiIndex.from_frame(rows),header.columns
+
+
+def get_level_items(
+        labels:pd.MultiIndex,
+        level:str,
+)->list:
+    return delete_duplicates(labels[labels.get_level_values(1) == level].get_level_values(2))
+
+
+def get_indices(
+        regions:pd.Index,
+        rows:pd.MultiIndex,
+        columns:pd.MultiIndex,
+        satellite_accounts:list,
+        factors_of_production:list,
+)->dict:
+    """
+    Returns the indices of a SUT from its labels, in the order of appearance, as mario does when parsing.
+
+    Args:
+        regions (pd.Index): The labels whose first level gives the regions.
+        rows (pd.MultiIndex): The row labels giving the activities and commodities.
+        columns (pd.MultiIndex): The column labels giving the consumption categories.
+        satellite_accounts (list): The satellite accounts.
+        factors_of_production (list): The factors of production.
+
+    Raises:
+        ValueError: If some sets are not in the labels.
+
+    Returns:
+        dict: The indices, as in mario.Database._indeces.
+    """
+    indices = {
+        'r': {'main': delete_duplicates(regions.get_level_values(0))},
+        'n': {'main': get_level_items(columns,MI['n'])},
+        'k': {'main': delete_duplicates(satellite_accounts)},
+        'f': {'main': delete_duplicates(factors_of_production)},
+        'a': {'main': get_level_items(rows,MI['a'])},
+        'c': {'main': get_level_items(rows,MI['c'])},
+    }
+    missing = [MI[key] for key,index in indices.items() if len(index['main']) == 0]
+    if len(missing) > 0:
+        raise ValueError(f"{missing} can not be found in the SUT")
+    indices['s'] = {'main': indices['a']['main'] + indices['c']['main']}
+    return indices
+
+
+def read_sut_index(
+        path:str,
+        sut_format:str,
+        sut_mode:str,
+        data_sheet = 0,
+        units_sheet:str = 'units',
+        sep:str = ',',
+)->SUTIndex:
+    """
+    Reads the label sets and units of a SUT from the files parsed by mario.parse_from_excel or mario.parse_from_txt,
+    without reading the values of the matrices.
+
+    Args:
+        path (str): The path to the Excel file, or to the folder of the txt files.
+        sut_format (str): The format of the SUT, 'xlsx' or 'txt'.
+        sut_mode (str): The mode of the SUT, which gives the names of the txt files.
+        data_sheet (int or str, optional): The sheet of the matrices in the Excel file. Defaults to 0.
+        units_sheet (str, optional): The sheet of the units in the Excel file. Defaults to 'units'.
+        sep (str, optional): The separator of the txt files. Defaults to ','.
+
+    Raises:
+        ValueError: If the format is not 'xlsx' or 'txt'.
+
+    Returns:
+        SUTIndex: The label sets and units.
+    """
+    if sut_format == 'xlsx':
+        rows,columns = read_labels(partial(pd.read_excel,path,sheet_name=data_sheet),3,fill=True)
+        indices = get_indices(
+            columns,
+            rows,
+            columns,
+            get_level_items(rows,MI['k']),
+            get_level_items(rows,MI['f']),
+        )
+        units = pd.read_excel(path,sheet_name=units_sheet,index_col=[0,1])
+
+    elif sut_format == 'txt':
+        names = {'z':'z','e':'e','v':'v'} if sut_mode == 'coefficients' else {'z':'Z','e':'E','v':'V'}
+        get_reader = lambda name: partial(pd.read_csv,os.path.join(path,f"{name}.txt"),sep=sep)
+        z_rows,z_columns = read_labels(get_reader(names['z']),3)
+        _,Y_columns = read_labels(get_reader('Y'),3)
+        e_rows,_ = read_labels(get_reader(names['e']),1)
+        v_rows,_ = read_labels(get_reader(names['v']),1)
+        indices = get_indices(z_columns,z_rows,Y_columns,list(e_rows),list(v_rows))
+        units = pd.read_csv(os.path.join(path,'units.txt'),index_col=[0,1],header=[0],sep=sep)
+
+    else:
+        raise ValueError(f"Index-only reading not available for SUT format {sut_format}")
+
+    return SUTIndex(indices,get_units(units,'SUT',indices))
@@ -0,0 +1,364 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from fiona.core.add_inventories import Inventories
+from fiona.core.options import BuildOptions
+from fiona.core.variants import Variant
+from fiona.rules import _ACCEPTABLES
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+_MASTER_PARAMETERS = ['Market share','Total output']
+_STATISTICS = ['mean','std','p5','p50','p95']
+
+
+class MonteCarlo:
+
+    def __init__(
+            self,
+            builder,
+            distributions:list,
+            scenario:str = 'baseline',
+            satellites:list = None,
+    ):
+        """
+        Propagates the uncertainty of inventory quantities, market shares and total outputs to the footprints
+        of the activities added by FIONA, for all samples at once and without rebuilding the database.
+
+        The edits of FIONA are affine in each of these values, so the change of the blocks of z, e and Y per unit
+        change of each uncertain value is computed once, by filling its activity again with a perturbed value.
+        The blocks of each sample are the blocks of the SUT plus a linear combination of these changes. Since they
+        only touch a few columns of z, the footprints of all samples are computed from the factorization of the
+        SUT (shared by all samples) with the Woodbury identity, as stacked arrays.
+
+        Args:
+            builder (DB_builder): The DB_builder object, with its activities already added to the SUT.
+            distributions (list): The uncertain values, as dicts with a 'distribution' (a method of numpy.random.Generator,
+                e.g. 'normal', 'lognormal', 'uniform' or 'triangular') and its 'params' (e.g. {'loc': 0.5, 'scale': 0.05}),
+                drawing the values themselves. Inventory quantities are identified by 'sheet' and 'row' (position in the
+                sheet), master values by 'activity', 'region', 'commodity' and 'column' ('Market share' or 'Total output').
+            scenario (str, optional): The scenario of the SUT. Defaults to 'baseline'.
+            satellites (list, optional): The satellite accounts whose footprints are computed. Defaults to None (all).
+
+        Raises:
+            AttributeError: If no activity was added to the SUT yet. Use add_inventories() first.
+            ValueError: If a distribution is not acceptable or an uncertain value is not identified.
+
+        Attributes:
+            builder (DB_builder): The DB_builder object.
+            parameters (list): The uncertain values, as dicts with their 'activity', 'nominal' value and 'distribution'.
+            activities (list): The activities added by FIONA.
+            labels (pd.Index): The columns of z of the activities, whose footprints per unit of output are computed.
+            satellites (pd.Index): The satellite accounts whose footprints are computed.
+            samples (np.ndarray): The drawn values of the last run, as samples x parameters.
+            footprints (np.ndarray): The footprints per unit of output of the last run, as samples x satellites x labels.
+            final_demand_footprints (np.ndarray): The footprints of the final demand added by each activity in the last run,
+                as samples x satellites x activities.
+        """
+        if len(builder.fiona_activities) == 0:
+            raise AttributeError("No activity added to the SUT yet. Use add_inventories() first")
+
+        self.builder = builder
+        self.activities = list(builder.fiona_activities)
+        self.parameters = [get_parameter(builder,spec) for spec in distributions]
+
+        self.solver = builder.get_footprint_solver(scenario)
+        z,e = self.solver.z,self.solver.e
+        self.labels = self.solver.get_activity_labels(self.activities)
+        self.satellites = e.index if satellites is None else pd.Index(satellites)
+        self.e_rows = get_indexer(e.index,self.satellites)
+
+        self.get_changes(builder.get_fill_matrices(builder.sut.matrices[scenario]))
+        self.samples = None
+        self.footprints = None
+        self.final_demand_footprints = None
+
+    def get_changes(
+            self,
+            read_matrices:dict,
+    ):
+        """
+        Computes the change of the blocks of z, e and Y per unit change of each uncertain value, filling the
+        activity of each value with the nominal and with a perturbed value.
+
+        Args:
+            read_matrices (dict): The matrices read to fill the activities.
+        """
+        z,e = self.solver.z,self.solver.e
+        n = z.shape[0]
+        cluster_shares = {}
+
+        def fill(spec,activity):
+            inventories = Inventories(Variant(self.builder,'Monte Carlo',spec),matrices=dict(read_matrices),options=BuildOptions(backend='sparse'),activities=[activity])
+            inventories._cluster_shares = cluster_shares.get('shares')
+            inventories.fill_journal()
+            cluster_shares['shares'] = inventories._cluster_shares
+            blocks = {m:inventories.journal.to_sparse(m) for m in ['u','s','e']}
+            y = np.zeros(n)
+            for row,col,value in inventories.get_final_demand_contributions(activity):
+                y[z.index.get_loc(row)] += value
+            return (
+                to_positions(blocks['u'],z.index,z.columns) + to_positions(blocks['s'],z.index,z.columns),
+                to_positions(blocks['e'],e.index,z.columns),
+                y,
+            )
+
+        nominal = {}
+        dz,de,dy = [],[],[]
+        for parameter in self.parameters:
+            activity = parameter['activity']
+            if activity not in nominal:
+                nominal[activity] = fill({},activity)
+            step = parameter['nominal'] if parameter['nominal'] != 0 else 1.0
+            perturbed = fill(get_spec(self.builder,parameter,parameter['nominal']+step),activity)
+            dz.append(((perturbed[0]-nominal[activity][0])/step).tocsc())
+            de.append(((perturbed[1]-nominal[activity][1])/step).tocsc())
+            dy.append((perturbed[2]-nominal[activity][2])/step)
+        self.dz,self.de = dz,de
+
+        # final demand added by each activity in the SUT, and its change per unit change of each value
+        self.y = np.zeros((n,len(self.activities)))
+        for j,activity in enumerate(self.activities):
+            for row,col,value in self.builder.fiona_activities[activity]['Y']:
+                self.y[z.index.get_loc(row),j] += value
+        self.dy = np.zeros((len(self.parameters),n,len(self.activities)))
+        for i,parameter in enumerate(self.parameters):
+            self.dy[i,:,self.activities.index(parameter['activity'])] = dy[i]
+
+        # columns of z and e touched by the uncertain values, and rows of the final demand
+        self.z_cols = get_touched_columns(self.dz)
+        self.e_cols = get_touched_columns(self.de)
+        self.y_rows = np.flatnonzero(np.abs(self.y).sum(axis=1) + np.abs(self.dy).sum(axis=(0,2)))
+        self.de_touched = np.stack([de[self.e_rows][:,self.e_cols].toarray() for de in de]) if len(de) > 0 else np.zeros((0,len(self.e_rows),len(self.e_cols)))
+
+    def run(
+            self,
+            samples:int,
+            seed:int = None,
+            chunk:int = 256,
+    )->dict:
+        """
+        Draws samples of the uncertain values and computes the footprints of all the samples.
+
+        Args:
+            samples (int): The number of samples.
+            seed (int, optional): The seed of the random generator. Defaults to None.
+            chunk (int, optional): The number of samples evaluated at once. Defaults to 256.
+
+        Returns:
+            dict: The summary statistics ('mean', 'std', 'p5', 'p50', 'p95') of the footprints, as {'footprints': pd.DataFrame
+                with the satellites and statistics on rows and the activities (in each of their regions) on columns,
+                'final_demand': pd.DataFrame with the satellites and statistics on rows and the activities on columns}.
+        """
+        rng = np.random.default_rng(seed)
+        self.samples = np.column_stack([draw(rng,parameter,samples) for parameter in self.parameters]) if self.parameters else np.zeros((samples,0))
+        deltas = self.samples - np.array([p['nominal'] for p in self.parameters])
+
+        footprints,final_demand = [],[]
+        for start in range(0,samples,chunk):
+            f,fd = self.evaluate(deltas[start:start+chunk])
+            footprints.append(f)
+            final_demand.append(fd)
+        self.footprints = np.concatenate(footprints)
+        self.final_demand_footprints = np.concatenate(final_demand)
+
+        return {
+            'footprints': get_statistics(self.footprints,self.satellites,self.labels),
+            'final_demand': get_statistics(self.final_demand_footprints,self.satellites,pd.Index(self.activities,name=MI['a'])),
+        }
+
+    def evaluate(
+            self,
+            deltas:np.ndarray,
+    )->tuple:
+        """
+        Computes the footprints of some samples, given the changes of the uncertain values from their nominal values.
+
+        With M = I-z of the SUT, K the columns of z touched by the samples and W = M^-1 dz[:,K], the columns of the
+        Leontief inverse of each sample are X = G + W (I - W[K])^-1 G[K], where G are the columns of M^-1.
+
+        Args:
+            deltas (np.ndarray): The changes, as samples x parameters.
+
+        Returns:
+            tuple: The footprints per unit of output (samples x satellites x labels) and of the final demand added by
+                each activity (samples x satellites x activities).
+        """
+        z,e = self.solver.z,self.solver.e
+        e0 = np.nan_to_num(e.values[self.e_rows])
+        columns = self.labels.append(z.index[self.y_rows])
+        G = self.solver.solve(columns)
+        K,C = self.z_cols,self.e_cols
+        n_samples = deltas.shape[0]
+
+        # e of each sample, on the touched columns only
+        E_C = e0[:,C] + np.einsum('sp,pkc->skc',deltas,self.de_touched)
+        EG = e0 @ G + np.einsum('skc,cl->skl',E_C - e0[:,C],G[C])
+
+        if len(K) > 0:
+            H = self.get_solved_changes()
+            W = np.einsum('sp,pnk->snk',deltas,H['rows']) # rows K and C of M^-1 dz[:,K]
+            EW = np.einsum('sp,pkq->skq',deltas,H['e']) + np.einsum('skc,scq->skq',E_C - e0[:,C],W[:,len(K):])
+            T = np.eye(len(K)) - W[:,:len(K)]
+            X = EG + EW @ np.linalg.solve(T,np.broadcast_to(G[K],(n_samples,)+G[K].shape))
+        else:
+            X = EG
+
+        y = self.y[self.y_rows] + np.einsum('sp,pna->sna',deltas,self.dy[:,self.y_rows])
+        return X[:,:,:len(self.labels)],X[:,:,len(self.labels):] @ y
+
+    def get_solved_changes(self)->dict:
+        """
+        Solves M H_p = dz_p[:,K] for each uncertain value once, keeping only the rows K and C of H_p and e H_p.
+
+        Returns:
+            dict: {'rows': parameters x (K+C) x K array, 'e': parameters x satellites x K array}.
+        """
+        if getattr(self,'_solved_changes',None) is None:
+            K,C = self.z_cols,self.e_cols
+            e0 = np.nan_to_num(self.solver.e.values[self.e_rows])
+            rows,e_rows = [],[]
+            for dz in self.dz:
+                H = self.solver.lu.solve(dz[:,K].toarray())
+                rows.append(np.concatenate([H[K],H[C]]))
+                e_rows.append(e0 @ H)
+            self._solved_changes = {'rows':np.stack(rows),'e':np.stack(e_rows)}
+        return self._solved_changes
+
+
+def get_parameter(
+        builder,
+        spec:dict,
+)->dict:
+    """
+    Identifies an uncertain value and returns its activity and nominal value.
+
+    Args:
+        builder (DB_builder): The DB_builder object.
+        spec (dict): The uncertain value. See MonteCarlo for the format.
+
+    Raises:
+        ValueError: If the distribution or the master column is not acceptable.
+        KeyError: If the uncertain value is not in the master sheet or in the inventories.
+
+    Returns:
+        dict: The uncertain value, with its 'activity' and 'nominal' value added.
+    """
+    if spec.get('distribution') not in _ACCEPTABLES['distributions']:
+        raise ValueError(f"Distribution {spec.get('distribution')} not in {_ACCEPTABLES['distributions']}")
+
+    parameter = dict(spec)
+    if 'sheet' in spec:
+        activity = builder.master_index.get_sheet(spec['sheet'])[MI['a']]
+        inventory = builder.inventories[activity][spec['sheet']]
+        if not 0 <= spec['row'] < inventory.shape[0]:
+            raise KeyError(f"Row {spec['row']} not in inventory sheet {spec['sheet']}")
+        parameter['activity'] = activity
+        parameter['nominal'] = float(inventory['Quantity'].iloc[spec['row']])
+        return parameter
+
+    if spec.get('column') not in _MASTER_PARAMETERS:
+        raise ValueError(f"Column {spec.get('column')} not in {_MASTER_PARAMETERS}")
+    master_sheet = builder.master_sheet
+    mask = (master_sheet[MI['a']] == spec.get('activity')) & (master_sheet[MI['r']] == spec.get('region')) & (master_sheet[MI['c']] == spec.get('commodity'))
+    if not mask.any():
+        raise KeyError(f"No row of the master sheet matches {({key:spec.get(key) for key in ['activity','region','commodity']})}")
+    nominal = master_sheet.loc[mask,spec['column']].iloc[0]
+    parameter['nominal'] = 0.0 if pd.isna(nominal) else float(nominal)
+    return parameter
+
+
+def get_spec(
+        builder,
+        parameter:dict,
+        value:float,
+)->dict:
+    """
+    Returns the spec of a variant where an uncertain value is replaced.
+
+    Args:
+        builder (DB_builder): The DB_builder object.
+        parameter (dict): The uncertain value.
+        value (float): The new value.
+
+    Returns:
+        dict: The spec. See Variant for the format.
+    """
+    if 'sheet' in parameter:
+        inventory = builder.inventories[parameter['activity']][parameter['sheet']].copy()
+        inventory.loc[inventory.index[parameter['row']],'Quantity'] = value
+        return {'inventories':{parameter['activity']:{parameter['sheet']:inventory}}}
+    return {'master':[{MI['a']:parameter['activity'],MI['r']:parameter['region'],MI['c']:parameter['commodity'],parameter['column']:value}]}
+
+
+def draw(
+        rng:np.random.Generator,
+        parameter:dict,
+        samples:int,
+)->np.ndarray:
+    return getattr(rng,parameter['distribution'])(**parameter.get('params',{}),size=samples)
+
+
+def get_touched_columns(
+        changes:list,
+)->np.ndarray:
+    columns = [np.flatnonzero(np.diff(change.indptr)) for change in changes] # csc matrices
+    return np.unique(np.concatenate(columns)).astype(int) if len(columns) > 0 else np.zeros(0,dtype=int)
+
+
+def get_indexer(
+        labels:pd.Index,
+        subset:pd.Index,
+)->np.ndarray:
+    positions = labels.get_indexer(subset)
+    if (positions == -1).any():
+        raise KeyError(f"{list(subset[positions == -1])} not in {list(labels)}")
+    return positions
+
+
+def to_positions(
+        table,
+        index:pd.Index,
+        columns:pd.Index,
+)->sparse.csr_matrix:
+    """
+    Places the non-zero values of a SparseTable in a sparse matrix with the given labels.
+
+    Args:
+        table (SparseTable): The table.
+        index (pd.Index): The row labels of the matrix.
+        columns (pd.Index): The column labels of the matrix.
+
+    Returns:
+        sparse.csr_matrix: The matrix.
+    """
+    coo = table.data.tocoo()
+    rows = get_indexer(index,table.index[coo.row])
+    cols = get_indexer(columns,table.columns[coo.col])
+    return sparse.csr_matrix((coo.data,(rows,cols)),shape=(len(index),len(columns)))
+
+
+def get_statistics(
+        values:np.ndarray,
+        satellites:pd.Index,
+        columns:pd.Index,
+)->pd.DataFrame:
+    """
+    Returns summary statistics over samples.
+
+    Args:
+        values (np.ndarray): The values, as samples x satellites x columns.
+        satellites (pd.Index): The satellite accounts.
+        columns (pd.Index): The columns.
+
+    Returns:
+        pd.DataFrame: The statistics, with the satellites and statistics on rows.
+    """
+    statistics = np.stack([
+        values.mean(axis=0),
+        values.std(axis=0,ddof=1) if values.shape[0] > 1 else np.zeros(values.shape[1:]),
+        *np.percentile(values,[5,50,95],axis=0),
+    ],axis=1) # satellites x statistics x columns
+    index = pd.MultiIndex.from_product([satellites,_STATISTICS],names=[satellites.name or 'Item','Statistic'])
+    return pd.DataFrame(statistics.reshape(len(satellites)*len(_STATISTICS),len(columns)),index=index,columns=columns)
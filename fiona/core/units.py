@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+import pint
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+
+class UnitService:
+
+    def __init__(self):
+        """
+        Initialize the unit service.
+
+        The pint.UnitRegistry is built only once, at the first conversion. Every unit string is
+        parsed only once, and every (from_unit,to_unit) pair is solved only once.
+
+        Attributes:
+            parsed (dict): The parsed units, as {unit: pint.Quantity or None if not acceptable by pint}.
+            conversions (dict): The solved conversions, as {(from_unit,to_unit): (factor,compatible,defined)}.
+        """
+        self._registry = None
+        self.parsed = {}
+        self.conversions = {}
+
+    @property
+    def registry(self)->pint.UnitRegistry:
+        if self._registry is None:
+            self._registry = pint.UnitRegistry()
+        return self._registry
+
+    def parse(
+            self,
+            unit:str,
+    ):
+        """
+        Parses a unit string.
+
+        Args:
+            unit (str): The unit to be parsed.
+
+        Returns:
+            pint.Quantity: The parsed unit, or None if the unit is not acceptable by pint.
+        """
+        if unit not in self.parsed:
+            try:
+                self.parsed[unit] = self.registry(unit)
+            except Exception:
+                self.parsed[unit] = None
+        return self.parsed[unit]
+
+    def conversion(
+            self,
+            from_unit:str,
+            to_unit:str,
+    )->tuple:
+        """
+        Returns the conversion factor between two units.
+
+        Args:
+            from_unit (str): The unit to convert from.
+            to_unit (str): The unit to convert to.
+
+        Returns:
+            tuple: (factor,compatible,defined). 'defined' is False if any of the units is not acceptable by pint,
+                   'compatible' is False if the units have different dimensionalities. In both cases factor is nan.
+        """
+        key = (from_unit,to_unit)
+        if key not in self.conversions:
+            if from_unit == to_unit:
+                self.conversions[key] = (1.0,True,True)
+            else:
+                source = self.parse(from_unit)
+                target = self.parse(to_unit)
+                if source is None or target is None:
+                    self.conversions[key] = (np.nan,False,False)
+                elif not source.is_compatible_with(target):
+                    self.conversions[key] = (np.nan,False,True)
+                else:
+                    self.conversions[key] = (float(source.to(target).magnitude/getattr(target,'magnitude',1)),True,True)
+        return self.conversions[key]
+
+    def get_factors(
+            self,
+            from_units:pd.Series,
+            to_units:pd.Series,
+    )->pd.DataFrame:
+        """
+        Returns the conversion factors between two aligned series of units, solving each distinct pair once.
+
+        Args:
+            from_units (pd.Series): The units to convert from.
+            to_units (pd.Series): The units to convert to.
+
+        Returns:
+            pd.DataFrame: 'factor', 'compatible' and 'defined' columns, with the same index of from_units.
+        """
+        pairs = pd.MultiIndex.from_arrays([from_units.values,to_units.values])
+        unique_pairs = pairs.unique()
+        solved = pd.DataFrame(
+            [self.conversion(f,t) for f,t in unique_pairs],
+            index=unique_pairs,
+            columns=['factor','compatible','defined'],
+        )
+        factors = solved.reindex(pairs)
+        factors.index = from_units.index
+        return factors
+
+
+_unit_service = None
+
+def get_unit_service()->UnitService:
+    """
+    Returns the process-wide unit service.
+
+    Returns:
+        UnitService: The unit service shared by all FIONA modules.
+    """
+    global _unit_service
+    if _unit_service is None:
+        _unit_service = UnitService()
+    return _unit_service
+
+
+def get_database_units(
+        inventory:pd.DataFrame,
+        units:dict,
+)->pd.Series:
+    """
+    Returns the units of the database items referred by each row of an inventory.
+
+    Args:
+        inventory (pd.DataFrame): The inventory, with 'Item' and 'DB Item' columns.
+        units (dict): The units of the database, as in mario.Database.units.
+
+    Raises:
+        ValueError: If any item is not a commodity, a factor of production or a satellite account.
+        KeyError: If any database item has no unit in the database.
+
+    Returns:
+        pd.Series: The database unit of each row, with the same index of the inventory.
+    """
+    items = inventory['Item']
+    if (items == MI['a']).any():
+        raise ValueError(f"Item {MI['a']} is not recognized: activities cannot be supplied to other activities")
+    not_recognized = items[~items.isin([MI['c'],MI['k'],MI['f']])]
+    if not not_recognized.empty:
+        raise ValueError(f"Item {not_recognized.iloc[0]} is not recognized")
+
+    db_units = pd.concat({item:units[item]['unit'] for item in [MI['c'],MI['k'],MI['f']]})
+    db_units = db_units[~db_units.index.duplicated(keep='first')]
+    rows = pd.MultiIndex.from_arrays([items.values,inventory['DB Item'].values])
+    missing = rows.difference(db_units.index)
+    if len(missing) > 0:
+        raise KeyError(f"Units not found in the database for {list(missing)}")
+
+    return pd.Series(db_units.reindex(rows).values,index=inventory.index)
@@ -0,0 +1,338 @@
+import hashlib
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from fiona.core.assembly import place_blocks
+from fiona.core.master_index import MasterIndex
+from fiona.core.sparse import SparseTable
+from fiona.rules import _INVENTORY_SHEET_COLUMNS as InvS_cols
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+_MASTER_KEYS = [MI['a'],MI['r'],MI['c']]
+
+
+class Variant:
+
+    def __init__(
+            self,
+            builder,
+            name:str,
+            spec:dict,
+    ):
+        """
+        A variant of the master sheet and inventories of a DB_builder whose activities were already added to the SUT.
+
+        The variant is a copy-on-write view of the builder: only the master rows and inventory sheets given in
+        spec are replaced, and only the activities whose inputs differ from the builder's ones are filled again.
+
+        Args:
+            builder (DB_builder): The DB_builder object, with its activities already added to the SUT.
+            name (str): The name of the variant.
+            spec (dict): The changes of the variant, as {'master': list of dicts, 'inventories': dict}. Each master
+                dict identifies a master row by its activity, region and commodity and gives the new values of
+                other columns (e.g. 'Market share', 'Total output'). Inventories are given as {activity: {sheet name: pd.DataFrame}}.
+
+        Raises:
+            ValueError: If the variant refers to activities or commodities not in the SUT.
+
+        Attributes:
+            name (str): The name of the variant.
+            builder (DB_builder): The DB_builder object.
+            master_sheet (pd.DataFrame): The master sheet of the variant.
+            master_index (MasterIndex): The parsed master sheet of the variant.
+            inventories (InventoryOverlay): The inventories of the variant, read from the builder's ones unless replaced.
+            activities (list): The activities whose inputs differ from the builder's ones.
+            blocks (dict): The filled slices of the activities of the variant, as SparseTable objects.
+            final_demand (list): The values added to the final demand by the activities of the variant.
+        """
+        self.name = name
+        self.builder = builder
+        self.master_sheet = apply_master_updates(builder.master_sheet,spec.get('master',[]))
+        self.master_index = MasterIndex(self.master_sheet)
+
+        overrides = {}
+        for activity,sheets in spec.get('inventories',{}).items():
+            if activity not in builder.inventories:
+                raise ValueError(f"Activity {activity} of variant {name} was not added to the SUT")
+            overrides[activity] = {**builder.inventories[activity],**sheets}
+        self.inventories = InventoryOverlay(builder.inventories,overrides)
+
+        unknown = set(self.master_sheet[MI['c']]) - builder.indices.get_set(MI['c'])
+        if len(unknown) > 0:
+            raise ValueError(f"Variant {name} adds commodities not in the SUT: {sorted(unknown)}")
+
+        self.activities = [
+            act for act in builder.new_activities
+            if get_activity_signature(self.master_index,self.inventories,self.regions_maps,act) != builder.fiona_activities[act]['signature']
+        ]
+        self.blocks = None
+        self.final_demand = None
+
+    # attributes read by Inventories, shared with the builder
+    @property
+    def sut(self):
+        return self.builder.sut
+
+    @property
+    def indices(self):
+        return self.builder.indices
+
+    @property
+    def instrumentation(self):
+        return self.builder.instrumentation
+
+    @property
+    def regions_maps(self)->dict:
+        return self.builder.regions_maps
+
+    @property
+    def fiona_conversions(self)->dict:
+        return self.builder.fiona_conversions
+
+    @property
+    def fiona_activities(self)->dict:
+        return self.builder.fiona_activities
+
+    @property
+    def new_activities(self)->list:
+        return self.builder.new_activities
+
+    @property
+    def new_commodities(self)->list:
+        return []
+
+    @property
+    def parented_activities(self)->list:
+        return [act for act in self.new_activities if self.master_index.get_activity(act)[f'Parent {MI["a"]}'] is not None]
+
+    def get_matrices(
+            self,
+            base:dict,
+    )->dict:
+        """
+        Builds the matrices of the variant from the matrices of the builder's SUT.
+
+        Matrices not touched by the variant are shared with base, the others are copied once: the rows and
+        columns of the activities of the variant are replaced by their blocks and the final demand is updated.
+
+        Args:
+            base (dict): The matrices z, e, v, Y and EY of the builder's SUT.
+
+        Returns:
+            dict: The matrices z, e, v, Y and EY of the variant.
+        """
+        matrices = {m:base[m] for m in ['z','e','v','Y','EY']}
+        if len(self.activities) == 0:
+            return matrices
+
+        z = base['z']
+        matrices['z'] = replace_blocks(z,[self.blocks['u'],self.blocks['s']],get_activity_mask(z.index,self.activities),get_activity_mask(z.columns,self.activities))
+        for matrix in ['v','e']:
+            matrices[matrix] = replace_blocks(base[matrix],[self.blocks[matrix]],None,get_activity_mask(base[matrix].columns,self.activities))
+
+        old_final_demand = [c for act in self.activities for c in self.builder.fiona_activities[act]['Y']]
+        delta = get_table(base['Y'],self.final_demand,1)
+        delta += get_table(base['Y'],old_final_demand,-1)
+        matrices['Y'] = replace_blocks(base['Y'],[delta],None,None)
+
+        return matrices
+
+
+class InventoryOverlay(Mapping):
+
+    def __init__(
+            self,
+            base:Mapping,
+            overrides:dict,
+    ):
+        """
+        Read-only view of inventories with some activities replaced, so that the other ones are not copied
+        (nor parsed, if base is a LazyInventories).
+
+        Args:
+            base (Mapping): The inventories, as {activity: {sheet name: pd.DataFrame}}.
+            overrides (dict): The inventories of the replaced activities, all of them in base.
+        """
+        self.base = base
+        self.overrides = overrides
+
+    def __getitem__(self,activity:str)->dict:
+        if activity in self.overrides:
+            return self.overrides[activity]
+        return self.base[activity]
+
+    def __iter__(self):
+        return iter(self.base)
+
+    def __len__(self)->int:
+        return len(self.base)
+
+    def __contains__(self,activity)->bool:
+        return activity in self.base
+
+    def get_hashes(
+            self,
+            activity:str,
+    )->dict:
+        if activity in self.overrides:
+            return {sheet_name:hash_inventory(inventory) for sheet_name,inventory in self.overrides[activity].items()}
+        return get_inventory_hashes(self.base,activity)
+
+
+def replace_blocks(
+        frame:pd.DataFrame,
+        tables:list,
+        rows:np.ndarray = None,
+        cols:np.ndarray = None,
+)->pd.DataFrame:
+    """
+    Returns a copy of a matrix with the given rows and columns set to zero and the values of the tables added,
+    or the matrix itself if nothing changes.
+
+    Args:
+        frame (pd.DataFrame): The matrix.
+        tables (list): The SparseTable objects to be added.
+        rows (np.ndarray, optional): Boolean mask of the rows to be set to zero. Defaults to None.
+        cols (np.ndarray, optional): Boolean mask of the columns to be set to zero. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The new matrix.
+    """
+    values = frame.values
+    reset = (rows is not None and values[rows].any()) or (cols is not None and values[:,cols].any())
+    if not reset and all(table.data.count_nonzero() == 0 for table in tables):
+        return frame
+
+    values = frame.to_numpy(dtype=float,copy=True)
+    if rows is not None:
+        values[rows,:] = 0
+    if cols is not None:
+        values[:,cols] = 0
+    place_blocks(frame.index,frame.columns,tables=tables,out=values)
+    return pd.DataFrame(values,index=frame.index,columns=frame.columns)
+
+
+def get_activity_mask(
+        labels:pd.MultiIndex,
+        activities:list,
+)->np.ndarray:
+    return (labels.get_level_values(1) == MI['a']) & labels.get_level_values(2).isin(activities)
+
+
+def get_table(
+        frame:pd.DataFrame,
+        cells:list,
+        sign:int,
+)->SparseTable:
+    """
+    Builds a SparseTable with the labels of a matrix from a list of (row label, column label, value) tuples.
+
+    Args:
+        frame (pd.DataFrame): The matrix whose labels are used.
+        cells (list): The cells.
+        sign (int): 1 to keep the values, -1 to negate them.
+
+    Returns:
+        SparseTable: The table.
+    """
+    rows = frame.index.get_indexer([c[0] for c in cells])
+    cols = frame.columns.get_indexer([c[1] for c in cells])
+    values = np.array([c[2] for c in cells],dtype=float)*sign
+    return SparseTable(frame.index,frame.columns,sparse.csr_matrix((values,(rows,cols)),shape=frame.shape))
+
+
+def apply_master_updates(
+        master_sheet:pd.DataFrame,
+        updates:list,
+)->pd.DataFrame:
+    """
+    Returns a copy of the master sheet with some values replaced.
+
+    Args:
+        master_sheet (pd.DataFrame): The master sheet.
+        updates (list): The updates, as dicts with the activity, region and commodity of the rows to be updated and the new values of other columns.
+
+    Raises:
+        KeyError: If an update does not identify any master row.
+        ValueError: If an update refers to a column not in the master sheet.
+
+    Returns:
+        pd.DataFrame: The updated master sheet.
+    """
+    master_sheet = master_sheet.copy()
+    for update in updates:
+        mask = np.logical_and.reduce([master_sheet[key] == update.get(key) for key in _MASTER_KEYS])
+        if not mask.any():
+            raise KeyError(f"No row of the master sheet matches {({key:update.get(key) for key in _MASTER_KEYS})}")
+        for column,value in update.items():
+            if column in _MASTER_KEYS:
+                continue
+            if column not in master_sheet.columns:
+                raise ValueError(f"Column {column} not in the master sheet")
+            master_sheet.loc[mask,column] = value
+    return master_sheet
+
+
+def hash_inventory(
+        inventory:pd.DataFrame,
+)->bytes:
+    """
+    Returns a fingerprint of the values of an inventory sheet, ignoring any column added while filling the slices.
+
+    Args:
+        inventory (pd.DataFrame): The inventory.
+
+    Returns:
+        bytes: The fingerprint.
+    """
+    return pd.util.hash_pandas_object(inventory.reindex(columns=InvS_cols),index=False).values.tobytes()
+
+
+def get_inventory_hashes(
+        inventories:Mapping,
+        activity:str,
+)->dict:
+    """
+    Returns the fingerprints of the inventory sheets of an activity, without keeping the sheets if inventories
+    are parsed lazily.
+
+    Args:
+        inventories (Mapping): The inventories, as {activity: {sheet name: pd.DataFrame}}.
+        activity (str): The activity.
+
+    Returns:
+        dict: The fingerprints, as {sheet name: bytes}, empty if the activity has no inventory.
+    """
+    if hasattr(inventories,'get_hashes'):
+        return inventories.get_hashes(activity)
+    return {sheet_name:hash_inventory(inventory) for sheet_name,inventory in inventories.get(activity,{}).items()}
+
+
+def get_activity_signature(
+        master_index:MasterIndex,
+        inventories:dict,
+        regions_maps:dict,
+        activity:str,
+)->str:
+    """
+    Returns a fingerprint of everything an activity is built from: its master rows, its inventories and the regions maps.
+
+    Args:
+        master_index (MasterIndex): The parsed master sheet.
+        inventories (Mapping): The inventories, as {activity: {sheet name: pd.DataFrame}}.
+        regions_maps (dict): The regions clusters.
+        activity (str): The activity.
+
+    Returns:
+        str: The fingerprint.
+    """
+    signature = hashlib.sha256(repr(master_index.by_activity[activity]).encode())
+    signature.update(repr(sorted(regions_maps.items())).encode())
+    for sheet_name,sheet_hash in sorted(get_inventory_hashes(inventories,activity).items()):
+        signature.update(sheet_name.encode())
+        signature.update(sheet_hash)
+    return signature.hexdigest()
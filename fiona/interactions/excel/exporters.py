@@ -1,6 +1,223 @@
+import os
+from itertools import zip_longest
+
+import openpyxl
 import pandas as pd
+import xlsxwriter
+from openpyxl.utils import get_column_letter,quote_sheetname
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.datavalidation import DataValidation
 
 from mario.tools.constants import _MASTER_INDEX as MI
+from fiona.interactions.validation import _INVENTORY_ITEMS,_INVENTORY_TYPES
+
+_LISTS_SHEET_NAME = 'FIONA lists' # hidden sheet with the lists referred by data validations
+_UNITS_SHEET_NAME = 'DB units'
+_LAST_ROW = 1048576 # data validations apply to whole columns, below the header
+
+
+def get_list_name(name:str)->str:
+    """
+    Returns the name of the named range of a list of acceptable values.
+
+    Args:
+        name (str): The name of the list, e.g. 'Regions' or an item as 'Factor of production'.
+
+    Returns:
+        str: The name of the named range, e.g. 'FIONA_Factor_of_production'.
+    """
+    return f"FIONA_{name.replace(' ','_')}"
+
+
+def get_lists(
+        instance,
+        regions:list,
+        new_commodities:list = None,
+)->dict:
+    """
+    Returns the lists of acceptable values referred by data validations.
+
+    Args:
+        instance (DB_builder): The instance, whose SUT indices provide the labels.
+        regions (list): The acceptable regions, i.e. the SUT regions and the clusters of the regions maps.
+        new_commodities (list, optional): Commodities added by the master sheet, acceptable as DB items. Defaults to None.
+
+    Returns:
+        dict: The lists, as {named range name: list of values}.
+    """
+    commodities = list(dict.fromkeys(instance.indices.get_labels(MI['c']) + list(new_commodities or [])))
+    return {
+        get_list_name('Regions'): list(dict.fromkeys(regions)),
+        get_list_name('Activities'): instance.indices.get_labels(MI['a']),
+        get_list_name('Consumption categories'): instance.indices.get_labels(MI['n']),
+        get_list_name('Items'): _INVENTORY_ITEMS,
+        get_list_name('Types'): _INVENTORY_TYPES,
+        get_list_name('Booleans'): [True,False],
+        get_list_name(MI['c']): commodities,
+        get_list_name(MI['f']): instance.indices.get_labels(MI['f']),
+        get_list_name(MI['k']): instance.indices.get_labels(MI['k']),
+    }
+
+
+def get_list_references(lists:dict)->dict:
+    """
+    Returns the references of the lists in the hidden lists sheet, one list per column below a header.
+
+    Args:
+        lists (dict): The lists, as {named range name: list of values}.
+
+    Returns:
+        dict: The references, as {named range name: "'FIONA lists'!$A$2:$A$n"}.
+    """
+    references = {}
+    for i,(name,values) in enumerate(lists.items()):
+        column = get_column_letter(i+1)
+        references[name] = f"{quote_sheetname(_LISTS_SHEET_NAME)}!${column}$2:${column}${max(len(values),1)+1}"
+    return references
+
+
+def get_lists_rows(lists:dict):
+    yield list(lists.keys())
+    for row in zip_longest(*lists.values()):
+        yield list(row)
+
+
+def get_units_rows(units:dict):
+    """
+    Yields the rows of the 'DB units' sheet, without modifying the units of the SUT.
+
+    Args:
+        units (dict): The units of the database, as in mario.Database.units.
+    """
+    columns = list(next(iter(units.values())).columns) if len(units) > 0 else []
+    yield ['Item','DB Item'] + columns
+    for item,unit in units.items():
+        for label,values in zip(unit.index,unit.values.tolist()):
+            yield [item,label] + [None if pd.isna(value) else value for value in values] # missing units as empty cells
+
+
+def get_master_validations(master_columns:list)->list:
+    """
+    Returns the data validations of the master sheet.
+
+    Args:
+        master_columns (list): The columns of the master sheet.
+
+    Returns:
+        list: The validations, as (column position, list formula) tuples.
+    """
+    validated = {
+        MI['r']: get_list_name('Regions'),
+        MI['n']: get_list_name('Consumption categories'),
+        f'Parent {MI["a"]}': get_list_name('Activities'),
+        'Leave empty': get_list_name('Booleans'),
+    }
+    return [(master_columns.index(column),f"={name}") for column,name in validated.items() if column in master_columns]
+
+
+def get_inventory_validations(inv_columns:list)->list:
+    """
+    Returns the data validations of the inventory sheets. DB items are validated against the list of the item
+    of the same row, through the INDIRECT function.
+
+    Args:
+        inv_columns (list): The columns of the inventory sheets.
+
+    Returns:
+        list: The validations, as (column position, list formula) tuples.
+    """
+    item = f"${get_column_letter(inv_columns.index('Item')+1)}2"
+    validated = {
+        'Item': f"={get_list_name('Items')}",
+        'DB Item': f'=INDIRECT("{get_list_name("")}"&SUBSTITUTE({item}," ","_"))',
+        f"DB {MI['r']}": f"={get_list_name('Regions')}",
+        'Type': f"={get_list_name('Types')}",
+    }
+    return [(inv_columns.index(column),formula) for column,formula in validated.items()]
+
+
+def write_workbook(
+        path:str,
+        sheets:dict,
+        lists:dict,
+        validations:dict,
+):
+    """
+    Writes a new workbook in one streaming pass, with xlsxwriter in constant memory mode.
+
+    Args:
+        path (str): The path to the workbook.
+        sheets (dict): The sheets, as {sheet name: iterable of rows}.
+        lists (dict): The lists referred by data validations, written in the hidden lists sheet and defined as named ranges.
+        validations (dict): The data validations of each sheet, as {sheet name: list of (column position, list formula)}.
+    """
+    workbook = xlsxwriter.Workbook(path,{'constant_memory':True})
+    for sheet_name,rows in sheets.items():
+        worksheet = workbook.add_worksheet(sheet_name)
+        for i,row in enumerate(rows):
+            worksheet.write_row(i,0,row)
+        for column,formula in validations.get(sheet_name,[]):
+            worksheet.data_validation(1,column,_LAST_ROW-1,column,{'validate':'list','source':formula,'error_type':'warning'})
+
+    worksheet = workbook.add_worksheet(_LISTS_SHEET_NAME)
+    for i,row in enumerate(get_lists_rows(lists)):
+        worksheet.write_row(i,0,row)
+    worksheet.hide()
+    for name,reference in get_list_references(lists).items():
+        workbook.define_name(name,f"={reference}")
+    workbook.close()
+
+
+def update_workbook(
+        path:str,
+        sheets:dict,
+        replace:list,
+        lists:dict,
+        validations:dict,
+):
+    """
+    Adds sheets to an existing workbook, which is loaded and saved once. Sheets already in the workbook are kept,
+    unless they are to be replaced, in which case they keep their position.
+
+    Args:
+        path (str): The path to the workbook.
+        sheets (dict): The sheets, as {sheet name: iterable of rows}.
+        replace (list): The sheets to be replaced if they already exist.
+        lists (dict): The lists referred by data validations, written in the hidden lists sheet and defined as named ranges.
+        validations (dict): The data validations of each sheet, as {sheet name: list of (column position, list formula)}.
+    """
+    workbook = openpyxl.load_workbook(path)
+
+    def add_sheet(sheet_name):
+        index = None
+        if sheet_name in workbook.sheetnames:
+            index = workbook.sheetnames.index(sheet_name)
+            workbook.remove(workbook[sheet_name])
+        return workbook.create_sheet(sheet_name,index)
+
+    for sheet_name,rows in sheets.items():
+        if sheet_name in workbook.sheetnames and sheet_name not in replace:
+            continue
+        worksheet = add_sheet(sheet_name)
+        for row in rows:
+            worksheet.append(row)
+        for column,formula in validations.get(sheet_name,[]):
+            letter = get_column_letter(column+1)
+            validation = DataValidation(type='list',formula1=formula,errorStyle='warning',allow_blank=True)
+            validation.add(f"{letter}2:{letter}{_LAST_ROW}")
+            worksheet.add_data_validation(validation)
+
+    worksheet = add_sheet(_LISTS_SHEET_NAME)
+    for row in get_lists_rows(lists):
+        worksheet.append(row)
+    worksheet.sheet_state = 'hidden'
+    for name,reference in get_list_references(lists).items():
+        if name in workbook.defined_names:
+            del workbook.defined_names[name]
+        workbook.defined_names.add(DefinedName(name,attr_text=reference))
+
+    workbook.save(path)
+
 
 def get_fiona_master_template(
         instance,
@@ -11,41 +228,32 @@ def get_fiona_master_template(
         path
     ):
 
-    master_sheet = pd.DataFrame(columns=master_columns)
-    regions_maps_sheet = pd.DataFrame(instance.sut.get_index(MI['r']), columns=reg_map_columns) 
-
-    with pd.ExcelWriter(path) as writer:
-        master_sheet.to_excel(writer, sheet_name=master_name, index=False)
-        regions_maps_sheet.to_excel(writer, sheet_name=reg_map_name, index=False)
+    regions = instance.indices.get_labels(MI['r'])
+    sheets = {
+        master_name: [master_columns],
+        reg_map_name: [reg_map_columns] + [[region]*len(reg_map_columns) for region in regions],
+    }
+    lists = get_lists(instance,regions+list(reg_map_columns))
 
-    # add data validation...
+    write_workbook(path,sheets,lists,{master_name:get_master_validations(master_columns)})
 
 def get_fiona_inventory_templates(
+        instance,
         new_sheets,
-        units,
         inv_columns,
         overwrite,
         path
     ):
 
-    inventory_sheet = pd.DataFrame(columns=inv_columns)
-    units_sheet = pd.DataFrame()
-    for item,unit in units.items():
-
-        unit_index = pd.MultiIndex.from_arrays([[item for i in range(unit.shape[0])],list(unit.index)])
-        unit.index = unit_index
-        units_sheet = pd.concat([units_sheet,unit],axis=0)
-    
-    if overwrite:
-        mode = 'replace'
-    else:
-        mode = 'error'
-
-    with pd.ExcelWriter(path, mode='a', engine='openpyxl', if_sheet_exists=mode) as writer:
-        for sheet in new_sheets:
-            inventory_sheet.to_excel(writer, sheet_name=sheet, index=False)
-        units_sheet.to_excel(writer, sheet_name='DB units',merge_cells=False)
-    
+    regions = instance.indices.get_labels(MI['r']) + list(getattr(instance,'regions_maps',{}).keys())
+    lists = get_lists(instance,regions,getattr(instance,'new_commodities',None))
 
-    # add data validation...
+    sheets = {sheet:[inv_columns] for sheet in dict.fromkeys(new_sheets)}
+    sheets[_UNITS_SHEET_NAME] = get_units_rows(instance.sut.units)
+    validations = {sheet:get_inventory_validations(inv_columns) for sheet in sheets if sheet != _UNITS_SHEET_NAME}
 
+    if not os.path.isfile(path):
+        write_workbook(path,sheets,lists,validations)
+    else:
+        replace = list(sheets) if overwrite else [_UNITS_SHEET_NAME]
+        update_workbook(path,sheets,replace,lists,validations)
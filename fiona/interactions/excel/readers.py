@@ -1,38 +1,150 @@
+import os
+from collections.abc import Mapping
+
 import pandas as pd
-import pint
 from mario.tools.constants import _MASTER_INDEX as MI
+from fiona.core.units import get_unit_service
+from fiona.core.variants import hash_inventory
+from fiona.interactions.excel.workbook import get_sheet_names,read_sheets
+from fiona.interactions.validation import validate_master_sheet,validate_region_maps,validate_inventories,raise_if_errors,concat_errors
 
 def read_fiona_master_template(instance,path,master_name,reg_map_name):
     
-    master_file = pd.read_excel(path,sheet_name=None,header=0)
+    master_file = read_sheets(path,[master_name,reg_map_name],cache=True)
     master_sheet = master_file[master_name]
 
     regions_maps = {k:master_file[reg_map_name][k].dropna().to_list() for k in master_file[reg_map_name].columns}
 
-    check_for_errors_in_region_maps(instance,regions_maps)
-    check_for_errors_in_master_sheet(instance,master_sheet,regions_maps)
+    errors = concat_errors([
+        validate_region_maps(instance,regions_maps,reg_map_name),
+        validate_master_sheet(instance,master_sheet,regions_maps,master_name),
+        ])
+    raise_if_errors("Master excel file",errors)
 
     return master_sheet, regions_maps
 
-def read_fiona_inventory_templates(instance,path,check):
-
-    inventories = pd.read_excel(path,sheet_name=None,header=0,)
-    keys = list(inventories.keys())
-
-    for i in keys:
-        if i not in instance.master_sheet['Sheet name'].unique():
-            del inventories[i] # drop all sheets that don't contain inventory data
-        elif instance.master_sheet.query(f"`Sheet name`==@i")['Leave empty'].values[0] == True:
-            del inventories[i] # drop all inventories to be left empty
-        # else:
-        #     inventories[instance.master_sheet.query(f'`Sheet name` == "{i}"')[MI['a']].values[0]] = inventories.pop(i) # rename key from sheet to activity name   
+class LazyInventories(Mapping):
+
+    def __init__(
+            self,
+            path:str,
+            sheets_by_activity:dict,
+    ):
+        """
+        Inventories of a workbook, parsed only when the inventory of an activity is requested.
+
+        Sheets are not cached: each request parses the sheets of the activity again, so that they are released
+        as soon as the caller is done with them. Only a fingerprint of each parsed sheet is kept, to compute the
+        signatures of the activities without parsing them again. Each process opens the workbook once, in read-only mode.
+
+        Args:
+            path (str): The path to the workbook.
+            sheets_by_activity (dict): The inventory sheets of each activity, as {activity: list of sheet names}.
+
+        Attributes:
+            path (str): The path to the workbook.
+            sheets_by_activity (dict): The inventory sheets of each activity.
+            hashes (dict): The fingerprints of the sheets parsed so far, as {sheet name: bytes}.
+        """
+        self.path = path
+        self.sheets_by_activity = sheets_by_activity
+        self.hashes = {}
+        self._excel = None
+        self._pid = None
+
+    def __getitem__(self,activity:str)->dict:
+        inventories = {}
+        for sheet_name in self.sheets_by_activity[activity]:
+            inventory = self.parse_sheet(sheet_name)
+            self.hashes[sheet_name] = hash_inventory(inventory)
+            inventories[sheet_name] = inventory
+        return inventories
+
+    def __iter__(self):
+        return iter(self.sheets_by_activity)
+
+    def __len__(self)->int:
+        return len(self.sheets_by_activity)
+
+    def __contains__(self,activity)->bool:
+        return activity in self.sheets_by_activity
+
+    def parse_sheet(
+            self,
+            sheet_name:str,
+    )->pd.DataFrame:
+        return self.excel.parse(sheet_name=sheet_name,header=0)
+
+    @property
+    def excel(self)->pd.ExcelFile:
+        if self._excel is None or self._pid != os.getpid(): # file handles are not shared with worker processes
+            self._excel = pd.ExcelFile(self.path,engine='openpyxl')
+            self._pid = os.getpid()
+        return self._excel
+
+    def get_hashes(
+            self,
+            activity:str,
+    )->dict:
+        """
+        Returns the fingerprints of the inventory sheets of an activity, parsing only the sheets never parsed before.
+
+        Args:
+            activity (str): The activity.
+
+        Returns:
+            dict: The fingerprints, as {sheet name: bytes}, empty if the activity has no inventory.
+        """
+        sheet_names = self.sheets_by_activity.get(activity,[])
+        if any(sheet_name not in self.hashes for sheet_name in sheet_names):
+            self[activity]
+        return {sheet_name:self.hashes[sheet_name] for sheet_name in sheet_names}
+
+    def close(self):
+        """
+        Closes the workbook, which is opened again at the next request.
+        """
+        if self._excel is not None and self._pid == os.getpid():
+            self._excel.close()
+        self._excel = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_excel'] = None
+        return state
+
+
+def read_fiona_inventory_templates(instance,path,check,lazy=False):
+
+    keys = []
+    for i in get_sheet_names(path):
+        if i not in instance.master_index.by_sheet:
+            continue # skip all sheets that don't contain inventory data
+        elif instance.master_index.get_sheet(i)['Leave empty']:
+            continue # skip all inventories to be left empty
+        keys.append(i)
+
+    if lazy:
+        sheets_by_activity = {}
+        for k in keys:
+            sheets_by_activity.setdefault(instance.master_index.get_sheet(k)[MI['a']],[]).append(k)
+        inventories = LazyInventories(path,sheets_by_activity)
+
+        if check: # sheets are checked one activity at a time, so that they are not kept in memory
+            errors = [validate_inventories(instance,inventories[activity],instance.regions_maps) for activity in inventories]
+            if len(errors) > 0:
+                raise_if_errors("Inventory sheets",concat_errors(errors))
+
+        return inventories
+
+    inventories = read_sheets(path,keys) # only the needed sheets are parsed
 
     if check:
         check_for_errors_in_inventories(instance,inventories,instance.regions_maps)
 
     inventories_by_act = {}
     for k,v in inventories.items():
-        activity = instance.master_sheet.query(f'`Sheet name` == "{k}"')[MI['a']].values[0]
+        activity = instance.master_index.get_sheet(k)[MI['a']]
         if activity in inventories_by_act.keys():
             inventories_by_act[activity][k] = v
         else:
@@ -42,217 +154,23 @@ def read_fiona_inventory_templates(instance,path,check):
 
 
 def check_for_errors_in_master_sheet(instance,master_sheet,regions_maps):
-
-    if master_sheet.empty: # check if master sheet is empty
-        raise ValueError("Master sheet is empty. Please fill it")
-
-    # check if all regions in master sheet are allowed
-    allowed_regions = instance.sut.get_index(MI['r'])
-    for k in regions_maps.keys():
-        allowed_regions += [k]
-    err_msg = []
-    for region in master_sheet[MI['r']].unique():
-        if region not in allowed_regions:
-            err_msg.append(region)
-    if err_msg != []:
-        raise ValueError(f"Error in Master excel sheet | Not allowed regions found: {err_msg}")
-
-    # check if any FU quantity is not provided
-    if master_sheet['FU quantity'].isnull().values.any():
-        raise ValueError("Error in Master excel sheet | Some FU quantities are missing")
-    # check if FU quantities provided are float or int
-    err_msg = []
-    for i in master_sheet['FU quantity']:
-        if not pd.isna(i):
-            if not isinstance(i,(float,int)):
-                err_msg.append(i)
-    if err_msg != []:
-        raise ValueError(f"Error in Master excel sheet | Some FU quantities are not numerical values: {err_msg}")
-
-    # check if all FU quantities are float or int
-    if not master_sheet['FU quantity'].apply(lambda x: isinstance(x,(float,int))).all():
-        raise ValueError("Error in Master excel sheet | Some FU quantities are not provided as numerical values")
-
-    # check if any FU unit is not provided
-    if master_sheet['FU unit'].isnull().values.any():
-        raise ValueError("Error in Master excel sheet | Some FU units are missing")
-
-    # check if market shares provided are float or int
-    err_msg = []
-    for i in master_sheet['Market share']:
-        if not pd.isna(i):
-            if not isinstance(i,(float,int)):
-                err_msg.append(i)
-    if err_msg != []:
-        raise ValueError(f"Error in Master excel sheet | Some market shares are not provided as numerical values: {err_msg}")
-
-    # check if total outputs provided are float or int
-    err_msg = []
-    for i in master_sheet['Total output']:
-        if not pd.isna(i):
-            if not isinstance(i,(float,int)):
-                err_msg.append(i)
-    if err_msg != []:
-        raise ValueError(f"Error in Master excel sheet | Some Total outputs are not provided as numerical values: {err_msg}")
-    
-    # check if all consumption categories in master sheet are allowed
-    err_msg = []
-    for i in master_sheet.index:
-        if not pd.isna(master_sheet.loc[i,'Total output']):
-            if master_sheet.loc[i,MI['n']] not in instance.sut.get_index(MI['n']):
-                err_msg.append(master_sheet.loc[i,MI['n']])
-    if err_msg != []:
-        raise ValueError(f"Error in Master excel sheet | Not allowed consumption categories found: {err_msg}")
-
-    # check if all parent activities in master sheet are allowed
-    err_msg = []
-    for i in master_sheet.index:
-        if not pd.isna(master_sheet.loc[i,f'Parent {MI["a"]}']):
-            if master_sheet.loc[i,f'Parent {MI["a"]}'] not in instance.sut.get_index(MI['a']):
-                err_msg.append(master_sheet.loc[i,f'Parent {MI["a"]}'])
-    if err_msg != []:
-        raise ValueError(f"Error in Master excel sheet | Not allowed parent activities found: {err_msg}")
-
-    # check if all sheet names are provided
-    if master_sheet['Sheet name'].isnull().values.any():
-        raise ValueError("Error in Master excel sheet | Missing sheet names for some activities")
-
-    # check if leave empty column is nan or true or false
-    err_msg = []
-    for i in master_sheet['Leave empty']:
-        if not pd.isna(i):
-            if i != True and i != False:
-                err_msg.append(i)
-    if err_msg != []:
-        raise ValueError(f"Error in Master excel sheet | Not acceptable values found for 'Leave empty': {err_msg}")
+    raise_if_errors("Master excel sheet",validate_master_sheet(instance,master_sheet,regions_maps))
 
 def check_for_errors_in_region_maps(instance,regions_maps):
-
-    # check if all cluster names are not repeating any region name
-    err_msg = []
-    for k in regions_maps.items():
-        if k in instance.sut.get_index(MI['r']):
-            err_msg.append(k)
-    err_msg = list(set(err_msg))
-    if err_msg != []:
-        raise ValueError(f"Error in Region maps | Cluster name not allowed: {err_msg}")
-
-    allowed_regions = instance.sut.get_index(MI['r'])
-    # check if all regions in each regions cluster are allowed
-    err_msg = {}
-    for k,v in regions_maps.items():
-        err_msg[k] = []
-        for region in v:
-            if region not in allowed_regions:
-                err_msg[k] += [region]
-    if any([err_msg[k] != [] for k in err_msg.keys()]):
-        raise ValueError(f"Error in Region maps | Not allowed regions found: {err_msg}")
+    raise_if_errors("Region maps",validate_region_maps(instance,regions_maps))
 
 def check_for_errors_in_inventories(instance,inventories,regions_maps):
-
-    for inventory,df in inventories.items():
-        if df.empty:
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Empty sheet")
-    
-        # check if any quantity is left empty
-        if df['Quantity'].isnull().values.any():
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Some quantities are missing")
-    
-        # check if any unit is left empty
-        if df['Unit'].isnull().values.any():
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Some units are missing")
-    
-        # check whether any element of the 'Item' column is not in [MI['c'],MI['f'],MI['k']]
-        err_msg = []
-        for i in df['Item']:
-            if i not in [MI['c'],MI['f'],MI['k']]:
-                err_msg.append(i)
-        err_msg = list(set(err_msg))
-        if err_msg != []:
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Not allowed items found: {err_msg}")
-        
-        # check whether any element of the 'DB Item' column is not in instance.sut.get_index(MI['c'])   
-        err_msg = []
-        item = MI['c']
-        for i in df.query(f"Item=='{item}'")['DB Item']:
-            if i not in instance.sut.get_index(MI['c']):
-                err_msg.append(i)
-        err_msg = list(set(err_msg))
-        if err_msg != []:
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Not allowed commodities found: {err_msg}")
-    
-        # check whether any element of the 'DB Item' column is not in instance.sut.get_index(MI['f'])
-        err_msg = []
-        item = MI['f']
-        for i in df.query(f"Item=='{item}'")['DB Item']:
-            if i not in instance.sut.get_index(MI['f']):
-                err_msg.append(i)
-        err_msg = list(set(err_msg))
-        if err_msg != []:
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Not allowed activities found: {err_msg}")
-        
-        # check whether any element of the 'DB Item' column is not in instance.sut.get_index(MI['k'])
-        err_msg = []
-        item = MI['k']
-        for i in df.query(f"Item=='{item}'")['DB Item']:
-            if i not in instance.sut.get_index(MI['k']):
-                err_msg.append(i)
-        err_msg = list(set(err_msg))
-        if err_msg != []:
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Not allowed consumption categories found: {err_msg}")
-        
-        # check whether any element of the 'DB Region' column is not allowed
-        allowed_regions = instance.sut.get_index(MI['r'])
-        for k in regions_maps.keys():
-            allowed_regions += [k]
-        item = MI['c']
-        err_msg = []
-        for i in df.query(f"Item=='{item}'")['DB Region']:
-            if i not in allowed_regions:
-                err_msg.append(i)
-        err_msg = list(set(err_msg))
-        if err_msg != []:
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Not allowed regions found: {err_msg}")
-
-        # check whether any element of the 'Type' column is not in ['Update','Percentage','Absolute']
-        err_msg = []
-        for i in df['Type']:
-            if i not in ['Update','Percentage','Absolute']:
-                err_msg.append(i)
-        err_msg = list(set(err_msg))
-        if err_msg != []:
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Not allowed types found: {err_msg}")
-        
-        # check for errors in unit of measures
-        err_msg = []
-        for i in df.index:
-            unit = df.loc[i,'Unit']
-            item = df.loc[i,'Item']
-            input = df.loc[i,'Input']
-            db_item = df.loc[i,'DB Item']
-            db_unit = instance.sut.units[item].loc[db_item,'unit']
-
-            msg = check_unit_of_measure(input,unit,db_unit)
-            if msg is not None:
-                err_msg += [msg]
-
-        err_msg = list(set(err_msg))
-        if err_msg != []:
-            raise ValueError(f"Error in Inventory sheet for {inventory} | Non convertible units found: {err_msg}")
+    raise_if_errors("Inventory sheets",validate_inventories(instance,inventories,regions_maps))
 
 def check_unit_of_measure(input,unit,db_unit):
 
-    ureg = pint.UnitRegistry()
-
     if unit == db_unit:
         return
     
-    try:
-        if ureg(unit).is_compatible_with(db_unit):
-            return
-        else:
-            msg = f"'{input}' from {unit} to {db_unit}"
-            return msg
-    except:
+    factor,compatible,defined = get_unit_service().conversion(unit,db_unit)
+    if not defined:
         msg = f"{unit} unit provided for '{input}' is not acceptable by pint"
+        return msg
+    if not compatible:
+        msg = f"'{input}' from {unit} to {db_unit}"
         return msg
\ No newline at end of file
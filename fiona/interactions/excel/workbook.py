@@ -0,0 +1,104 @@
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+_MAX_WORKBOOKS = 8
+_WORKBOOKS = OrderedDict() # least recently used first
+
+
+def get_workbook_key(path:str)->tuple:
+    """
+    Returns the key identifying the current version of a workbook on disk.
+
+    Args:
+        path (str): The path to the workbook.
+
+    Returns:
+        tuple: (absolute path, modification time, size).
+    """
+    stat = os.stat(path)
+    return (os.path.abspath(path),stat.st_mtime_ns,stat.st_size)
+
+
+def get_cached_workbook(path:str)->dict:
+    key = get_workbook_key(path)
+    workbook = _WORKBOOKS.pop(key[0],None)
+    if workbook is None or workbook['key'] != key:
+        workbook = {'key':key,'sheet_names':None,'sheets':{}} # a changed workbook replaces the cached one
+    _WORKBOOKS[key[0]] = workbook
+    while len(_WORKBOOKS) > _MAX_WORKBOOKS:
+        _WORKBOOKS.popitem(last=False)
+    return workbook
+
+
+def get_sheet_names(path:str)->list:
+    """
+    Returns the names of the sheets of a workbook, without parsing them.
+
+    Args:
+        path (str): The path to the workbook.
+
+    Returns:
+        list: The sheet names.
+    """
+    workbook = get_cached_workbook(path)
+    if workbook['sheet_names'] is None:
+        with pd.ExcelFile(path,engine='openpyxl') as excel:
+            workbook['sheet_names'] = excel.sheet_names
+    return list(workbook['sheet_names'])
+
+
+def read_sheets(
+        path:str,
+        sheet_names:list,
+        cache:bool = False,
+)->dict:
+    """
+    Reads some sheets of a workbook, opening it once in read-only mode.
+
+    Sheets read with cache=True (e.g. the master sheet and the regions maps, read both by read_master_file and by
+    read_inventories) are kept for the last workbooks read and parsed at most once for each version of the file:
+    copies are returned, so callers can modify them freely. Other sheets (e.g. the inventories) are returned as
+    parsed, without being held by the cache.
+
+    Args:
+        path (str): The path to the workbook.
+        sheet_names (list): The names of the sheets to read.
+        cache (bool, optional): Whether the parsed sheets are cached. Defaults to False.
+
+    Raises:
+        KeyError: If any sheet is not in the workbook.
+
+    Returns:
+        dict: The sheets, as {sheet name: pd.DataFrame}.
+    """
+    workbook = get_cached_workbook(path)
+    sheets = {sheet:workbook['sheets'][sheet].copy() for sheet in sheet_names if sheet in workbook['sheets']}
+    missing = [sheet for sheet in sheet_names if sheet not in sheets]
+
+    if len(missing) > 0:
+        with pd.ExcelFile(path,engine='openpyxl') as excel:
+            workbook['sheet_names'] = excel.sheet_names
+            not_found = [sheet for sheet in missing if sheet not in excel.sheet_names]
+            if len(not_found) > 0:
+                raise KeyError(f"Sheets {not_found} not found in {path}")
+            for sheet in missing:
+                sheets[sheet] = excel.parse(sheet_name=sheet,header=0)
+                if cache:
+                    workbook['sheets'][sheet] = sheets[sheet].copy()
+
+    return {sheet:sheets[sheet] for sheet in sheet_names}
+
+
+def clear_workbook_cache(path:str = None):
+    """
+    Drops the parsed sheets of a workbook, or of all workbooks, from the cache.
+
+    Args:
+        path (str, optional): The path to the workbook. Defaults to None (all workbooks).
+    """
+    if path is None:
+        _WORKBOOKS.clear()
+    else:
+        _WORKBOOKS.pop(os.path.abspath(path),None)
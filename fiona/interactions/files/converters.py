@@ -0,0 +1,71 @@
+import os
+
+import pandas as pd
+from fiona.interactions.excel.workbook import get_sheet_names,read_sheets
+from fiona.interactions.files.readers import _FILE_EXTENSIONS,_SHEET_COLUMN
+from fiona.rules import _MASTER_SHEET_NAME as MS_name
+from fiona.rules import _REGIONS_MAPS_SHEET_NAME as RMS_name
+from fiona.rules import _INVENTORY_SHEET_COLUMNS as InvS_cols
+
+_INVENTORIES_FILE_NAME = 'Inventories'
+
+
+def convert_master_workbook(
+        workbook_path:str,
+        output_dir:str,
+        file_format:str = 'parquet',
+        long_format:bool = False,
+)->dict:
+    """
+    Converts a master workbook (master sheet, regions map and inventory sheets) into Parquet or CSV files.
+
+    The master sheet and the regions map are written as '<sheet name>.<format>' files. Inventory sheets referred to
+    by the master sheet are written one file per sheet, or in one long-format file with a 'Sheet name' column.
+    Other sheets (e.g. 'DB units') are not converted.
+
+    Args:
+        workbook_path (str): The path to the master workbook.
+        output_dir (str): The directory where the files are written, created if missing.
+        file_format (str, optional): 'parquet' or 'csv'. Defaults to 'parquet'.
+        long_format (bool, optional): Whether to write all the inventories in one 'Inventories.<format>' file. Defaults to False.
+
+    Raises:
+        ValueError: If the file format is not acceptable, or if a sheet name cannot be used as a file name.
+
+    Returns:
+        dict: The paths to be given to DB_builder, as {'master': directory, 'inventories': directory or long-format file}.
+    """
+    extension = f".{file_format}"
+    if extension not in _FILE_EXTENSIONS:
+        raise ValueError(f"File format {file_format} not in {[e[1:] for e in _FILE_EXTENSIONS]}")
+    os.makedirs(output_dir,exist_ok=True)
+
+    master_sheet = read_sheets(workbook_path,[MS_name,RMS_name],cache=True)[MS_name]
+    inventory_sheets = [sheet for sheet in dict.fromkeys(master_sheet['Sheet name'].dropna()) if sheet in get_sheet_names(workbook_path)]
+    sheets = read_sheets(workbook_path,[MS_name,RMS_name]+inventory_sheets)
+
+    def write(table,name):
+        if os.sep in name or (os.altsep is not None and os.altsep in name):
+            raise ValueError(f"Sheet name {name} cannot be used as a file name")
+        path = os.path.join(output_dir,f"{name}{extension}")
+        if file_format == 'parquet':
+            table.to_parquet(path,index=False)
+        else:
+            table.to_csv(path,index=False)
+        return path
+
+    write(sheets[MS_name],MS_name)
+    write(sheets[RMS_name],RMS_name)
+
+    if not long_format:
+        for sheet in inventory_sheets:
+            write(sheets[sheet],sheet)
+        return {'master':output_dir,'inventories':output_dir}
+
+    frames = {sheet:sheets[sheet].reindex(columns=list(dict.fromkeys(InvS_cols+list(sheets[sheet].columns)))) for sheet in inventory_sheets}
+    if len(frames) > 0:
+        inventories = pd.concat(frames,names=[_SHEET_COLUMN,None]).reset_index(level=0).reset_index(drop=True)
+    else:
+        inventories = pd.DataFrame(columns=[_SHEET_COLUMN]+InvS_cols)
+    path = write(inventories,_INVENTORIES_FILE_NAME)
+    return {'master':output_dir,'inventories':path}
@@ -0,0 +1,182 @@
+import os
+
+import pandas as pd
+from mario.tools.constants import _MASTER_INDEX as MI
+from fiona.interactions.excel.readers import LazyInventories
+from fiona.interactions.validation import validate_master_sheet,validate_region_maps,validate_inventories,raise_if_errors,concat_errors
+
+_FILE_EXTENSIONS = ['.parquet','.csv']
+_WORKBOOK_EXTENSIONS = ['.xlsx','.xlsm','.xls']
+_SHEET_COLUMN = 'Sheet name' # column of the sheet names in long-format inventory files
+
+
+def is_workbook(path:str)->bool:
+    """
+    Returns whether a master or inventories path is an Excel workbook, rather than a directory or a long-format file.
+
+    Args:
+        path (str): The path.
+
+    Returns:
+        bool: True if the path has an Excel extension.
+    """
+    return os.path.splitext(str(path))[1].lower() in _WORKBOOK_EXTENSIONS
+
+
+def read_table(
+        path:str,
+        columns:list = None,
+        filters:list = None,
+)->pd.DataFrame:
+    """
+    Reads a Parquet or CSV file.
+
+    Args:
+        path (str): The path of the file.
+        columns (list, optional): The columns to be read. Defaults to None (all columns).
+        filters (list, optional): Row filters, as a list of (column, operator, value) tuples. Applied while reading
+            Parquet files (skipping the row groups that do not match) and after reading CSV files. Defaults to None.
+
+    Raises:
+        ValueError: If the extension of the file is not supported.
+
+    Returns:
+        pd.DataFrame: The table.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        return pd.read_parquet(path,columns=columns,filters=filters)
+    if extension == '.csv':
+        table = pd.read_csv(path,usecols=columns)
+        for column,op,value in filters or []:
+            if op not in ['==','=']:
+                raise ValueError(f"Filter operator {op} not supported for csv files")
+            table = table[table[column] == value]
+        return table
+    raise ValueError(f"File {path} not supported. Acceptable extensions: {_FILE_EXTENSIONS}")
+
+
+def get_table_path(
+        directory:str,
+        name:str,
+)->str:
+    """
+    Returns the path of the file of a sheet in a directory of Parquet or CSV files.
+
+    Args:
+        directory (str): The directory.
+        name (str): The sheet name, i.e. the file name without extension.
+
+    Raises:
+        FileNotFoundError: If no file of the sheet is in the directory.
+
+    Returns:
+        str: The path of the file, Parquet files being preferred over CSV ones.
+    """
+    for extension in _FILE_EXTENSIONS:
+        path = os.path.join(directory,f"{name}{extension}")
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"No {' or '.join(_FILE_EXTENSIONS)} file for sheet {name} in {directory}")
+
+
+def get_table_names(directory:str)->list:
+    """
+    Returns the sheet names of the Parquet and CSV files of a directory.
+
+    Args:
+        directory (str): The directory.
+
+    Returns:
+        list: The sheet names, sorted.
+    """
+    names = set()
+    for file_name in os.listdir(directory):
+        name,extension = os.path.splitext(file_name)
+        if extension.lower() in _FILE_EXTENSIONS:
+            names.add(name)
+    return sorted(names)
+
+
+class FileInventories(LazyInventories):
+
+    def __init__(
+            self,
+            path:str,
+            sheets_by_activity:dict,
+    ):
+        """
+        Inventories of a directory of Parquet or CSV files (one file per sheet) or of a long-format file
+        (all sheets in one table, with a 'Sheet name' column), parsed only when the inventory of an activity is requested.
+
+        Args:
+            path (str): The directory or the long-format file.
+            sheets_by_activity (dict): The inventory sheets of each activity, as {activity: list of sheet names}.
+        """
+        super().__init__(path,sheets_by_activity)
+
+    def parse_sheet(
+            self,
+            sheet_name:str,
+    )->pd.DataFrame:
+        if os.path.isdir(self.path):
+            return read_table(get_table_path(self.path,sheet_name))
+        inventory = read_table(self.path,filters=[(_SHEET_COLUMN,'==',sheet_name)])
+        return inventory.drop(columns=_SHEET_COLUMN).reset_index(drop=True)
+
+    def get_all(self)->dict:
+        """
+        Parses all the inventories at once, reading a long-format file only once.
+
+        Returns:
+            dict: The inventories, as {activity: {sheet name: pd.DataFrame}}.
+        """
+        if os.path.isdir(self.path):
+            return {activity:self[activity] for activity in self}
+
+        table = read_table(self.path)
+        sheets = {sheet_name:inventory.drop(columns=_SHEET_COLUMN).reset_index(drop=True) for sheet_name,inventory in table.groupby(_SHEET_COLUMN,sort=False)}
+        return {activity:{sheet_name:sheets[sheet_name] for sheet_name in sheet_names} for activity,sheet_names in self.sheets_by_activity.items()}
+
+
+def read_fiona_master_files(instance,path,master_name,reg_map_name):
+
+    master_sheet = read_table(get_table_path(path,master_name))
+    regions_map = read_table(get_table_path(path,reg_map_name))
+
+    regions_maps = {k:regions_map[k].dropna().to_list() for k in regions_map.columns}
+
+    errors = concat_errors([
+        validate_region_maps(instance,regions_maps,reg_map_name),
+        validate_master_sheet(instance,master_sheet,regions_maps,master_name),
+        ])
+    raise_if_errors("Master files",errors)
+
+    return master_sheet, regions_maps
+
+
+def read_fiona_inventory_files(instance,path,check,lazy=False):
+
+    if os.path.isdir(path):
+        sheet_names = get_table_names(path)
+    else:
+        sheet_names = list(read_table(path,columns=[_SHEET_COLUMN])[_SHEET_COLUMN].unique())
+
+    sheets_by_activity = {}
+    for i in sheet_names:
+        if i not in instance.master_index.by_sheet:
+            continue # skip all files that don't contain inventory data
+        elif instance.master_index.get_sheet(i)['Leave empty']:
+            continue # skip all inventories to be left empty
+        sheets_by_activity.setdefault(instance.master_index.get_sheet(i)[MI['a']],[]).append(i)
+
+    inventories = FileInventories(path,sheets_by_activity)
+    if not lazy:
+        inventories = inventories.get_all()
+
+    if check: # sheets are checked one activity at a time, so that lazy inventories are not kept in memory
+        errors = [validate_inventories(instance,inventories[activity],instance.regions_maps) for activity in inventories]
+        if len(errors) > 0:
+            raise_if_errors("Inventory files",concat_errors(errors))
+
+    return inventories
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+from mario.tools.constants import _MASTER_INDEX as MI
+from fiona.core.units import get_unit_service
+from fiona.rules import _INVENTORY_SHEET_COLUMNS as InvS_cols
+from fiona.rules import _MASTER_SHEET_COLUMNS as MS_cols
+
+_ERRORS_COLUMNS = ['Sheet name','Row','Column','Value','Error']
+_INVENTORY_ITEMS = [MI['c'],MI['f'],MI['k']]
+_INVENTORY_TYPES = ['Update','Percentage','Absolute']
+
+
+class ValidationError(ValueError):
+
+    def __init__(
+            self,
+            context:str,
+            errors:pd.DataFrame,
+    ):
+        """
+        Error raised when master or inventory sheets contain errors.
+
+        Args:
+            context (str): What was validated (e.g. 'Master excel sheet').
+            errors (pd.DataFrame): The table of all the errors found, with _ERRORS_COLUMNS columns.
+        """
+        self.errors = errors
+        super().__init__(f"Error in {context} | {len(errors)} errors found:\n{errors.to_string(index=False)}")
+
+
+def raise_if_errors(
+        context:str,
+        errors:pd.DataFrame,
+):
+    if not errors.empty:
+        raise ValidationError(context,errors)
+
+
+def get_errors(
+        sheet_name,
+        rows,
+        column,
+        values,
+        error:str,
+)->pd.DataFrame:
+    """
+    Builds a table of errors.
+
+    Args:
+        sheet_name (str or array-like): The sheet names where the errors are.
+        rows (array-like): The excel rows (header is row 1) where the errors are.
+        column (str): The column where the errors are.
+        values (array-like): The wrong values.
+        error (str): The description of the error.
+
+    Returns:
+        pd.DataFrame: The table of errors.
+    """
+    values = list(values)
+    return pd.DataFrame({
+        'Sheet name': sheet_name if not np.isscalar(sheet_name) else [sheet_name]*len(values),
+        'Row': list(rows),
+        'Column': [column]*len(values),
+        'Value': values,
+        'Error': [error]*len(values),
+    },columns=_ERRORS_COLUMNS)
+
+
+def concat_errors(
+        errors:list,
+)->pd.DataFrame:
+    errors = pd.concat(errors,ignore_index=True)
+    errors['Row'] = errors['Row'].astype('Int64')
+    return errors
+
+
+def stack_inventories(
+        inventories:dict,
+)->pd.DataFrame:
+    """
+    Concatenates all the inventory sheets in one frame with 'Sheet name' and 'Row' columns.
+
+    Args:
+        inventories (dict): The inventories, as {sheet name: pd.DataFrame}.
+
+    Returns:
+        pd.DataFrame: The stacked inventories.
+    """
+    frames = {k:v.reset_index(drop=True) for k,v in inventories.items() if not v.empty}
+    if len(frames) == 0:
+        return pd.DataFrame(columns=['Sheet name','Row']+InvS_cols)
+
+    stacked = pd.concat(frames,names=['Sheet name','Row']).reset_index()
+    stacked['Row'] += 2 # header is row 1 in the excel sheet
+    return stacked.reindex(columns=list(dict.fromkeys(['Sheet name','Row']+InvS_cols+list(stacked.columns))))
+
+
+def validate_region_maps(
+        instance,
+        regions_maps:dict,
+        sheet_name:str = 'Regions Map',
+)->pd.DataFrame:
+
+    errors = []
+    regions = instance.indices.get_set(MI['r'])
+
+    # check if all cluster names are not repeating any region name
+    clusters = pd.Series(list(regions_maps.keys()),dtype=object)
+    wrong = clusters[clusters.isin(regions)]
+    errors += [get_errors(sheet_name,[1]*len(wrong),'',wrong,'Cluster name not allowed: it is a region of the SUT')]
+
+    # check if all regions in each regions cluster are allowed
+    for cluster,members in regions_maps.items():
+        members = pd.Series(members,dtype=object)
+        wrong = members[~members.isin(regions)]
+        errors += [get_errors(sheet_name,wrong.index+2,cluster,wrong,'Not allowed region')]
+
+    return concat_errors(errors)
+
+
+def validate_master_sheet(
+        instance,
+        master_sheet:pd.DataFrame,
+        regions_maps:dict,
+        sheet_name:str = 'Master',
+)->pd.DataFrame:
+
+    if master_sheet.empty: # check if master sheet is empty
+        return concat_errors([get_errors(sheet_name,[np.nan],'',[np.nan],'Master sheet is empty. Please fill it')])
+
+    master_sheet = master_sheet.reindex(columns=list(dict.fromkeys(MS_cols+list(master_sheet.columns))))
+    rows = master_sheet.index + 2
+    errors = []
+
+    def add(mask,column,error):
+        errors.append(get_errors(sheet_name,rows[mask],column,master_sheet.loc[mask,column],error))
+
+    def is_numerical(column):
+        return master_sheet[column].map(lambda x: isinstance(x,(float,int,np.number)))
+
+    # check if all regions in master sheet are allowed
+    allowed_regions = instance.indices.get_set(MI['r']) | set(regions_maps.keys())
+    add(~master_sheet[MI['r']].isin(allowed_regions),MI['r'],'Not allowed region')
+
+    # check FU quantities, FU units, market shares and total outputs
+    add(master_sheet['FU quantity'].isnull(),'FU quantity','Missing FU quantity')
+    add(master_sheet['FU quantity'].notnull() & ~is_numerical('FU quantity'),'FU quantity','Not numerical value')
+    add(master_sheet['FU unit'].isnull(),'FU unit','Missing FU unit')
+    add(master_sheet['Market share'].notnull() & ~is_numerical('Market share'),'Market share','Not numerical value')
+    add(master_sheet['Total output'].notnull() & ~is_numerical('Total output'),'Total output','Not numerical value')
+
+    # check if all consumption categories in master sheet are allowed
+    add(master_sheet['Total output'].notnull() & ~master_sheet[MI['n']].isin(instance.indices.get_set(MI['n'])),MI['n'],'Not allowed consumption category')
+
+    # check if all parent activities in master sheet are allowed
+    parent = f'Parent {MI["a"]}'
+    add(master_sheet[parent].notnull() & ~master_sheet[parent].isin(instance.indices.get_set(MI['a'])),parent,'Not allowed parent activity')
+
+    # check if all sheet names are provided
+    add(master_sheet['Sheet name'].isnull(),'Sheet name','Missing sheet name')
+
+    # check if leave empty column is nan or true or false
+    leave_empty = master_sheet['Leave empty']
+    add(leave_empty.notnull() & ~leave_empty.map(lambda x: x == True or x == False),'Leave empty','Not acceptable value, must be boolean or left empty')
+
+    return concat_errors(errors)
+
+
+def validate_inventories(
+        instance,
+        inventories:dict,
+        regions_maps:dict,
+)->pd.DataFrame:
+
+    errors = []
+
+    # check for empty sheets
+    empty_sheets = [k for k,v in inventories.items() if v.empty]
+    errors += [get_errors(empty_sheets,[np.nan]*len(empty_sheets),'',[np.nan]*len(empty_sheets),'Empty sheet')]
+
+    stacked = stack_inventories(inventories)
+
+    def add(mask,column,error):
+        errors.append(get_errors(stacked.loc[mask,'Sheet name'].values,stacked.loc[mask,'Row'],column,stacked.loc[mask,column],error))
+
+    # check if any quantity or unit is left empty
+    add(stacked['Quantity'].isnull(),'Quantity','Missing quantity')
+    add(stacked['Unit'].isnull(),'Unit','Missing unit')
+
+    # check whether any element of the 'Item' column is not in [MI['c'],MI['f'],MI['k']]
+    add(~stacked['Item'].isin(_INVENTORY_ITEMS),'Item','Not allowed item')
+
+    # check whether any element of the 'DB Item' column is not in the corresponding set (new commodities are allowed)
+    is_commodity = stacked['Item'] == MI['c']
+    allowed_commodities = instance.indices.get_set(MI['c']) | set(getattr(instance,'new_commodities',[]))
+    add(is_commodity & ~stacked['DB Item'].isin(allowed_commodities),'DB Item','Not allowed commodity')
+    add((stacked['Item'] == MI['f']) & ~stacked['DB Item'].isin(instance.indices.get_set(MI['f'])),'DB Item','Not allowed factor of production')
+    add((stacked['Item'] == MI['k']) & ~stacked['DB Item'].isin(instance.indices.get_set(MI['k'])),'DB Item','Not allowed satellite account')
+
+    # check whether any element of the 'DB Region' column is not allowed
+    allowed_regions = instance.indices.get_set(MI['r']) | set(regions_maps.keys())
+    add(is_commodity & ~stacked[f"DB {MI['r']}"].isin(allowed_regions),f"DB {MI['r']}",'Not allowed region')
+
+    # check whether any element of the 'Type' column is not in ['Update','Percentage','Absolute']
+    add(~stacked['Type'].isin(_INVENTORY_TYPES),'Type','Not allowed type')
+
+    # check for errors in unit of measures, only where the database item is known
+    db_units = get_validation_units(instance)
+    keys = pd.MultiIndex.from_arrays([stacked['Item'].values,stacked['DB Item'].values])
+    stacked['DB unit'] = db_units.reindex(keys).values
+    known = stacked['DB unit'].notnull() & stacked['Unit'].notnull()
+    factors = get_unit_service().get_factors(stacked.loc[known,'Unit'],stacked.loc[known,'DB unit'])
+    add(known & ~factors['defined'].reindex(stacked.index,fill_value=True).astype(bool),'Unit','Unit not acceptable by pint')
+    add(known & factors['defined'].reindex(stacked.index,fill_value=False).astype(bool) & ~factors['compatible'].reindex(stacked.index,fill_value=True).astype(bool),'Unit','Unit not convertible to the unit of the DB Item')
+
+    return concat_errors(errors)
+
+
+def get_validation_units(
+        instance,
+)->pd.Series:
+    """
+    Returns the units of all the items an inventory can refer to, including the new commodities of the master sheet.
+
+    Args:
+        instance (DB_builder): The DB_builder object.
+
+    Returns:
+        pd.Series: The units, indexed by (item, DB item).
+    """
+    units = {item:instance.sut.units[item]['unit'] for item in _INVENTORY_ITEMS}
+    if hasattr(instance,'master_sheet'):
+        new_commodities = instance.master_sheet.drop_duplicates(MI['c']).set_index(MI['c'])['FU unit']
+        units[MI['c']] = pd.concat([units[MI['c']],new_commodities[~new_commodities.index.isin(units[MI['c']].index)]])
+    units = pd.concat(units)
+    return units[~units.index.duplicated(keep='first')]
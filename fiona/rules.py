@@ -1,3 +1,4 @@
+import os
 import logging
 from mario.tools.constants import _MASTER_INDEX as MI
 
@@ -7,6 +8,10 @@ def setup_logger(name):
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
 
+    # the handler is added only once, loggers are shared by name
+    if logger.handlers:
+        return logger
+
     # Create a console handler
     handler = logging.StreamHandler()
     handler.setLevel(logging.INFO)
@@ -59,9 +64,16 @@ _INVENTORY_SHEET_COLUMNS = [ # if change order, change also data validation
 
 _REGIONS_MAPS_SHEET_COLUMNS = ['GLOBAL']
 
+_FIONA_DATABASE_PATH = os.path.join(os.path.expanduser('~'),'.fiona','inventories.db')
+
 #%%
 _ACCEPTABLES = {
     'sut_modes': ['flows','coefficients'],
     'sut_formats': ['txt','xlsx','mario'],
-    'inventory_sources': ['FIONA','excel']
+    'inventory_sources': ['FIONA','excel','files'],
+    'matrix_backends': ['dense','sparse'],
+    'matrix_storages': ['memory','mmap'],
+    'assembly_modes': ['groupby','blocks'],
+    'variant_outputs': ['scenarios','databases',None],
+    'distributions': ['normal','lognormal','uniform','triangular'],
 }
\ No newline at end of file
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name='fiona',
     version='0.1',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks','tests']),
     author='Lorenzo Rinaldi',
     author_email='lorenzo.rinaldi@polimi.it',
     description='...',
@@ -0,0 +1,45 @@
+"""
+Fixtures shared by the tests: the conceptual test SUT and master workbook of the repository, and a small synthetic
+SUT and master workbook generated with benchmarks.generate.
+"""
+import os
+
+import pytest
+
+from benchmarks.generate import get_synthetic_sut,get_synthetic_master,write_master_workbook
+
+_CONCEPTUAL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'conceptual test')
+
+
+@pytest.fixture(scope='session')
+def conceptual_case()->dict:
+    return {
+        'sut_path': os.path.join(_CONCEPTUAL_DIR,'test_SUT.xlsx'),
+        'sut_mode': 'coefficients',
+        'sut_format': 'xlsx',
+        'master_file_path': os.path.join(_CONCEPTUAL_DIR,'master.xlsx'),
+    }
+
+
+@pytest.fixture(scope='session')
+def synthetic_case(tmp_path_factory)->dict:
+    directory = tmp_path_factory.mktemp('synthetic')
+    sut = get_synthetic_sut(regions=3,activities=8,commodities=8,satellites=2,seed=1)
+    master_path = str(directory/'master.xlsx')
+    write_master_workbook(master_path,*get_synthetic_master(sut,activities=6,seed=1))
+    os.makedirs(directory/'sut')
+    sut.to_txt(str(directory/'sut'),flows=True,coefficients=False)
+    return {
+        'sut_path': str(directory/'sut'/'flows'),
+        'sut_mode': 'flows',
+        'sut_format': 'txt',
+        'master_file_path': master_path,
+    }
+
+
+@pytest.fixture(params=['conceptual','synthetic'])
+def case(request)->dict:
+    """
+    The SUT and master workbook a test is run on, as the arguments of DB_builder.
+    """
+    return request.getfixturevalue(f'{request.param}_case')
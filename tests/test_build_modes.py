@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from fiona.core.add_inventories import Inventories
+from fiona.core.options import BuildOptions
+from tests.utils import assert_same_matrices,build,get_builder
+
+_OPTIONS = [
+    {'backend':'sparse'},
+    {'assembly':'blocks'},
+    {'storage':'mmap'},
+    {'backend':'sparse','storage':'mmap'},
+    {'workers':2},
+    {'memory_budget':1}, # every new matrix spilled to disk
+    {'memory_budget':2**30},
+]
+
+
+@pytest.mark.parametrize('options',_OPTIONS,ids=lambda options: ','.join(f'{k}={v}' for k,v in options.items()))
+def test_options_as_default_build(case,options):
+    assert_same_matrices(build(case,**options).sut.matrices['baseline'],build(case).sut.matrices['baseline'])
+
+
+def test_lazy_inventories_as_default_build(case):
+    builder = get_builder(case,lazy=True)
+    builder.add_inventories('excel')
+    assert_same_matrices(builder.sut.matrices['baseline'],build(case).sut.matrices['baseline'])
+
+
+def test_index_only_as_default_build(case):
+    builder = get_builder(case,index_only=True)
+    assert builder.is_index_only
+    builder.add_inventories('excel')
+    assert_same_matrices(builder.sut.matrices['baseline'],build(case).sut.matrices['baseline'])
+
+
+def test_cached_sut_as_default_build(case,tmp_path):
+    for _ in range(2): # parsed and stored, then loaded from the cache
+        builder = get_builder(case,cache_dir=str(tmp_path))
+        builder.add_inventories('excel')
+        assert_same_matrices(builder.sut.matrices['baseline'],build(case).sut.matrices['baseline'])
+
+
+@pytest.mark.parametrize('incremental',[False,True])
+def test_failed_budget_build_keeps_sut(case,incremental,monkeypatch):
+    builder = get_builder(case)
+    if incremental: # activities already added are reset in the base matrices before being filled again
+        builder.add_inventories('excel',incremental=True)
+        sheet = next(iter(builder.inventories[builder.new_activities[0]].values()))
+        sheet.loc[sheet.index[0],'Quantity'] *= 2
+    before = {name:matrix.copy() for name,matrix in builder.sut.matrices['baseline'].items()}
+
+    def fail(self):
+        raise RuntimeError('Failed while assembling the matrices')
+
+    monkeypatch.setattr(Inventories,'add_lowmem_slices',fail)
+    with pytest.raises(RuntimeError):
+        builder.add_inventories('excel',incremental=incremental,options=BuildOptions(memory_budget=2**30))
+
+    for name,matrix in before.items():
+        np.testing.assert_array_equal(builder.sut.matrices['baseline'][name].values,matrix.values,err_msg=name)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from benchmarks.generate import get_synthetic_sut,get_synthetic_master,write_master_workbook
+from fiona.core.cluster_shares import ClusterShares
+from fiona.core.db_builder import DB_builder
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+
+def test_cluster_input_without_base_use(tmp_path):
+    sut = get_synthetic_sut(regions=2,activities=6,commodities=6,density=0,seed=0) # each activity uses one commodity only
+    z = sut.matrices['baseline']['Z']
+    u = z.loc[z.index.get_level_values(1) == MI['c'],z.columns.get_level_values(1) == MI['a']]
+    uses = u.sum(axis=1).groupby(level=2).sum()
+    commodity = uses.index[uses == 0][0]
+
+    master_sheet,regions_map,inventories = get_synthetic_master(sut,activities=1,parented_share=0,new_commodity_share=1,seed=0)
+    master_sheet[MI['r']] = 'R0'
+    activity,inventory = next(iter(inventories.items()))
+    inventory = inventory[inventory['Item'] != MI['c']]
+    inventory.loc[-1] = {'Quantity':0.5,'Unit':sut.units[MI['c']].loc[commodity,'unit'],'Input':commodity,'Item':MI['c'],'DB Item':commodity,f"DB {MI['r']}":'GLOBAL','Type':'Update'}
+    master_path = str(tmp_path/'master.xlsx')
+    write_master_workbook(master_path,master_sheet,regions_map,{activity:inventory})
+
+    # no region of the cluster uses the commodity in the base SUT: its shares are 0/0
+    shares = ClusterShares(u,{'GLOBAL':['R0','R1']}).get_shares('GLOBAL',commodity,'R0')
+    assert shares.isna().all()
+
+    builder = DB_builder(sut_path=sut,sut_mode='flows',master_file_path=master_path,sut_format='mario',read_master_file=True)
+    builder.read_inventories(master_path)
+    builder.add_inventories('excel')
+
+    column = builder.sut.matrices['baseline']['z'].loc[:,('R0',MI['a'],activity)]
+    assert not column.isna().any()
+    assert column.loc[('R0',MI['c'],commodity)] == 0.5 # supplied from the target region
+    assert column.loc[('R1',MI['c'],commodity)] == 0
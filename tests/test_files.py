@@ -0,0 +1,17 @@
+import pytest
+
+from fiona.core.db_builder import DB_builder
+from fiona.interactions.files.converters import convert_master_workbook
+from tests.utils import assert_same_matrices,build
+
+
+@pytest.mark.parametrize('file_format',['parquet','csv'])
+@pytest.mark.parametrize('long_format',[False,True],ids=['directory','long'])
+@pytest.mark.parametrize('lazy',[False,True],ids=['eager','lazy'])
+def test_files_as_workbook(case,tmp_path,file_format,long_format,lazy):
+    paths = convert_master_workbook(case['master_file_path'],str(tmp_path),file_format,long_format)
+
+    builder = DB_builder(read_master_file=True,**{**case,'master_file_path':paths['master']})
+    builder.read_inventories(paths['inventories'],lazy=lazy)
+    builder.add_inventories('files')
+    assert_same_matrices(builder.sut.matrices['baseline'],build(case).sut.matrices['baseline'])
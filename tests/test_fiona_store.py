@@ -0,0 +1,40 @@
+import pandas as pd
+
+from fiona.rules import _MASTER_SHEET_NAME as MS_name
+from tests.utils import assert_same_matrices,get_builder
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+
+def write_renamed_master(
+        case:dict,
+        path:str,
+)->dict:
+    """
+    Writes a copy of the master workbook of a case whose activities are renamed but keep the same inventory
+    sheet names, with other quantities, and returns the case using it.
+    """
+    sheets = pd.read_excel(case['master_file_path'],sheet_name=None)
+    sheets[MS_name][MI['a']] = sheets[MS_name][MI['a']]+' B'
+    for name in sheets[MS_name]['Sheet name'].dropna().unique():
+        sheets[name]['Quantity'] = sheets[name]['Quantity']*2
+    with pd.ExcelWriter(path) as writer:
+        for name,sheet in sheets.items():
+            sheet.to_excel(writer,sheet_name=name,index=False)
+    return {**case,'master_file_path':path}
+
+
+def test_activities_with_same_sheet_names_round_trip(case,tmp_path):
+    fiona_path = str(tmp_path/'inventories.db')
+    renamed_case = write_renamed_master(case,str(tmp_path/'master_B.xlsx'))
+
+    built = {}
+    for name,test_case in [('A',case),('B',renamed_case)]:
+        builder = get_builder(test_case)
+        builder.add_inventories('excel',add_to_FIONA=True,fiona_path=fiona_path)
+        built[name] = builder
+
+    for name,test_case in [('A',case),('B',renamed_case)]:
+        builder = get_builder(test_case)
+        builder.add_inventories('FIONA',fiona_path=fiona_path)
+        assert_same_matrices(builder.sut.matrices['baseline'],built[name].sut.matrices['baseline'])
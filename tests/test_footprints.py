@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from tests.utils import build
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+
+def get_dense_footprints(
+        builder,
+)->pd.DataFrame:
+    z = builder.sut.matrices['baseline']['z']
+    e = builder.sut.matrices['baseline']['e']
+    w = np.linalg.inv(np.eye(z.shape[0])-np.nan_to_num(z.values))
+    footprints = pd.DataFrame(np.nan_to_num(e.values) @ w,index=e.index,columns=z.columns)
+    is_fiona = (z.columns.get_level_values(1) == MI['a']) & z.columns.get_level_values(2).isin(list(builder.fiona_activities))
+    return footprints.loc[:,is_fiona]
+
+
+def test_footprints_as_dense_inverse(case):
+    builder = build(case)
+    footprints = builder.get_footprints()
+    expected = get_dense_footprints(builder)
+    assert sorted(footprints.columns) == sorted(expected.columns)
+    np.testing.assert_allclose(footprints.loc[:,expected.columns].values,expected.values,rtol=1e-8,atol=1e-12)
+
+
+def test_footprints_by_region_sum_to_totals(case):
+    builder = build(case)
+    totals = builder.get_footprints()
+    by_region = builder.get_footprints(by_region=True).groupby(level=0).sum()
+    np.testing.assert_allclose(by_region.loc[totals.index,totals.columns].values,totals.values,rtol=1e-8,atol=1e-12)
@@ -0,0 +1,36 @@
+from tests.utils import assert_same_matrices,build,get_builder
+
+
+def double_first_quantity(
+        builder,
+        activity:str,
+):
+    sheet = next(iter(builder.inventories[activity].values()))
+    sheet.loc[sheet.index[0],'Quantity'] *= 2
+
+
+def test_incremental_as_full_build(case):
+    builder = get_builder(case)
+    builder.add_inventories('excel',incremental=True)
+    assert_same_matrices(builder.sut.matrices['baseline'],build(case).sut.matrices['baseline'])
+
+
+def test_changed_activity_replaced_as_full_rebuild(case):
+    builder = get_builder(case)
+    builder.add_inventories('excel',incremental=True)
+    activity = builder.new_activities[0]
+    double_first_quantity(builder,activity)
+    builder.add_inventories('excel',incremental=True)
+
+    expected = get_builder(case)
+    double_first_quantity(expected,activity)
+    expected.add_inventories('excel')
+    assert_same_matrices(builder.sut.matrices['baseline'],expected.sut.matrices['baseline'])
+
+
+def test_unchanged_activities_not_added_again(case):
+    builder = get_builder(case)
+    builder.add_inventories('excel',incremental=True)
+    matrices = builder.sut.matrices
+    builder.add_inventories('excel',incremental=True)
+    assert builder.sut.matrices is matrices
@@ -0,0 +1,46 @@
+import gc
+import os
+
+import pytest
+
+from fiona.core.add_inventories import Inventories
+from fiona.core.mapped import MappedStore
+from fiona.core.options import BuildOptions
+from tests.utils import assert_same_matrices,build,get_builder
+
+_STORAGE_OPTIONS = [{'storage':'mmap'},{'memory_budget':1}] # a budget of one byte spills every new matrix
+
+
+def test_store_close_deletes_files_in_given_directory(tmp_path):
+    store = MappedStore(str(tmp_path))
+    store.allocate('a',range(3),range(2))
+    store.allocate('b',range(2),range(2))
+    store.remove('a')
+    assert os.listdir(tmp_path) == ['b.dat']
+
+    store.close()
+    assert os.listdir(tmp_path) == []
+    assert os.path.isdir(tmp_path)
+
+
+@pytest.mark.parametrize('options',_STORAGE_OPTIONS)
+def test_storage_dir_empty_after_release(case,tmp_path,options):
+    builder = build(case,storage_dir=str(tmp_path),**options)
+    assert_same_matrices(builder.sut.matrices['baseline'],build(case).sut.matrices['baseline'])
+    assert sorted(os.listdir(tmp_path)) == ['Y_new.dat','e_new.dat','v_new.dat','z_new.dat']
+
+    del builder
+    gc.collect()
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('options',_STORAGE_OPTIONS)
+def test_storage_dir_empty_after_failure(case,tmp_path,options,monkeypatch):
+    def fail(self):
+        raise RuntimeError('Failed after assembling the matrices')
+
+    builder = get_builder(case)
+    monkeypatch.setattr(Inventories,'get_mario_indices',fail)
+    with pytest.raises(RuntimeError):
+        builder.add_inventories('excel',options=BuildOptions(storage_dir=str(tmp_path),**options))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,38 @@
+import pytest
+
+from fiona.core.patches import FIONAPatch,apply_patch
+from tests.utils import assert_same_matrices,build,get_builder
+
+
+def test_patch_applied_as_full_build(case,tmp_path):
+    builder = build(case)
+    path = str(tmp_path/'patch.npz')
+    builder.save_patch(path)
+
+    patched = apply_patch(get_builder(case).sut,path)
+    assert_same_matrices(patched.matrices['baseline'],builder.sut.matrices['baseline'])
+
+
+def test_patch_keeps_mode(case,tmp_path):
+    path = str(tmp_path/'patch.npz')
+    build(case).save_patch(path)
+    assert FIONAPatch.load(path).mode == 'coefficients'
+
+
+def test_patch_fingerprint_mismatch(case,tmp_path):
+    builder = build(case)
+    path = str(tmp_path/'patch.npz')
+    builder.save_patch(path)
+
+    with pytest.raises(ValueError,match='same regions'):
+        apply_patch(builder.sut,path) # the built SUT has the new activities and commodities
+
+
+def test_patch_mode_mismatch(case,tmp_path):
+    path = str(tmp_path/'patch.npz')
+    build(case).save_patch(path)
+
+    sut = get_builder(case).sut
+    sut.reset_to_flows('baseline')
+    with pytest.raises(ValueError,match='given in flows'):
+        apply_patch(sut,path)
@@ -0,0 +1,48 @@
+import pytest
+
+from fiona.core.master_index import MasterIndex
+from fiona.core.variants import apply_master_updates
+from tests.utils import assert_same_matrices,build,get_builder
+
+from mario.tools.constants import _MASTER_INDEX as MI
+
+
+def get_variants(
+        builder,
+)->dict:
+    activity = builder.new_activities[-1]
+    sheet_name,sheet = next(iter(builder.inventories[activity].items()))
+    sheet = sheet.copy()
+    sheet['Quantity'] *= 1.5
+
+    row = builder.master_sheet.iloc[0]
+    update = {MI['a']:row[MI['a']],MI['r']:row[MI['r']],MI['c']:row[MI['c']],'Market share':0.5}
+    return {
+        'inventory': {'inventories':{activity:{sheet_name:sheet}}},
+        'master': {'master':[update]},
+        'unchanged': {},
+    }
+
+
+def build_separately(
+        case:dict,
+        spec:dict,
+):
+    builder = get_builder(case)
+    builder.master_sheet = apply_master_updates(builder.master_sheet,spec.get('master',[]))
+    builder.master_index = MasterIndex(builder.master_sheet)
+    for activity,sheets in spec.get('inventories',{}).items():
+        builder.inventories[activity] = {**builder.inventories[activity],**sheets}
+    builder.add_inventories('excel')
+    return builder
+
+
+@pytest.mark.parametrize('output',['scenarios','databases'])
+def test_variants_as_separate_builds(case,output):
+    builder = build(case)
+    variants = get_variants(builder)
+    databases = builder.add_inventory_variants(variants,output=output)
+
+    for name,spec in variants.items():
+        matrices = builder.sut.matrices[name] if output == 'scenarios' else databases[name].matrices['baseline']
+        assert_same_matrices(matrices,build_separately(case,spec).sut.matrices['baseline'])
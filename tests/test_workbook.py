@@ -0,0 +1,31 @@
+import shutil
+
+from fiona.interactions.excel import workbook
+from fiona.rules import _MASTER_SHEET_NAME as MS_name
+from fiona.rules import _REGIONS_MAPS_SHEET_NAME as RMS_name
+from tests.utils import get_builder
+
+
+def test_only_master_sheets_cached(conceptual_case):
+    workbook.clear_workbook_cache()
+    builder = get_builder(conceptual_case)
+    cached = workbook.get_cached_workbook(conceptual_case['master_file_path'])
+    assert set(cached['sheets']) == {MS_name,RMS_name}
+    assert len(builder.inventories) > 0
+
+
+def test_cached_sheets_returned_as_copies(conceptual_case):
+    path = conceptual_case['master_file_path']
+    master_sheet = workbook.read_sheets(path,[MS_name],cache=True)[MS_name]
+    master_sheet.iloc[:,:] = None
+    assert workbook.read_sheets(path,[MS_name],cache=True)[MS_name].equals(workbook.read_sheets(path,[MS_name])[MS_name])
+    assert not master_sheet.equals(workbook.read_sheets(path,[MS_name])[MS_name])
+
+
+def test_cache_bounded(conceptual_case,tmp_path):
+    workbook.clear_workbook_cache()
+    for i in range(workbook._MAX_WORKBOOKS+2):
+        path = shutil.copy(conceptual_case['master_file_path'],tmp_path/f'master_{i}.xlsx')
+        workbook.read_sheets(path,[MS_name],cache=True)
+    assert len(workbook._WORKBOOKS) == workbook._MAX_WORKBOOKS
+    assert str(tmp_path/'master_0.xlsx') not in workbook._WORKBOOKS
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from fiona.core.db_builder import DB_builder
+from fiona.core.options import BuildOptions
+
+_MATRICES = ['z','v','e','Y','EY']
+
+
+def get_builder(
+        case:dict,
+        lazy:bool = False,
+        **kwargs,
+)->DB_builder:
+    """
+    Returns a DB_builder of a test case, with the master sheet and the inventories already read.
+
+    Args:
+        case (dict): The arguments of DB_builder of the test case.
+        lazy (bool, optional): Whether inventories are read lazily. Defaults to False.
+        **kwargs: Other arguments of DB_builder.
+
+    Returns:
+        DB_builder: The builder.
+    """
+    builder = DB_builder(read_master_file=True,**case,**kwargs)
+    builder.read_inventories(case['master_file_path'],lazy=lazy)
+    return builder
+
+
+def build(
+        case:dict,
+        **options,
+)->DB_builder:
+    """
+    Returns a DB_builder of a test case after adding all its inventories.
+
+    Args:
+        case (dict): The arguments of DB_builder of the test case.
+        **options: Keyword arguments of BuildOptions.
+
+    Returns:
+        DB_builder: The builder.
+    """
+    builder = get_builder(case)
+    builder.add_inventories('excel',options=BuildOptions(**options))
+    return builder
+
+
+def assert_same_matrices(
+        matrices:dict,
+        expected:dict,
+        names:list = _MATRICES,
+):
+    """
+    Asserts that matrices have the same labels and values, whatever the order and the names of their labels.
+
+    Args:
+        matrices (dict): The matrices to be checked, by name.
+        expected (dict): The expected matrices, by name.
+        names (list, optional): The names of the matrices to be compared. Defaults to z, v, e, Y and EY.
+    """
+    for name in names:
+        pd.testing.assert_frame_equal(
+            pd.DataFrame(matrices[name]).sort_index().sort_index(axis=1),
+            pd.DataFrame(expected[name]).sort_index().sort_index(axis=1),
+            check_dtype=False,
+            check_names=False, # names of the levels are not kept by every assembly
+            obj=name,
+        )